@@ -1,22 +1,24 @@
 # tickets-service\app\dependencies.py
 
 import os
-import requests
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
+from eventgo_shared.token_verifier import TokenVerifier, TokenVerificationError
 
 AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8000")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 
+# Verifies tokens locally, auth-service is only called for legacy tokens
+token_verifier = TokenVerifier(auth_service_url=AUTH_SERVICE_URL)
 
-async def get_current_user(token: str = Depends(oauth2_scheme)):
-    response = requests.post(
-        f"{AUTH_SERVICE_URL}/validate-token", json={"token": token}
-    )
-    if response.status_code != 200:
+
+# Plain def: verify() may call auth-service with requests, FastAPI runs this in its threadpool
+def get_current_user(token: str = Depends(oauth2_scheme)):
+    try:
+        return token_verifier.verify(token)  # Return the decoded user info
+    except TokenVerificationError:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    return response.json()  # Return the decoded user info
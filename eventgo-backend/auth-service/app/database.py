@@ -1,46 +1,91 @@
-from sqlalchemy import create_engine
+"""
+Database engine and sessions.
+
+Nothing connects at import time: the engine is created on first use and the
+app's lifespan hook waits for the database with exponential backoff, so tests
+and tooling can import the app without a reachable database.
+"""
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine, AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+import asyncio
 import os
-import time
 
-SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL")
-MAX_RETRIES = 10  # Number of attempts
-RETRY_DELAY = 5  # Seconds between retries
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", 10))  # Connections kept open per worker
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", 20))  # Extra connections allowed under burst
+DB_CONNECT_RETRIES = int(os.getenv("DB_CONNECT_RETRIES", 10))  # Number of attempts
+DB_RETRY_BASE_DELAY = float(os.getenv("DB_RETRY_BASE_DELAY", 0.5))  # Seconds, doubled after each failure
+DB_RETRY_MAX_DELAY = float(os.getenv("DB_RETRY_MAX_DELAY", 10))  # Upper bound on a single wait
+
+Base = declarative_base()
+
+_engine: AsyncEngine | None = None
+_sessionmaker: async_sessionmaker[AsyncSession] | None = None
+
+
+def get_async_database_url(url: str) -> str:
+    """Use the asyncpg driver for plain postgresql:// URLs."""
+    if url.startswith("postgresql://"):
+        return "postgresql+asyncpg://" + url[len("postgresql://"):]
+    return url
+
+
+def create_db_engine(url: str):
+    options = {"pool_pre_ping": True, "pool_recycle": 300}
+    if not url.startswith("sqlite"):
+        options.update(pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW)
+    return create_async_engine(get_async_database_url(url), **options)
+
+
+def get_engine() -> AsyncEngine:
+    global _engine, _sessionmaker
+    if _engine is None:
+        url = os.getenv("DATABASE_URL")
+        if not url:
+            raise RuntimeError("DATABASE_URL is not set")
+        _engine = create_db_engine(url)
+        _sessionmaker = async_sessionmaker(bind=_engine, autoflush=False, expire_on_commit=False)
+    return _engine
+
 
+def SessionLocal() -> AsyncSession:
+    """New session bound to the lazily created engine."""
+    get_engine()
+    return _sessionmaker()
 
-def get_db_connection():
-    for attempt in range(1, MAX_RETRIES + 1):
+
+async def dispose_engine():
+    global _engine, _sessionmaker
+    if _engine is not None:
+        await _engine.dispose()
+        _engine, _sessionmaker = None, None
+
+
+def retry_delay(attempt: int) -> float:
+    """Backoff before retrying after the given failed attempt (1-based)."""
+    return min(DB_RETRY_BASE_DELAY * 2 ** (attempt - 1), DB_RETRY_MAX_DELAY)
+
+
+async def wait_for_db(retries: int = DB_CONNECT_RETRIES):
+    for attempt in range(1, retries + 1):
         try:
-            engine = create_engine(
-                SQLALCHEMY_DATABASE_URL, pool_pre_ping=True, pool_recycle=300
-            )
             # Test a quick connection
-            conn = engine.connect()
-            conn.close()
-            return engine
+            async with get_engine().connect() as conn:
+                await conn.execute(text("SELECT 1"))
+            return
         except Exception as e:
-            if attempt < MAX_RETRIES:
-                print(
-                    f"[Auth-Service] DB connection attempt {attempt} failed: {e}. "
-                    f"Retrying in {RETRY_DELAY} seconds..."
-                )
-                time.sleep(RETRY_DELAY)
-            else:
+            if attempt == retries:
                 raise Exception(
                     "[Auth-Service] Database connection failed after multiple attempts."
                 ) from e
+            delay = retry_delay(attempt)
+            print(
+                f"[Auth-Service] DB connection attempt {attempt} failed: {e}. "
+                f"Retrying in {delay:.1f} seconds..."
+            )
+            await asyncio.sleep(delay)
 
 
-engine = get_db_connection()
-
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-Base = declarative_base()
-
-
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
@@ -1,13 +1,15 @@
 from datetime import datetime, timedelta
+import uuid
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi.security import OAuth2PasswordBearer
 from fastapi import HTTPException, status, Depends, Request, Response
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from .token_blacklist import is_token_blacklisted  # NEW: Import the blacklist checker
 
 from .database import get_db
 from . import models
+from .user_cache import get_cached_user_by_email
 
 # If you prefer to read these from environment variables, you could do:
 # import os
@@ -29,25 +31,21 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="login")
 #     return encoded_jwt
 
 
-def create_access_token(data: dict):
-    """Generate a JWT token with an expiration."""
-    to_encode = data.copy()
+def create_access_token(user: models.User):
+    """Generate a JWT token with an expiration for an already loaded user."""
     expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
-    to_encode.update({"exp": expire})
-    
-    # Fetch user ID if it's not already included
-    if "user_id" not in to_encode and "sub" in to_encode:
-        email = to_encode["sub"]
-        db = next(get_db())
-        user = db.query(models.User).filter(models.User.email == email).first()
-        if user:
-            to_encode["user_id"] = user.id  # Add user_id to the token
-
+    to_encode = {
+        "sub": user.email,
+        "role": user.role.value,
+        "user_id": user.id,
+        "exp": expire,
+        "jti": uuid.uuid4().hex,  # Lets the token be revoked without storing it
+    }
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
 
-def get_current_user(request: Request, db: Session = Depends(get_db)):
+async def get_current_user(request: Request, db: AsyncSession = Depends(get_db)):
     token = request.cookies.get("access_token")
     if not token:
         raise HTTPException(
@@ -59,13 +57,6 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     if token.startswith("Bearer "):
         token = token[len("Bearer "):]
 
-    if is_token_blacklisted(token):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Token is blacklisted",
-            headers={"WWW-Authenticate": "Bearer"},
-        )
-
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="Could not validate credentials",
@@ -81,7 +72,14 @@ def get_current_user(request: Request, db: Session = Depends(get_db)):
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    if await is_token_blacklisted(token, payload):
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token is blacklisted",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+
+    user = await get_cached_user_by_email(db, email)
     if not user:
         raise credentials_exception
 
@@ -1,8 +1,11 @@
-from .database import engine
+import asyncio
+
+from .database import get_engine
 from . import models
 
-def init_db():
-    models.Base.metadata.create_all(bind=engine)
+async def init_db():
+    async with get_engine().begin() as conn:
+        await conn.run_sync(models.Base.metadata.create_all)
 
 if __name__ == "__main__":
-    init_db() 
\ No newline at end of file
+    asyncio.run(init_db())
@@ -1,12 +1,17 @@
-from fastapi import FastAPI, Depends, HTTPException, Response, status, Request
+from fastapi import FastAPI, Depends, HTTPException, Query, Response, status, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from contextlib import asynccontextmanager
 
 from jose import JWTError, jwt  # Move third-party imports up
+import json
+import os
 
 from . import models, schemas
-from .database import engine, get_db
+from .database import SessionLocal, dispose_engine, get_db, get_engine
 from .schemas import TokenValidationRequest
 from .dependencies import (
     get_db,
@@ -16,10 +21,26 @@ from .dependencies import (
     ALGORITHM,
 )
 
-from .database import engine
-from .token_blacklist import is_token_blacklisted, add_to_blacklist
+from .password_hasher import password_hasher
+from .search_index import email_index, search_database
+from .startup import StartupState
+from .user_cache import CachedUser, get_cached_user_by_email, get_cached_user_by_id, user_cache
+from .token_blacklist import is_token_blacklisted, add_to_blacklist, revoked_token_keys
 
-app = FastAPI(title="Auth Service")
+startup_state = StartupState()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Connect to the database in the background so the server can report liveness immediately
+    startup_state.start()
+    yield
+    await startup_state.stop()
+    password_hasher.shutdown()
+    await dispose_engine()
+
+
+app = FastAPI(title="Auth Service", lifespan=lifespan)
 
 # Add CORS middleware
 app.add_middleware(
@@ -30,42 +51,82 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize database
-models.Base.metadata.create_all(bind=engine)
+from sqlalchemy.sql import text  # Import text for raw SQL execution
 
 
-from sqlalchemy.sql import text  # Import text for raw SQL execution
+@app.get("/health/live")
+async def liveness_check():
+    """The process is up. Startup giving up on the database exits the process instead."""
+    if startup_state.failed:
+        raise HTTPException(status_code=503, detail="Startup failed")
+    return {"status": "alive"}
 
 
+@app.get("/health/ready")
 @app.get("/health")
-async def health_check(db: Session = Depends(get_db)):
+async def health_check():
     """Health check endpoint to verify service and database connectivity."""
+    if not startup_state.ready:
+        raise HTTPException(status_code=503, detail="Starting up")
     try:
-        db.execute(text("SELECT 1"))  # Wrap SQL query with text()
+        async with SessionLocal() as db:
+            await db.execute(text("SELECT 1"))  # Wrap SQL query with text()
         return {"status": "healthy", "database": "connected"}
     except Exception as e:
         import traceback
 
         error_details = traceback.format_exc()  # Get full error traceback
         print(f"❌ Health check failed: {error_details}")  # Print error in logs
-        raise HTTPException(status_code=500, detail=str(e))
+        raise HTTPException(status_code=503, detail=str(e))
+
 
-@app.get("/users", response_model=list[schemas.UserResponse])
-async def get_all_users(db: Session = Depends(get_db)):
+@app.get("/metrics")
+async def get_metrics():
+    """Runtime counters for capacity monitoring."""
+    return {
+        "password_hashing": password_hasher.snapshot(),
+        "user_cache": user_cache.snapshot(),
+        "startup": startup_state.snapshot(),
+    }
+
+USERS_PAGE_SIZE_MAX = int(os.getenv("USERS_PAGE_SIZE_MAX", 100))
+
+
+@app.get("/users", response_model=schemas.UserPage)
+async def get_all_users(
+    limit: int = Query(50, ge=1, le=USERS_PAGE_SIZE_MAX),
+    after_id: int | None = None,
+    role: schemas.RoleEnum | None = None,
+    is_active: bool | None = None,
+    db: AsyncSession = Depends(get_db),
+):
     """
-    Retrieve a list of all users.
+    Retrieve users one page at a time, ordered by id.
+    Pass the returned `next_cursor` as `after_id` to get the next page.
     """
-    users = db.query(models.User).all()
-    return users
+    query = select(models.User).order_by(models.User.id).limit(limit + 1)
+    if after_id is not None:
+        query = query.where(models.User.id > after_id)
+    if role is not None:
+        query = query.where(models.User.role == models.UserRole(role.value))
+    if is_active is not None:
+        query = query.where(models.User.is_active == is_active)
+
+    result = await db.execute(query)
+    users = result.scalars().all()
+    # The extra row only tells us whether another page exists
+    next_cursor = users[limit - 1].id if len(users) > limit else None
+    return {"items": users[:limit], "next_cursor": next_cursor}
 
 @app.post("/register")
-async def register_user(user: schemas.UserCreate, response: Response, db: Session = Depends(get_db)):
-    db_user = db.query(models.User).filter(models.User.email == user.email).first()
+async def register_user(user: schemas.UserCreate, response: Response, db: AsyncSession = Depends(get_db)):
+    result = await db.execute(select(models.User).where(models.User.email == user.email))
+    db_user = result.scalars().first()
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
 
     # Hash the password and create the user
-    hashed_password = models.User.get_password_hash(user.password)
+    hashed_password = await password_hasher.hash(user.password)
     db_user = models.User(
         email=user.email,
         full_name=user.full_name,  # NEW: Full name
@@ -73,11 +134,13 @@ async def register_user(user: schemas.UserCreate, response: Response, db: Sessio
         role=user.role,  # NEW: Role (user/admin)
     )
     db.add(db_user)
-    db.commit()
-    db.refresh(db_user)
+    await db.commit()
+    await db.refresh(db_user)
+    user_cache.invalidate(user_id=db_user.id, email=db_user.email)
+    email_index.add(db_user.id, db_user.email)
 
     # ✅ Generate JWT token
-    access_token = create_access_token(data={"sub": db_user.email, "role": db_user.role.value})
+    access_token = create_access_token(db_user)
 
     # ✅ Set token as HTTP-only cookie
     response.set_cookie(
@@ -102,17 +165,18 @@ async def register_user(user: schemas.UserCreate, response: Response, db: Sessio
 async def login(
     response: Response,
     form_data: OAuth2PasswordRequestForm = Depends(),
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.query(models.User).filter(models.User.email == form_data.username).first()
-    if not user or not models.User.verify_password(form_data.password, user.hashed_password):
+    result = await db.execute(select(models.User).where(models.User.email == form_data.username))
+    user = result.scalars().first()
+    if not user or not await password_hasher.verify(form_data.password, user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
 
-    access_token = create_access_token(data={"sub": user.email, "role": user.role.value})
+    access_token = create_access_token(user)
 
     # ✅ Set the token in an httpOnly cookie
     response.set_cookie(
@@ -136,7 +200,7 @@ async def login(
 #     return current_user
 
 @app.get("/me")
-async def read_users_me(current_user: models.User = Depends(get_current_user)):
+async def read_users_me(current_user: CachedUser = Depends(get_current_user)):
     return {
         "id": current_user.id,
         "email": current_user.email,
@@ -147,21 +211,27 @@ async def read_users_me(current_user: models.User = Depends(get_current_user)):
 
 
 
+SEARCH_USERS_LIMIT = 10
+
+
 @app.get("/search-users")
-async def search_users(email: str, db: Session = Depends(get_db)):
+async def search_users(email: str, db: AsyncSession = Depends(get_db)):
     """
-    Search users by email. Supports partial match.
+    Search users by email. Supports partial match, prefix matches come first.
     Example usage: /search-users?email=test
     """
     if not email:
         raise HTTPException(status_code=400, detail="Email parameter is required")
 
-    users = db.query(models.User).filter(models.User.email.ilike(f"%{email}%")).limit(10).all()
+    if get_engine().dialect.name == "postgresql":
+        users = await search_database(db, email, SEARCH_USERS_LIMIT)
+    else:
+        users = email_index.search(email, SEARCH_USERS_LIMIT)
 
     if not users:
         return {"message": "No users found"}
 
-    return [{"id": user.id, "email": user.email} for user in users]
+    return [{"id": user_id, "email": user_email} for user_id, user_email in users]
 
 @app.post("/logout")
 async def logout(response: Response, request: Request):
@@ -171,7 +241,10 @@ async def logout(response: Response, request: Request):
         # Optionally remove the "Bearer " prefix if present
         if token.startswith("Bearer "):
             token = token[len("Bearer ") :]
-        add_to_blacklist(token)
+        try:
+            await add_to_blacklist(token, jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]))
+        except JWTError:
+            pass  # Invalid or expired tokens are already rejected everywhere
 
     # Remove the cookie so the browser no longer sends it
     response.delete_cookie(key="access_token")
@@ -181,7 +254,7 @@ async def logout(response: Response, request: Request):
 
 @app.post("/validate-token")
 async def validate_token(
-    token_data: TokenValidationRequest, db: Session = Depends(get_db)
+    token_data: TokenValidationRequest, db: AsyncSession = Depends(get_db)
 ):
     token = token_data.token
     credentials_exception = HTTPException(
@@ -189,9 +262,6 @@ async def validate_token(
         detail="Invalid token",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    if is_token_blacklisted(token):
-        raise credentials_exception
-
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -200,30 +270,71 @@ async def validate_token(
     except JWTError:
         raise credentials_exception
 
-    user = db.query(models.User).filter(models.User.email == email).first()
+    if await is_token_blacklisted(token, payload):
+        raise credentials_exception
+
+    user = await get_cached_user_by_email(db, email)
     if user is None:
         raise credentials_exception
 
     return {"email": user.email, "id": user.id}
 
+
+@app.get("/revoked-tokens")
+async def revoked_tokens():
+    """
+    jti (or fingerprint) of unexpired logged out tokens, replicated by services that verify JWTs locally.
+    """
+    return {"revoked": await revoked_token_keys()}
+
 @app.get("/debug-cookies")
 async def debug_cookies(request: Request):
     return {"cookies": request.cookies}
 
-@app.post("/users/query", response_model=list[schemas.UsersQueryResponse])
-async def get_users_by_ids(
-    payload: schemas.UsersQueryRequest,
-    db: Session = Depends(get_db),
-):
-    return db.query(models.User).filter(models.User.id.in_(payload.ids)).all()
+USERS_QUERY_CHUNK_SIZE = int(os.getenv("USERS_QUERY_CHUNK_SIZE", 1000))  # ids per IN (...) query
+
+
+async def iter_users_by_ids(ids: list[int], fields: list[schemas.UserField]):
+    """Yield the requested columns of each user, querying USERS_QUERY_CHUNK_SIZE ids at a time."""
+    names = list(dict.fromkeys([schemas.UserField.id.value] + [field.value for field in fields]))
+    columns = [getattr(models.User, name) for name in names]
+    ids = list(dict.fromkeys(ids))
+
+    async with SessionLocal() as db:
+        for start in range(0, len(ids), USERS_QUERY_CHUNK_SIZE):
+            chunk = ids[start:start + USERS_QUERY_CHUNK_SIZE]
+            result = await db.stream(select(*columns).where(models.User.id.in_(chunk)))
+            async for row in result:
+                yield {
+                    name: value.value if isinstance(value, models.UserRole) else value
+                    for name, value in zip(names, row)
+                }
+
+
+@app.post("/users/query")
+async def get_users_by_ids(payload: schemas.UsersQueryRequest, request: Request):
+    """
+    Look up many users by id. `fields` limits the returned columns.
+    Send `Accept: application/x-ndjson` to stream one JSON object per line
+    instead of building the whole list in memory.
+    """
+    users = iter_users_by_ids(payload.ids, payload.fields)
+
+    if "application/x-ndjson" in request.headers.get("accept", ""):
+        return StreamingResponse(
+            (json.dumps(user) + "\n" async for user in users),
+            media_type="application/x-ndjson",
+        )
+
+    return [user async for user in users]
 
 
 @app.get("/users/{user_id}", response_model=schemas.UserResponse)
-async def get_user_by_id(user_id: int, db: Session = Depends(get_db)):
+async def get_user_by_id(user_id: int, db: AsyncSession = Depends(get_db)):
     """
     Retrieve user details by user ID.
     """
-    user = db.query(models.User).filter(models.User.id == user_id).first()
+    user = await get_cached_user_by_id(db, user_id)
     if user is None:
         raise HTTPException(status_code=404, detail="User not found")
     return user
\ No newline at end of file
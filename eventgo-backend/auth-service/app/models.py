@@ -1,10 +1,8 @@
 from sqlalchemy import Boolean, Column, Integer, String, Enum
-from passlib.context import CryptContext
 from .database import Base
+from .password_hasher import hash_password_sync, verify_password_sync
 import enum
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
-
 # Define a role Enum
 class UserRole(enum.Enum):
     user = "user"
@@ -20,10 +18,11 @@ class User(Base):
     full_name = Column(String, nullable=False) 
     role = Column(Enum(UserRole), default=UserRole.user, nullable=False)
 
+    # Blocking bcrypt calls, request handlers go through password_hasher instead
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str):
-        return pwd_context.verify(plain_password, hashed_password)
+        return verify_password_sync(plain_password, hashed_password)
 
     @staticmethod
     def get_password_hash(password: str):
-        return pwd_context.hash(password) 
\ No newline at end of file
+        return hash_password_sync(password) 
\ No newline at end of file
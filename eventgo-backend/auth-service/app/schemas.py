@@ -24,6 +24,11 @@ class UserResponse(UserBase):
         from_attributes = True
 
 
+class UserPage(BaseModel):
+    items: list[UserResponse]
+    next_cursor: int | None = None  # Pass as after_id to fetch the next page
+
+
 class Token(BaseModel):
     access_token: str
     token_type: str
@@ -36,14 +41,14 @@ class TokenData(BaseModel):
 class TokenValidationRequest(BaseModel):
     token: str
 
+class UserField(str, Enum):
+    id = "id"
+    email = "email"
+    full_name = "full_name"
+    role = "role"
+    is_active = "is_active"
+
 class UsersQueryRequest(BaseModel):
     ids: list[int]
-
-class UsersQueryResponse(BaseModel):
-    id: int
-    email: EmailStr
-    full_name: str
-    role: RoleEnum
-
-    class Config:
-        from_attributes = True
+    # Columns to return, "id" is always included
+    fields: list[UserField] = [UserField.id, UserField.email, UserField.full_name, UserField.role]
@@ -0,0 +1,133 @@
+"""
+Email search for /search-users.
+
+On Postgres the users table gets a pg_trgm GIN index on lower(email), so
+substring matches no longer scan the table. Other databases (SQLite in tests
+and benchmarks) have no trigram support, so an in-memory trigram index over
+the emails is kept instead. Both rank prefix matches first, then by email.
+"""
+from array import array
+from bisect import bisect_left, insort
+from sqlalchemy import case, func, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+import heapq
+
+from . import models
+
+NGRAM_SIZE = 3
+
+
+def escape_like(term: str) -> str:
+    return term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+async def create_trigram_index(conn: AsyncConnection):
+    """Postgres only: index lower(email) so ILIKE '%term%' can use pg_trgm."""
+    await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    await conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_users_email_trgm "
+        "ON users USING gin (lower(email) gin_trgm_ops)"
+    ))
+
+
+async def search_database(db: AsyncSession, term: str, limit: int) -> list[tuple[int, str]]:
+    email = func.lower(models.User.email)
+    escaped = escape_like(term.lower())
+    result = await db.execute(
+        select(models.User.id, models.User.email)
+        .where(email.like(f"%{escaped}%", escape="\\"))
+        .order_by(case((email.like(f"{escaped}%", escape="\\"), 0), else_=1), models.User.email)
+        .limit(limit)
+    )
+    return [tuple(row) for row in result]
+
+
+def _ngrams(value: str):
+    return {value[i:i + NGRAM_SIZE] for i in range(len(value) - NGRAM_SIZE + 1)}
+
+
+class EmailSearchIndex:
+    """
+    In-memory trigram index over emails, matched case-insensitively.
+
+    Postings are compact integer arrays; a lookup scans only the posting list
+    of the term's rarest trigram and confirms each candidate with a substring
+    check, so entries left behind by an email change are simply filtered out.
+    Prefix matches come from a sorted list of emails via bisect.
+    """
+
+    def __init__(self):
+        self._emails: dict[int, str] = {}
+        self._sorted: list[tuple[str, int]] = []
+        self._postings: dict[str, array] = {}
+
+    def __len__(self):
+        return len(self._emails)
+
+    def add(self, user_id: int, email: str):
+        previous = self._emails.get(user_id)
+        if previous == email:
+            return
+        if previous is not None:
+            self._sorted.pop(bisect_left(self._sorted, (previous.lower(), user_id)))
+        self._emails[user_id] = email
+        insort(self._sorted, (email.lower(), user_id))
+        for gram in _ngrams(email.lower()):
+            self._postings.setdefault(gram, array("I")).append(user_id)
+
+    def build(self, users):
+        """Bulk load (id, email) pairs, much faster than repeated add()."""
+        for user_id, email in users:
+            self._emails[user_id] = email
+            for gram in _ngrams(email.lower()):
+                self._postings.setdefault(gram, array("I")).append(user_id)
+        self._sorted = sorted((email.lower(), user_id) for user_id, email in self._emails.items())
+
+    def _prefix_matches(self, term: str, limit: int) -> list[tuple[int, str]]:
+        matches = []
+        position = bisect_left(self._sorted, (term, -1))
+        while position < len(self._sorted) and len(matches) < limit:
+            email, user_id = self._sorted[position]
+            if not email.startswith(term):
+                break
+            matches.append((user_id, self._emails[user_id]))
+            position += 1
+        return matches
+
+    def _substring_candidates(self, term: str):
+        grams = _ngrams(term)
+        if not grams:
+            # Shorter than one trigram: nothing to narrow the search with
+            return self._emails.keys()
+        postings = [self._postings.get(gram) for gram in grams]
+        if any(posting is None for posting in postings):
+            return ()
+        return min(postings, key=len)
+
+    def search(self, term: str, limit: int = 10) -> list[tuple[int, str]]:
+        term = term.lower()
+        results = self._prefix_matches(term, limit)
+        if len(results) == limit:
+            return results
+
+        seen = {user_id for user_id, _ in results}
+        others = (
+            (email, user_id)
+            for user_id in dict.fromkeys(self._substring_candidates(term))
+            if user_id not in seen
+            and term in (email := self._emails[user_id].lower())
+            and not email.startswith(term)
+        )
+        results.extend(
+            (user_id, self._emails[user_id])
+            for _, user_id in heapq.nsmallest(limit - len(results), others)
+        )
+        return results
+
+
+email_index = EmailSearchIndex()
+
+
+async def build_email_index(db: AsyncSession, batch_size: int = 10_000):
+    result = await db.stream(select(models.User.id, models.User.email).execution_options(yield_per=batch_size))
+    email_index.build([(user_id, email) async for user_id, email in result])
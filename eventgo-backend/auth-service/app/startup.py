@@ -0,0 +1,81 @@
+"""
+Database preparation run in the background by the app's lifespan hook.
+
+The server starts answering /health/live right away while this connects
+(with exponential backoff), creates the tables and sets up email search.
+/health/ready only succeeds once it has finished, and ``cold_start_seconds``
+records how long that took so it can be compared with COLD_START_TARGET_SECONDS.
+If ``wait_for_db`` gives up, the process exits with status 1, so docker
+compose's ``restart: always`` starts it again. An unhealthy container is
+never restarted, staying up as not-ready would leave the service down for good.
+"""
+import asyncio
+import os
+import time
+from typing import Callable
+
+from .database import SessionLocal, get_engine, wait_for_db
+from .init_db import init_db
+from .search_index import build_email_index, create_trigram_index
+
+COLD_START_TARGET_SECONDS = float(os.getenv("COLD_START_TARGET_SECONDS", 5))
+
+
+class StartupState:
+    def __init__(self, target_seconds: float = COLD_START_TARGET_SECONDS, exit: Callable[[int], None] = os._exit):
+        self.target_seconds = target_seconds
+        self.exit = exit
+        self.cold_start_seconds: float | None = None
+        self.error: BaseException | None = None
+        self._task: asyncio.Task | None = None
+
+    @property
+    def ready(self) -> bool:
+        return self.cold_start_seconds is not None
+
+    @property
+    def failed(self) -> bool:
+        return self.error is not None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run(time.perf_counter()))
+
+    async def _run(self, started: float):
+        try:
+            await prepare_database()
+        except Exception as e:
+            self.error = e
+            print(f"[Auth-Service] Startup failed, exiting: {e}", flush=True)
+            self.exit(1)
+            return
+        self.cold_start_seconds = time.perf_counter() - started
+        print(f"[Auth-Service] Ready in {self.cold_start_seconds:.2f}s")
+
+    async def stop(self):
+        if self._task is not None and not self._task.done():
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def snapshot(self) -> dict:
+        return {
+            "ready": self.ready,
+            "failed": self.failed,
+            "cold_start_seconds": round(self.cold_start_seconds, 3) if self.ready else None,
+            "target_seconds": self.target_seconds,
+            "within_target": self.ready and self.cold_start_seconds <= self.target_seconds,
+        }
+
+
+async def prepare_database():
+    await wait_for_db()
+    await init_db()
+    engine = get_engine()
+    if engine.dialect.name == "postgresql":
+        async with engine.begin() as conn:
+            await create_trigram_index(conn)
+    else:
+        async with SessionLocal() as db:
+            await build_email_index(db)
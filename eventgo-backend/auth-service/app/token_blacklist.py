@@ -1,15 +1,126 @@
-from datetime import datetime, timedelta
-from typing import Set
+"""
+Revoked (logged out) tokens.
 
-# Store invalidated tokens in memory (use Redis in production)
-TOKEN_BLACKLIST: Set[str] = set()
+Entries are keyed by the token's ``jti`` (or a SHA-256 fingerprint for tokens
+minted without one) and expire together with the token, so memory is bounded
+by the number of unexpired revoked tokens. Set REVOCATION_BACKEND=redis to
+share revocations between auth-service replicas. Store methods are coroutines
+so the Redis backend never blocks the event loop.
 
+``GET /revoked-tokens`` lists every key, which on Redis is a full SCAN of the
+revocation prefix, and every service using eventgo_shared's TokenVerifier
+polls it every 5 seconds. Its cost grows with the number of unexpired
+revoked tokens times the number of consumers.
+"""
+import hashlib
+import heapq
+import os
+import time
+from typing import Callable
 
-def add_to_blacklist(token: str):
-    """Add a token to the blacklist."""
-    TOKEN_BLACKLIST.add(token)
+REVOCATION_BACKEND = os.getenv("REVOCATION_BACKEND", "memory")
+REDIS_URL = os.getenv("REDIS_URL", "redis://redis:6379/0")
 
 
-def is_token_blacklisted(token: str) -> bool:
-    """Check if a token is blacklisted."""
-    return token in TOKEN_BLACKLIST
+def token_fingerprint(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def revocation_key(token: str, claims: dict) -> str:
+    return claims.get("jti") or token_fingerprint(token)
+
+
+class InMemoryRevocationStore:
+    """Revocations for a single process, evicted in expiry order."""
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self._expiries: dict[str, float] = {}
+        self._heap: list[tuple[float, str]] = []
+
+    def _evict_expired(self, now: float):
+        while self._heap and self._heap[0][0] <= now:
+            expires_at, key = heapq.heappop(self._heap)
+            # Skip heap entries superseded by a later add() of the same key
+            if self._expiries.get(key) == expires_at:
+                del self._expiries[key]
+
+    async def add(self, key: str, expires_at: float):
+        now = self.clock()
+        self._evict_expired(now)
+        if expires_at <= now:
+            return
+        self._expiries[key] = expires_at
+        heapq.heappush(self._heap, (expires_at, key))
+
+    async def contains(self, key: str) -> bool:
+        self._evict_expired(self.clock())
+        return key in self._expiries
+
+    async def keys(self) -> list[str]:
+        self._evict_expired(self.clock())
+        return list(self._expiries)
+
+    def __len__(self):
+        self._evict_expired(self.clock())
+        return len(self._expiries)
+
+
+class RedisRevocationStore:
+    """
+    Revocations shared by every replica through Redis, using one key per
+    token with a TTL so Redis drops it when the token expires.
+
+    Any ``redis.asyncio``-style client exposing ``await set(name, value, ex=)``,
+    ``await exists(name)`` and ``async for ... in scan_iter(match=)`` works,
+    which keeps the store testable with a fake.
+    """
+
+    def __init__(self, client, prefix: str = "auth:revoked:", clock: Callable[[], float] = time.time):
+        self.client = client
+        self.prefix = prefix
+        self.clock = clock
+
+    async def add(self, key: str, expires_at: float):
+        ttl = int(expires_at - self.clock()) + 1
+        if ttl > 0:
+            await self.client.set(self.prefix + key, 1, ex=ttl)
+
+    async def contains(self, key: str) -> bool:
+        return bool(await self.client.exists(self.prefix + key))
+
+    async def keys(self) -> list[str]:
+        return [
+            (name.decode() if isinstance(name, bytes) else name)[len(self.prefix):]
+            async for name in self.client.scan_iter(match=self.prefix + "*")
+        ]
+
+
+def create_revocation_store(backend: str = REVOCATION_BACKEND):
+    if backend == "memory":
+        return InMemoryRevocationStore()
+    if backend == "redis":
+        try:
+            import redis.asyncio
+        except ImportError as e:
+            raise RuntimeError("REVOCATION_BACKEND=redis requires the redis package") from e
+        return RedisRevocationStore(redis.asyncio.Redis.from_url(REDIS_URL))
+    raise ValueError(f"Unknown REVOCATION_BACKEND: {backend}")
+
+
+revocation_store = create_revocation_store()
+
+
+async def add_to_blacklist(token: str, claims: dict):
+    """Revoke a decoded token until it expires."""
+    await revocation_store.add(revocation_key(token, claims), float(claims["exp"]))
+
+
+async def is_token_blacklisted(token: str, claims: dict) -> bool:
+    """Check if a decoded token has been revoked."""
+    return await revocation_store.contains(revocation_key(token, claims))
+
+
+async def revoked_token_keys() -> list[str]:
+    """jti (or fingerprint) of every unexpired revoked token, safe to share with other services."""
+    return await revocation_store.keys()
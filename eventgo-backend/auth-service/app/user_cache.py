@@ -0,0 +1,126 @@
+"""
+In-process cache of user principals for token validation.
+
+Entries are plain snapshots (never ORM objects bound to a session), reachable
+by email and by id, evicted least-recently-used beyond USER_CACHE_SIZE and
+after USER_CACHE_TTL seconds. Call ``user_cache.invalidate`` whenever a user's
+email, role or active flag changes.
+"""
+from collections import OrderedDict
+from dataclasses import dataclass
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+import os
+import time
+
+from . import models
+
+USER_CACHE_SIZE = int(os.getenv("USER_CACHE_SIZE", 10000))
+USER_CACHE_TTL = float(os.getenv("USER_CACHE_TTL", 300))
+
+
+@dataclass(frozen=True)
+class CachedUser:
+    id: int
+    email: str
+    full_name: str
+    role: models.UserRole
+    is_active: bool
+
+    @classmethod
+    def from_model(cls, user: models.User) -> "CachedUser":
+        return cls(
+            id=user.id,
+            email=user.email,
+            full_name=user.full_name,
+            role=user.role,
+            is_active=user.is_active,
+        )
+
+
+class UserCache:
+    def __init__(self, max_size: int = USER_CACHE_SIZE, ttl: float = USER_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._by_id: OrderedDict[int, tuple[CachedUser, float]] = OrderedDict()
+        self._id_by_email: dict[str, int] = {}
+
+    def _get(self, user_id: int | None) -> CachedUser | None:
+        entry = self._by_id.get(user_id) if user_id is not None else None
+        if entry is None or entry[1] <= time.monotonic():
+            if entry is not None:
+                self._remove(user_id)
+            self.misses += 1
+            return None
+        self._by_id.move_to_end(user_id)
+        self.hits += 1
+        return entry[0]
+
+    def get_by_id(self, user_id: int) -> CachedUser | None:
+        return self._get(user_id)
+
+    def get_by_email(self, email: str) -> CachedUser | None:
+        return self._get(self._id_by_email.get(email))
+
+    def put(self, user: CachedUser):
+        self._remove(user.id)
+        self._by_id[user.id] = (user, time.monotonic() + self.ttl)
+        self._id_by_email[user.email] = user.id
+        while len(self._by_id) > self.max_size:
+            oldest_id = next(iter(self._by_id))
+            self._remove(oldest_id)
+
+    def _remove(self, user_id: int):
+        entry = self._by_id.pop(user_id, None)
+        if entry is not None and self._id_by_email.get(entry[0].email) == user_id:
+            del self._id_by_email[entry[0].email]
+
+    def invalidate(self, user_id: int | None = None, email: str | None = None):
+        if email is not None:
+            user_id = self._id_by_email.get(email, user_id)
+        if user_id is not None:
+            self._remove(user_id)
+
+    def clear(self):
+        self._by_id.clear()
+        self._id_by_email.clear()
+
+    def snapshot(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._by_id),
+            "max_size": self.max_size,
+            "ttl_seconds": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+user_cache = UserCache()
+
+
+async def get_cached_user_by_email(db: AsyncSession, email: str) -> CachedUser | None:
+    user = user_cache.get_by_email(email)
+    if user is None:
+        result = await db.execute(select(models.User).where(models.User.email == email))
+        db_user = result.scalars().first()
+        if db_user is None:
+            return None
+        user = CachedUser.from_model(db_user)
+        user_cache.put(user)
+    return user
+
+
+async def get_cached_user_by_id(db: AsyncSession, user_id: int) -> CachedUser | None:
+    user = user_cache.get_by_id(user_id)
+    if user is None:
+        result = await db.execute(select(models.User).where(models.User.id == user_id))
+        db_user = result.scalars().first()
+        if db_user is None:
+            return None
+        user = CachedUser.from_model(db_user)
+        user_cache.put(user)
+    return user
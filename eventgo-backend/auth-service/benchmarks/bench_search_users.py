@@ -0,0 +1,87 @@
+"""
+Latency of /search-users lookups as the users table grows.
+
+Compares the in-memory trigram index with the old ILIKE '%term%' query, which
+scans the whole table on every keystroke. Runs on a throwaway SQLite database:
+
+    python benchmarks/bench_search_users.py
+"""
+import asyncio
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sqlalchemy import insert, select
+
+from app import models
+from app.database import SessionLocal, get_engine
+from app.init_db import init_db
+from app.search_index import EmailSearchIndex
+
+TABLE_SIZES = [10_000, 100_000, 1_000_000]
+FIRST_NAMES = ["anna", "marta", "jonas", "lukas", "sofia", "emil", "ida", "oskar", "nora", "felix"]
+LAST_NAMES = ["berg", "lind", "nowak", "rossi", "smith", "meyer", "costa", "klein", "silva", "moreau"]
+DOMAINS = ["example.com", "mail.test", "eventgo.dev"]
+# Typing in the transfer UI: a prefix, a substring, a rare match and a miss
+TERMS = ["marta.", "nowak12", "ida.silva99999", "nobody"]
+ROUNDS = 20
+
+
+def synthetic_email(i: int) -> str:
+    rng = random.Random(i)
+    return f"{rng.choice(FIRST_NAMES)}.{rng.choice(LAST_NAMES)}{i}@{rng.choice(DOMAINS)}"
+
+
+async def grow_table(start: int, stop: int):
+    async with get_engine().begin() as conn:
+        for offset in range(start, stop, 10_000):
+            rows = [
+                {"email": synthetic_email(i), "full_name": f"User {i}", "hashed_password": "x", "role": models.UserRole.user}
+                for i in range(offset, min(offset + 10_000, stop))
+            ]
+            await conn.execute(insert(models.User), rows)
+
+
+async def median_ms(fn) -> float:
+    timings = []
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        await fn()
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+async def main():
+    await init_db()
+    print(f"{'users':>9} | {'build s':>7} | {'term':>15} | {'index ms':>9} | {'ILIKE ms':>9}")
+    size = 0
+    for target in TABLE_SIZES:
+        await grow_table(size, target)
+        size = target
+
+        async with SessionLocal() as db:
+            started = time.perf_counter()
+            index = EmailSearchIndex()
+            index.build((await db.execute(select(models.User.id, models.User.email))).all())
+            build_seconds = time.perf_counter() - started
+
+            for term in TERMS:
+                async def indexed():
+                    index.search(term, 10)
+
+                async def ilike():
+                    await db.execute(select(models.User).where(models.User.email.ilike(f"%{term}%")).limit(10))
+
+                index_ms = await median_ms(indexed)
+                ilike_ms = await median_ms(ilike)
+                print(f"{size:>9} | {build_seconds:>7.1f} | {term:>15} | {index_ms:>9.3f} | {ilike_ms:>9.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,31 @@
+"""
+Cost of minting an access token from an already loaded user.
+
+create_access_token only signs the claims, there is no database access, so
+it should stay well under a millisecond per token:
+
+    python benchmarks/bench_token_issuance.py
+"""
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import models
+from app.dependencies import create_access_token
+
+ITERATIONS = 2000
+
+
+def run():
+    user = models.User(id=1, email="bench@example.com", full_name="Bench", role=models.UserRole.user)
+    started = time.perf_counter()
+    for _ in range(ITERATIONS):
+        create_access_token(user)
+    per_token_us = (time.perf_counter() - started) / ITERATIONS * 1e6
+    print(f"create_access_token: {per_token_us:.1f}us/token over {ITERATIONS} tokens")
+
+
+if __name__ == "__main__":
+    run()
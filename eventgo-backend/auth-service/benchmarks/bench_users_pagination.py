@@ -0,0 +1,84 @@
+"""
+Peak memory of listing users as the table grows.
+
+Compares one keyset page of GET /users with walking every page and with the
+old "SELECT * FROM users" response. Runs on a throwaway SQLite database:
+
+    python benchmarks/bench_users_pagination.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+os.environ["DATABASE_URL"] = f"sqlite+aiosqlite:///{tempfile.mkdtemp()}/bench.db"
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from sqlalchemy import insert, select
+
+from app import models
+from app.database import SessionLocal, get_engine
+from app.init_db import init_db
+from app.main import app
+
+TABLE_SIZES = [1_000, 10_000, 100_000]
+
+
+async def grow_table(start: int, stop: int):
+    rows = [
+        {"email": f"user{i}@example.com", "full_name": f"User {i}", "hashed_password": "x", "role": models.UserRole.user}
+        for i in range(start, stop)
+    ]
+    async with get_engine().begin() as conn:
+        for offset in range(0, len(rows), 10_000):
+            await conn.execute(insert(models.User), rows[offset:offset + 10_000])
+
+
+async def measure(coro_fn):
+    tracemalloc.start()
+    started = time.perf_counter()
+    await coro_fn()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024, elapsed * 1000
+
+
+async def main():
+    await init_db()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://auth") as client:
+
+        async def one_page():
+            (await client.get("/users", params={"limit": 100})).raise_for_status()
+
+        async def every_page():
+            cursor = None
+            while True:
+                params = {"limit": 100, **({"after_id": cursor} if cursor else {})}
+                cursor = (await client.get("/users", params=params)).json()["next_cursor"]
+                if cursor is None:
+                    return
+
+        async def whole_table():
+            async with SessionLocal() as db:
+                users = (await db.execute(select(models.User))).scalars().all()
+                [{"id": u.id, "email": u.email, "full_name": u.full_name} for u in users]
+
+        print(f"{'users':>8} | {'page KiB':>9} {'page ms':>8} | {'all pages KiB':>13} | {'SELECT * KiB':>12}")
+        size = 0
+        for target in TABLE_SIZES:
+            await grow_table(size, target)
+            size = target
+            await one_page()  # Warm up statement caches before measuring
+            page_kib, page_ms = await measure(one_page)
+            walk_kib, _ = await measure(every_page)
+            table_kib, _ = await measure(whole_table)
+            print(f"{size:>8} | {page_kib:>9.0f} {page_ms:>8.1f} | {walk_kib:>13.0f} | {table_kib:>12.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
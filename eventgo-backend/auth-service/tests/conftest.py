@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+import time
+
+import pytest
+
+# Point the service at a throwaway SQLite database before app.database is imported
+_db_dir = tempfile.mkdtemp(prefix="auth-service-tests-")
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{_db_dir}/auth.db")
+
+# Add the parent directory to the path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi.testclient import TestClient
+from sqlalchemy import event
+
+from app.database import get_engine
+from app.main import app
+
+
+@pytest.fixture(scope="session")
+def client():
+    with TestClient(app) as test_client:
+        # The database is prepared in the background after startup
+        deadline = time.monotonic() + 10
+        while test_client.get("/health/ready").status_code != 200:
+            assert time.monotonic() < deadline, "auth-service never became ready"
+            time.sleep(0.01)
+        yield test_client
+
+
+@pytest.fixture
+def statements():
+    """Collect every SQL statement sent to the database during a test."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+
+    event.listen(get_engine().sync_engine, "before_cursor_execute", record)
+    yield executed
+    event.remove(get_engine().sync_engine, "before_cursor_execute", record)
@@ -0,0 +1,70 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import HTTPException
+
+from app import main
+from app.password_hasher import PasswordHasher
+
+
+def blocking(started: threading.Event, release: threading.Event) -> str:
+    started.set()
+    release.wait(5)
+    return "hashed"
+
+
+def test_saturated_hasher_rejects_with_503():
+    hasher = PasswordHasher(workers=1, max_pending=1)
+    # Threads instead of processes so the test controls when a call finishes
+    hasher._executor = ThreadPoolExecutor(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    async def run():
+        first = asyncio.create_task(hasher._run(blocking, started, release))
+        assert await asyncio.to_thread(started.wait, 5)  # The worker is now busy with it
+        assert hasher.in_flight == 1
+        with pytest.raises(HTTPException) as rejected:
+            await hasher._run(blocking, started, release)
+        release.set()
+        return await first, rejected.value
+
+    result, error = asyncio.run(run())
+
+    assert result == "hashed"
+    assert error.status_code == 503 and error.headers == {"Retry-After": "1"}
+    snapshot = hasher.snapshot()
+    assert snapshot["completed"] == 1 and snapshot["rejected"] == 1
+    assert snapshot["in_flight"] == 0 and snapshot["queue_depth"] == 0
+    hasher.shutdown()
+
+
+def test_queue_depth_counts_calls_waiting_for_a_worker():
+    hasher = PasswordHasher(workers=1, max_pending=3)
+    hasher._executor = ThreadPoolExecutor(max_workers=1)
+    started, release = threading.Event(), threading.Event()
+
+    async def run():
+        calls = [asyncio.create_task(hasher._run(blocking, started, release)) for _ in range(3)]
+        # The first call holds the only worker, the other two were submitted behind it
+        assert await asyncio.to_thread(started.wait, 5)
+        depth = hasher.queue_depth
+        release.set()
+        await asyncio.gather(*calls)
+        return depth
+
+    assert asyncio.run(run()) == 2
+    assert hasher.snapshot()["completed"] == 3
+    hasher.shutdown()
+
+
+def test_register_returns_503_and_metrics_count_it(client, monkeypatch):
+    before = client.get("/metrics").json()["password_hashing"]["rejected"]
+    monkeypatch.setattr(main.password_hasher, "max_pending", 0)
+
+    response = client.post("/register", json={"email": "busy@example.com", "full_name": "Busy", "password": "pw"})
+
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "1"
+    assert client.get("/metrics").json()["password_hashing"]["rejected"] == before + 1
@@ -0,0 +1,50 @@
+import asyncio
+
+from app.database import SessionLocal
+from app.search_index import EmailSearchIndex, search_database
+
+
+def register(client, *emails):
+    for email in emails:
+        client.post("/register", json={"email": email, "full_name": "Search", "password": "pw"})
+
+
+def test_prefix_matches_rank_first(client, statements):
+    register(client, "zz-marta@example.com", "marta@example.com", "anna.marta@example.com")
+    statements.clear()
+
+    users = client.get("/search-users", params={"email": "MARTA"}).json()
+
+    assert [user["email"] for user in users] == [
+        "marta@example.com",
+        "anna.marta@example.com",
+        "zz-marta@example.com",
+    ]
+    assert not any("FROM users" in statement for statement in statements)
+
+
+def test_no_match(client):
+    assert client.get("/search-users", params={"email": "nobody-here"}).json() == {"message": "No users found"}
+
+
+def test_database_search_ranks_like_the_index(client):
+    register(client, "db_rank@example.com", "x-db_rank@example.com", "dbxrank@example.com")
+
+    async def search():
+        async with SessionLocal() as db:
+            return await search_database(db, "DB_RANK", 10)
+
+    # "_" is escaped, so dbxrank does not match
+    assert [email for _, email in asyncio.run(search())] == ["db_rank@example.com", "x-db_rank@example.com"]
+
+
+def test_index_follows_email_changes_and_short_terms():
+    index = EmailSearchIndex()
+    index.build([(1, "Alice@example.com"), (2, "bob@example.com")])
+    index.add(1, "carol@example.com")
+    index.add(3, "al@example.org")
+
+    assert index.search("alice") == []
+    assert index.search("al") == [(3, "al@example.org")]
+    assert index.search("ob@") == [(2, "bob@example.com")]
+    assert index.search("example", limit=2) == [(3, "al@example.org"), (2, "bob@example.com")]
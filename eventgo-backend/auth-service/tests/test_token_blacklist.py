@@ -0,0 +1,105 @@
+import asyncio
+import fnmatch
+import time
+
+import pytest
+
+from app.token_blacklist import InMemoryRevocationStore, RedisRevocationStore
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = time.time()
+
+    def __call__(self):
+        return self.now
+
+
+class FakeRedis:
+    """Just enough of redis.asyncio.Redis for RedisRevocationStore, with key expiry."""
+
+    def __init__(self, clock):
+        self.clock = clock
+        self.data = {}
+
+    def _alive(self, name):
+        entry = self.data.get(name)
+        if entry and entry[1] <= self.clock():
+            del self.data[name]
+            return False
+        return entry is not None
+
+    async def set(self, name, value, ex=None):
+        self.data[name] = (value, self.clock() + ex if ex else float("inf"))
+
+    async def exists(self, name):
+        return int(self._alive(name))
+
+    async def ttl(self, name):
+        return int(self.data[name][1] - self.clock()) if self._alive(name) else -2
+
+    async def scan_iter(self, match="*"):
+        for name in list(self.data):
+            if self._alive(name) and fnmatch.fnmatch(name, match):
+                yield name.encode()
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture(params=["memory", "redis"])
+def store(request, clock):
+    if request.param == "memory":
+        return InMemoryRevocationStore(clock=clock)
+    return RedisRevocationStore(FakeRedis(clock), clock=clock)
+
+
+def test_store_tracks_unexpired_tokens(store, clock):
+    asyncio.run(store.add("live", clock() + 60))
+    asyncio.run(store.add("already-expired", clock() - 1))
+
+    assert asyncio.run(store.contains("live"))
+    assert not asyncio.run(store.contains("already-expired"))
+    assert asyncio.run(store.keys()) == ["live"]
+
+
+def test_store_forgets_tokens_once_they_expire(store, clock):
+    asyncio.run(store.add("short", clock() + 0.05))
+    if isinstance(store, RedisRevocationStore):
+        # Redis TTLs are whole seconds, rounded up so the key never expires before the token
+        assert asyncio.run(store.client.ttl(store.prefix + "short")) == 1
+    clock.now += 1.1
+
+    assert not asyncio.run(store.contains("short"))
+    assert asyncio.run(store.keys()) == []
+
+
+def test_memory_is_bounded_by_unexpired_tokens(clock):
+    store = InMemoryRevocationStore(clock=clock)
+    now = clock()
+
+    async def add_many():
+        for i in range(1000):
+            await store.add(f"old-{i}", now + 0.01)
+        clock.now += 0.02
+        await store.add("new", now + 60)
+
+    asyncio.run(add_many())
+
+    assert len(store) == 1
+    assert len(store._heap) == 1
+
+
+def test_logout_revokes_token_by_jti(client):
+    client.post("/register", json={"email": "leaver@example.com", "full_name": "Leaver", "password": "pw"})
+    token = client.post("/login", data={"username": "leaver@example.com", "password": "pw"}).json()["access_token"]
+    assert client.post("/validate-token", json={"token": token}).status_code == 200
+
+    client.post("/logout", cookies={"access_token": f"Bearer {token}"})
+
+    assert client.post("/validate-token", json={"token": token}).status_code == 401
+    revoked = client.get("/revoked-tokens").json()["revoked"]
+    assert token not in revoked
+    assert revoked and all(len(key) == 32 for key in revoked)  # uuid4 hex jti, not the token itself
@@ -0,0 +1,33 @@
+from jose import jwt
+
+from app import models
+from app.dependencies import create_access_token, SECRET_KEY, ALGORITHM
+
+
+def user_selects(statements):
+    return [s for s in statements if s.lstrip().upper().startswith("SELECT") and "users" in s]
+
+
+def test_login_does_one_user_lookup(client, statements):
+    """Login loads the user once and mints the token from that row."""
+    client.post("/register", json={"email": "issuer@example.com", "full_name": "Issuer", "password": "pw"})
+    statements.clear()
+
+    response = client.post("/login", data={"username": "issuer@example.com", "password": "pw"})
+
+    assert response.status_code == 200
+    assert len(user_selects(statements)) == 1
+    claims = jwt.decode(response.json()["access_token"], SECRET_KEY, algorithms=[ALGORITHM])
+    assert claims["sub"] == "issuer@example.com"
+    assert claims["role"] == "user"
+    assert isinstance(claims["user_id"], int)
+
+
+def test_token_issuance_does_no_database_access(statements):
+    """Minting only signs the claims of the loaded user, see benchmarks/bench_token_issuance.py for timing."""
+    user = models.User(id=1, email="bench@example.com", full_name="Bench", role=models.UserRole.user)
+
+    for _ in range(10):
+        create_access_token(user)
+
+    assert statements == []
@@ -0,0 +1,47 @@
+import time
+
+from app.user_cache import CachedUser, UserCache, user_cache
+from app import models
+
+
+def make_user(user_id, email):
+    return CachedUser(id=user_id, email=email, full_name="Cached", role=models.UserRole.user, is_active=True)
+
+
+def test_validate_token_hits_cache_without_queries(client, statements):
+    """Steady-state token validation does zero DB queries."""
+    client.post("/register", json={"email": "steady@example.com", "full_name": "Steady", "password": "pw"})
+    token = client.post("/login", data={"username": "steady@example.com", "password": "pw"}).json()["access_token"]
+    client.post("/validate-token", json={"token": token})
+    hits_before = user_cache.hits
+    statements.clear()
+
+    for _ in range(5):
+        assert client.post("/validate-token", json={"token": token}).status_code == 200
+
+    assert statements == []
+    assert user_cache.hits == hits_before + 5
+    assert client.get("/metrics").json()["user_cache"]["hits"] >= 5
+
+
+def test_lru_eviction_and_ttl():
+    cache = UserCache(max_size=2, ttl=0.05)
+    cache.put(make_user(1, "one@example.com"))
+    cache.put(make_user(2, "two@example.com"))
+    cache.get_by_id(1)
+    cache.put(make_user(3, "three@example.com"))
+
+    assert cache.get_by_email("two@example.com") is None  # Least recently used
+    assert cache.get_by_email("one@example.com").id == 1
+    time.sleep(0.06)
+    assert cache.get_by_id(3) is None
+
+
+def test_invalidate_by_email_drops_id_entry():
+    cache = UserCache()
+    cache.put(make_user(1, "one@example.com"))
+
+    cache.invalidate(email="one@example.com")
+
+    assert cache.get_by_id(1) is None
+    assert cache.snapshot()["size"] == 0
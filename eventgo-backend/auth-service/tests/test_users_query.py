@@ -0,0 +1,56 @@
+import json
+
+from app import main
+
+
+def register(client, count, prefix):
+    for i in range(count):
+        client.post("/register", json={"email": f"{prefix}{i}@example.com", "full_name": f"User {i}", "password": "pw"})
+    return [user["id"] for user in list_all_users(client) if user["email"].startswith(prefix)]
+
+
+def list_all_users(client, **params):
+    users, cursor = [], None
+    while True:
+        page = client.get("/users", params={**params, "limit": 2, **({"after_id": cursor} if cursor else {})}).json()
+        users.extend(page["items"])
+        cursor = page["next_cursor"]
+        if cursor is None:
+            return users
+
+
+def test_default_fields_match_previous_response(client):
+    ids = register(client, 2, "query-default-")
+
+    users = client.post("/users/query", json={"ids": ids}).json()
+
+    assert sorted(u["id"] for u in users) == sorted(ids)
+    assert set(users[0]) == {"id", "email", "full_name", "role"}
+    assert users[0]["role"] == "user"
+
+
+def test_projection_and_ndjson_stream(client, monkeypatch):
+    ids = register(client, 5, "query-stream-")
+    monkeypatch.setattr(main, "USERS_QUERY_CHUNK_SIZE", 2)
+
+    response = client.post(
+        "/users/query",
+        json={"ids": ids + ids + [999999], "fields": ["email"]},
+        headers={"Accept": "application/x-ndjson"},
+    )
+
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    users = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted(u["id"] for u in users) == sorted(ids)  # Duplicates and unknown ids dropped
+    assert all(set(u) == {"id", "email"} for u in users)
+
+
+def test_users_keyset_pagination(client):
+    ids = register(client, 3, "page-")
+
+    listed = list_all_users(client)
+
+    assert [u["id"] for u in listed] == sorted(u["id"] for u in listed)  # No duplicates or gaps
+    assert set(ids) <= {u["id"] for u in listed}
+    assert list_all_users(client, role="admin") == []
+    assert client.get("/users", params={"limit": 1000}).status_code == 422  # Page size is capped
@@ -1,12 +1,14 @@
 import os
+import json
 import asyncio
 import httpx
 from collections import defaultdict
 from fastapi import FastAPI
 from pydantic import BaseModel
 from app.rabbitmq import publish_notification
+from eventgo_shared.refunds import refund_in_batches
+from eventgo_shared.templates import NotificationTemplate, event_fields
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime
 app = FastAPI(title="Event Cancellation Service")
 
 app.add_middleware(
@@ -22,6 +24,19 @@ EVENTS_URL  = os.getenv("EVENTS_API_URL", 'https://personal-vyyhsf3d.outsystemsc
 TICKETS_URL = os.getenv("TICKETS_URL", 'http://ticket-inventory:8080')
 STRIPE_URL  = os.getenv("STRIPE_SERVICE_URL", 'http://stripe-service:8000')
 
+EVENT_CANCELLED = NotificationTemplate(
+    subject="Important Notice: The Event '{title}' Has Been Canceled",
+    message=(
+        "Hello {full_name},\n\n"
+        "We regret to inform you that '{title}' scheduled for {date} at {venue} has been canceled. "
+        "Your tickets {seat_numbers} have been refunded automatically—no action is needed. "
+        "Total refunded amount: ${amount:.2f}. Refund status: {status}.\n\n"
+        "If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
+        "We apologize for the inconvenience and appreciate your understanding.\n\n"
+        "Sincerely,\nEventGo Customer Support"
+    ),
+)
+
 class RefundOutcome(BaseModel):
     """Summary of refund results for a given payment intent."""
     user_id: int
@@ -36,8 +51,10 @@ async def cancel_event(event_id: int):
     Cancels an event by:
     1. Marking the event cancelled in the Events service.
     2. Cancelling all associated tickets in the Tickets service.
-    3. Grouping cancellations by payment_intent_id to issue a single refund per intent.
-    4. Sending one notification per user with total refunded amount and ticket details.
+    3. Grouping cancellations by payment_intent_id to issue a single refund per intent,
+       sent to stripe-service in batches.
+    4. Sending one notification per user with total refunded amount and ticket details,
+       as soon as that user's refund is done.
 
     Returns a summary of refund outcomes.
     """
@@ -59,49 +76,71 @@ async def cancel_event(event_id: int):
                 grouped[str(pid)].append(rec)
 
         user_ids = list({r["user_id"] for recs in grouped.values() for r in recs})
-        users_resp = await client.post(f"{AUTH_URL}/users/query", json={"ids": user_ids})
-        users_resp.raise_for_status()
-        users = {u["id"]: u for u in users_resp.json()}
+        users = await fetch_users(client, user_ids)
 
-        tasks = [process_group(client, pid, recs, users[recs[0]["user_id"]], event) for pid, recs in grouped.items()]
-        results = await asyncio.gather(*tasks)
+        # Title, venue and formatted date are the same in every email
+        fields = event_fields(event)
+        refunds = [
+            # Cancelling the event again never refunds an intent twice
+            {"payment_intent_id": pid, "idempotency_key": f"event-cancel-{event_id}-{pid}"}
+            for pid in grouped
+        ]
+        tasks = {}
+        async for result in refund_in_batches(client, STRIPE_URL, refunds):
+            pid = result["payment_intent_id"]
+            if result["error"] is None:
+                status = result["refund"].get("status", "unknown")
+            else:
+                print(f"Refund failed for payment intent {pid}: {result['error']}")
+                status = "error"
+            recs = grouped[pid]
+            tasks[pid] = asyncio.create_task(process_group(pid, recs, users[recs[0]["user_id"]], fields, status))
+        results = await asyncio.gather(*(tasks[pid] for pid in grouped))
         return {"status": "completed", "results": [r.dict() for r in results]}
 
-async def process_group(client: httpx.AsyncClient, payment_intent_id: str, records: list[dict], user: dict, event: dict) -> RefundOutcome:
+async def fetch_users(client: httpx.AsyncClient, user_ids: list[int]) -> dict[int, dict]:
+    """
+    Fetches only the user fields needed for notifications, streamed as NDJSON so
+    large events are never materialized as one JSON list.
+    """
+    users = {}
+    async with client.stream(
+        "POST",
+        f"{AUTH_URL}/users/query",
+        json={"ids": user_ids, "fields": ["id", "email", "full_name"]},
+        headers={"Accept": "application/x-ndjson"},
+    ) as users_resp:
+        users_resp.raise_for_status()
+        async for line in users_resp.aiter_lines():
+            if line:
+                user = json.loads(line)
+                users[user["id"]] = user
+    return users
+
+async def process_group(payment_intent_id: str, records: list[dict], user: dict, fields: dict, status: str) -> RefundOutcome:
     """
-    Issues a refund for all tickets sharing the same payment_intent_id and sends a notification.
+    Sends the cancellation notification for all tickets sharing the same payment_intent_id.
 
     Args:
-        client: HTTP client
         payment_intent_id: Stripe payment intent ID
         records: List of ticket cancellation records
         user: User object
-        event: Event details dict
+        fields: Event template fields, see ``event_fields``
+        status: Status of the intent's refund, "error" if it failed
 
     Returns:
         RefundOutcome with refund details.
     """
     total_amount = sum(rec.get("price", 0.0) for rec in records)
-    refund_resp = await client.post(f"{STRIPE_URL}/refund", json={"payment_intent_id": payment_intent_id})
-
-    try:
-        refund_resp.raise_for_status()
-        status = refund_resp.json().get("status", "unknown")
-    except httpx.HTTPStatusError:
-        status = f"error ({refund_resp.status_code})"
 
     ticket_ids = [rec["ticket_id"] for rec in records]
     seat_numbers = [rec.get("seat_number", str(rec.get("ticket_id"))) for rec in records]
-    formatted_date = datetime.fromisoformat(event.get("date").replace("Z", "+00:00")).strftime("%B %d, %Y at %I:%M %p")
-    subject = f"Important Notice: The Event '{event.get('title')}' Has Been Canceled"
-    message = (
-        f"Hello {user.get('full_name', '')},\n\n"
-        f"We regret to inform you that '{event.get('title')}' scheduled for {formatted_date} at {event.get('venue')} has been canceled. "
-        f"Your tickets {', '.join(seat_numbers)} have been refunded automatically—no action is needed. "
-        f"Total refunded amount: ${total_amount:.2f}. Refund status: {status}.\n\n"
-        f"If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
-        "We apologize for the inconvenience and appreciate your understanding.\n\n"
-        "Sincerely,\nEventGo Customer Support"
+    subject, message = EVENT_CANCELLED.render(
+        **fields,
+        full_name=user.get("full_name", ""),
+        seat_numbers=", ".join(seat_numbers),
+        amount=total_amount,
+        status=status,
     )
 
     await publish_notification({
@@ -0,0 +1,66 @@
+"""
+Shared outbound HTTP client.
+
+One ``httpx.AsyncClient`` per event loop keeps connections to Stripe service,
+auth, ticket-inventory and the events API alive between requests. Each of
+those hosts gets its own transport, so a slow service can hold at most
+HTTP_MAX_CONNECTIONS_PER_HOST connections and never starves the others.
+"""
+from urllib.parse import urlsplit
+import asyncio
+import os
+import weakref
+
+import httpx
+
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", 10))  # Seconds for read, write and pool waits
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 3))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.getenv("HTTP_MAX_CONNECTIONS_PER_HOST", 20))
+HTTP_MAX_KEEPALIVE_PER_HOST = int(os.getenv("HTTP_MAX_KEEPALIVE_PER_HOST", 10))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30))
+
+# httpx connections belong to the loop that opened them, a client is dropped together with its loop
+_clients: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, httpx.AsyncClient]" = weakref.WeakKeyDictionary()
+_hosts: list[str] = []
+
+
+def register_hosts(*urls: str | None):
+    """Give each service base URL its own connection pool."""
+    for url in urls:
+        if url and urlsplit(url).netloc and url not in _hosts:
+            _hosts.append(url)
+
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_PER_HOST,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+
+
+def create_http_client() -> httpx.AsyncClient:
+    mounts = {}
+    for url in _hosts:
+        parts = urlsplit(url)
+        mounts[f"{parts.scheme}://{parts.netloc}"] = httpx.AsyncHTTPTransport(limits=_limits())
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        limits=_limits(),
+        mounts=mounts,
+    )
+
+
+def get_http_client() -> httpx.AsyncClient:
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = _clients[loop] = create_http_client()
+    return client
+
+
+async def close_http_client():
+    """Close the running loop's client."""
+    client = _clients.pop(asyncio.get_running_loop(), None)
+    if client is not None:
+        await client.aclose()
@@ -1,20 +1,29 @@
-from fastapi import FastAPI, HTTPException, Request, BackgroundTasks
+from fastapi import FastAPI, Request, BackgroundTasks
 from fastapi.middleware.cors import CORSMiddleware
 import asyncio
 import os
 import stripe
 import datetime
-import requests
+import httpx
 import json
-import pika
 from . import schemas
 from dotenv import load_dotenv
-import pika
 import json
-from datetime import datetime
 
 load_dotenv()
 
+from eventgo_shared.event_cache import EventCache, events_api_loader
+from eventgo_shared.refunds import refund_in_batches
+from eventgo_shared.templates import NotificationTemplate, event_fields
+
+from .http_client import HTTP_TIMEOUT, close_http_client, get_http_client, register_hosts
+from .publisher import NOTIFICATION_ROUTING_KEY, publisher
+from .refund_ledger import FAILED, REFUNDED, refund_idempotency_key, refund_key, refund_ledger
+from .scheduler import ScheduledCheck, scheduler
+from .split_tracker import split_tracker
+from .seen_events import seen_events
+from .webhook_queue import webhook_queue
+
 app = FastAPI(title="Parting Booking Service")
 
 app.add_middleware(
@@ -25,6 +34,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+background_workers: list[asyncio.Task] = []
+
+
+@app.on_event("startup")
+async def startup():
+    await seen_events.load()
+    background_workers.append(asyncio.create_task(seen_events.run()))
+    background_workers.append(asyncio.create_task(scheduler.run(run_split_check)))
+    background_workers.append(asyncio.create_task(webhook_queue.run(handle_webhook)))
+
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_workers:
+        task.cancel()
+    await close_http_client()
+    publisher.close()
+    scheduler.close()
+    refund_ledger.close()
+    split_tracker.close()
+    webhook_queue.close()
+    seen_events.close()
+
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
 
 # Service URLs
@@ -33,56 +66,51 @@ TICKET_INVENTORY_URL = os.environ.get("TICKET_INVENTORY_URL")
 TICKET_TRANSFER_URL = os.environ.get("TICKET_TRANSFER_URL")
 AUTH_URL   = os.getenv("AUTH_API_URL", "http://auth-service:8000")
 EVENTS_URL = os.getenv("EVENTS_API_URL", "https://personal-vyyhsf3d.outsystemscloud.com/EventsOutsystem/rest/EventsAPI")
+SPLIT_CHECK_DELAY = float(os.getenv("SPLIT_CHECK_DELAY", 75))  # Seconds the party has to pay before refunds
+# Seconds to wait for ticket-transfer, which waits on a Stripe refund and its retries
+TRANSFER_READ_TIMEOUT = float(os.getenv("TRANSFER_READ_TIMEOUT", 60))
 
-# RabbitMQ Configuration
-RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "rabbitmq")
-RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
-RABBITMQ_USERNAME = os.environ.get("RABBITMQ_USERNAME", "guest")
-RABBITMQ_PASSWORD = os.environ.get("RABBITMQ_PASSWORD", "guest")
-NOTIFICATION_EXCHANGE = os.environ.get("NOTIFICATION_EXCHANGE", "notification_exchange")
-NOTIFICATION_ROUTING_KEY = os.environ.get("NOTIFICATION_ROUTING_KEY", "notification.queue")
+register_hosts(STRIPE_SERVICE_URL, TICKET_INVENTORY_URL, TICKET_TRANSFER_URL, AUTH_URL, EVENTS_URL)
+event_cache = EventCache(events_api_loader(EVENTS_URL, get_http_client))
 
 def publish_message(message, routing_key=NOTIFICATION_ROUTING_KEY):
     """
     Publish a message to RabbitMQ
     """
-    try:
-        # Setup RabbitMQ connection
-        credentials = pika.PlainCredentials(RABBITMQ_USERNAME, RABBITMQ_PASSWORD)
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=RABBITMQ_HOST,
-                port=RABBITMQ_PORT,
-                credentials=credentials
-            )
-        )
-        channel = connection.channel()
-        
-        # Ensure exchange exists
-        channel.exchange_declare(
-            exchange=NOTIFICATION_EXCHANGE,
-            exchange_type='topic',
-            durable=True
-        )
-        
-        # Publish message
-        channel.basic_publish(
-            exchange="",
-            routing_key=routing_key,
-            body=json.dumps(message),
-            properties=pika.BasicProperties(delivery_mode=2, content_type='application/json')
-        )
-        
-        # print(f"Published message with ID {message_id} to exchange {NOTIFICATION_EXCHANGE}")
-        connection.close()
-        return True
-    except Exception as e:
-        print(f"Failed to publish message: {str(e)}")
-        return False
+    return publisher.publish(message, routing_key)
     
-def send_refund_notification(user_id: int, event_id: int, ticket_id: int, amount_cents: int, reason: str = ""):
+REFUND_PROCESSED = NotificationTemplate(
+    subject="Refund Processed: '{title}'",
+    message=(
+        "Hello {full_name},\n\n"
+        "Your refund for '{title}' (scheduled for {date} at {venue}) has been successfully processed.\n\n"
+        "Refund Details:\n"
+        "- Ticket Number: #{ticket_id}\n"
+        "- Amount Refunded: ${amount:.2f}\n"
+        "{reason_line}"
+        "The refund may take 5-10 business days to appear in your account, depending on your payment method "
+        "and financial institution.\n\n"
+        "If you have any questions about this refund, visit our Help Center at https://help.eventgo.com "
+        "or reply to this email.\n\n"
+        "Sincerely,\nEventGo Customer Support"
+    ),
+)
+
+PAYMENT_LINK = NotificationTemplate(
+    subject="{subject_prefix}: '{title}'",
+    message=(
+        "Hello {full_name},\n\n"
+        "You’re invited to '{title}' on {date} at {venue}. "
+        "Please complete your payment of ${amount:.2f} for ticket #{ticket_id} by clicking below:\n\n"
+        "{url}\n\n"
+        "If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
+        "Sincerely,\nEventGo Customer Support"
+    ),
+)
+
+async def build_refund_notification(user_id: int, event_id: int, ticket_id: int, amount_cents: int, reason: str = ""):
     """
-    Send a notification when a refund is processed
+    Build the notification sent when a refund is processed, or None if it can't be built
     
     Args:
         user_id: ID of the user receiving the refund
@@ -91,94 +119,174 @@ def send_refund_notification(user_id: int, event_id: int, ticket_id: int, amount
         amount_cents: Amount being refunded in cents
         reason: Optional reason for refund
     """
+    client = get_http_client()
     try:
         # Get user information
-        user_response = requests.get(f"{AUTH_URL}/users/{user_id}")
+        user_response = await client.get(f"{AUTH_URL}/users/{user_id}")
         if user_response.status_code != 200:
             print(f"Failed to get user information for ID {user_id}")
-            return False
+            return None
             
         user = user_response.json()
         
         # Get event information
-        event_response = requests.get(f"{EVENTS_URL}/events/{event_id}")
-        if event_response.status_code != 200:
+        try:
+            event = await fetch_event(event_id)
+        except httpx.HTTPError:
             print(f"Failed to get event information for ID {event_id}")
-            return False
-            
-        event = event_response.json().get("EventAPI", {})
-        
-        # Format the event date nicely
-        formatted_date = datetime.fromisoformat(event["date"].replace("Z","+00:00")).strftime("%B %d, %Y at %I:%M %p")
-        
-        # Create a subject line
-        subject = f"Refund Processed: '{event['title']}'"
+            return None
         
-        # Create a message body
-        message = (
-            f"Hello {user['full_name']},\n\n"
-            f"Your refund for '{event['title']}' (scheduled for {formatted_date} at {event['venue']}) "
-            f"has been successfully processed.\n\n"
-            f"Refund Details:\n"
-            f"- Ticket Number: #{ticket_id}\n"
-            f"- Amount Refunded: ${amount_cents/100:.2f}\n"
+        subject, message = REFUND_PROCESSED.render(
+            **event_fields(event),
+            full_name=user["full_name"],
+            ticket_id=ticket_id,
+            amount=amount_cents / 100,
+            reason_line=f"- Reason: {reason}\n\n" if reason else "\n",
         )
         
-        # Add reason if provided
-        if reason:
-            message += f"- Reason: {reason}\n\n"
-        else:
-            message += "\n"
-            
-        # Add standard footer message
-        message += (
-            "The refund may take 5-10 business days to appear in your account, depending on your payment method "
-            "and financial institution.\n\n"
-            "If you have any questions about this refund, visit our Help Center at https://help.eventgo.com "
-            "or reply to this email.\n\n"
-            "Sincerely,\nEventGo Customer Support"
-        )
-        
-        # Publish notification to RabbitMQ
-        publish_success = publish_message({
+        return {
             "subject": subject, 
             "message": message, 
             "recipientEmailAddress": user["email"]
-        })
-        
-        if publish_success:
-            print(f"Successfully sent refund notification to {user['email']}")
-            return True
-        else:
-            print(f"Failed to send refund notification to {user['email']}")
-            return False
+        }
             
     except Exception as e:
-        print(f"Error sending refund notification: {str(e)}")
-        return False
+        print(f"Error building refund notification: {str(e)}")
+        return None
 
 
-def send_payment_notification(user_id: int, event_id: int, ticket_id: int, amount_cents: int, url: str, subject_prefix: str):
-    user = requests.get(f"{AUTH_URL}/users/{user_id}").json()
-    event = requests.get(f"{EVENTS_URL}/events/{event_id}").json().get("EventAPI", {})
+async def fetch_users(user_ids: list[int]) -> dict[int, dict]:
+    """All users in one /users/query call, keyed by id."""
+    response = await get_http_client().post(
+        f"{AUTH_URL}/users/query",
+        json={"ids": list(dict.fromkeys(user_ids)), "fields": ["id", "email", "full_name"]},
+    )
+    response.raise_for_status()
+    return {user["id"]: user for user in response.json()}
 
-    formatted_date = datetime.fromisoformat(event["date"].replace("Z","+00:00")).strftime("%B %d, %Y at %I:%M %p")
-    subject = f"{subject_prefix}: '{event['title']}'"
-    message = (
-        f"Hello {user['full_name']},\n\n"
-        f"You’re invited to '{event['title']}' on {formatted_date} at {event['venue']}. "
-        f"Please complete your payment of ${amount_cents/100:.2f} for ticket #{ticket_id} by clicking below:\n\n"
-        f"{url}\n\n"
-        "If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
-        "Sincerely,\nEventGo Customer Support"
+
+async def fetch_event(event_id) -> dict:
+    """Event details from the shared cache, concurrent misses make one Events API call."""
+    return await event_cache.get(event_id)
+
+
+def format_payment_notification(user: dict, event: dict, ticket_id: int, amount_cents: int, url: str, subject_prefix: str):
+    subject, message = PAYMENT_LINK.render(
+        **event_fields(event),
+        full_name=user["full_name"],
+        ticket_id=ticket_id,
+        amount=amount_cents / 100,
+        url=url,
+        subject_prefix=subject_prefix,
     )
 
-    publish_message({"subject": subject, "message": message, "recipientEmailAddress": user["email"]})
+    return {"subject": subject, "message": message, "recipientEmailAddress": user["email"]}
+
+
+async def build_payment_notification(user_id: int, event_id: int, ticket_id: int, amount_cents: int, url: str, subject_prefix: str):
+    client = get_http_client()
+    user_response, event = await asyncio.gather(client.get(f"{AUTH_URL}/users/{user_id}"), fetch_event(event_id))
+    return format_payment_notification(user_response.json(), event, ticket_id, amount_cents, url, subject_prefix)
+
+
+async def notify_payment_links(event_id, payment_links: list[dict]):
+    """
+    Email every participant their payment link: one /users/query call and one
+    event fetch (concurrently) for the whole party, then one published batch.
+    """
+    if not payment_links:
+        return
+    try:
+        users, event = await asyncio.gather(
+            fetch_users([int(link["user_id"]) for link in payment_links]),
+            fetch_event(event_id),
+        )
+    except httpx.HTTPError as e:
+        print(f"Failed to load participants for payment link notifications: {str(e)}")
+        return
+
+    recipients = []
+    for link in payment_links:
+        user = users.get(int(link["user_id"]))
+        if user is None:
+            print(f"Failed to get user information for ID {link['user_id']}")
+            continue
+        recipients.append({
+            "full_name": user["full_name"],
+            "email": user["email"],
+            "ticket_id": link["ticket_id"],
+            "amount": link["amount"] / 100,
+            "url": link["url"],
+        })
+    rendered = PAYMENT_LINK.render_batch(event, recipients, subject_prefix="Action Required: Complete Your Payment")
+    notifications = [
+        {"subject": subject, "message": message, "recipientEmailAddress": recipient["email"]}
+        for recipient, (subject, message) in zip(recipients, rendered)
+    ]
+
+    # Publish every participant's payment link as one batch
+    sent = await asyncio.to_thread(publisher.publish_many, notifications)
+    print(f"Published {sent}/{len(notifications)} payment links to notification queue")
+
+
+async def send_payment_notification(user_id: int, event_id: int, ticket_id: int, amount_cents: int, url: str, subject_prefix: str):
+    message = await build_payment_notification(user_id, event_id, ticket_id, amount_cents, url, subject_prefix)
+    # pika blocks, keep it off the event loop
+    await asyncio.to_thread(publish_message, message)
+
+async def run_split_check(check: ScheduledCheck) -> bool:
+    """Scheduler handler, False sends the check back to be retried later."""
+    result = await refund_split(check.ticket_ids)
+    if result.get("status") != "ok":
+        return False
+    if check.reservation_id is not None:
+        await asyncio.to_thread(split_tracker.finish, check.reservation_id)
+    return True
+
 
-async def refund_split(ticketList: list[int], sleepTime: int):
-    await asyncio.sleep(sleepTime)
+def record_split_payment(reservation_id, ticket_id):
+    """Count a paid ticket, finalizing the reservation as soon as every ticket is paid."""
+    progress = split_tracker.mark_paid(reservation_id, ticket_id)
+    if progress is None:
+        return
+    paid, total = progress
+    print(f"Reservation {reservation_id}: {paid}/{total} tickets paid")
+    if paid == total:
+        # Nothing left to refund, drop the deadline check instead of looking the tickets up again
+        scheduler.cancel(reservation_id)
+        split_tracker.finish(reservation_id)
+
+
+async def refund_tickets(tickets: list[dict]):
+    """Refund paid tickets through stripe-service's batch endpoint and record each outcome in the ledger."""
+    keys = [refund_key(ticket) for ticket in tickets]
+    refunds = [
+        {"payment_intent_id": payment_intent_id, "idempotency_key": refund_idempotency_key(ticket_id, payment_intent_id)}
+        for ticket_id, payment_intent_id in keys
+    ]
+    async for result in refund_in_batches(get_http_client(), STRIPE_SERVICE_URL, refunds):
+        key = keys[result["index"]]
+        if result["error"] is None:
+            await asyncio.to_thread(refund_ledger.record, key, REFUNDED, amount=result["refund"].get("amount", 0))
+        else:
+            print(f"Refund failed for ticket {key[0]}: {result['error']}")
+            await asyncio.to_thread(refund_ledger.record, key, FAILED, error=result["error"])
+
+
+async def release_reservation(ticket_ids: list[int]):
+    """Put a party's reserved tickets back on sale after its booking failed."""
+    try:
+        response = await get_http_client().patch(f"{TICKET_INVENTORY_URL}/tickets/cancel-ticket", json={"ticketList": ticket_ids})
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        print(f"Failed to release tickets {ticket_ids}: {str(e)}")
+
+
+async def refund_split(ticketList: list[int]):
     print("[PROCESS] Starting refund checks")
-    ticketsReq = requests.get(
+    client = get_http_client()
+    ticketsReq = await client.request(
+        "GET",
         f"{TICKET_INVENTORY_URL}/tickets/tickets-by-ids",
         json={"ticketList": ticketList}
         )
@@ -191,48 +299,65 @@ async def refund_split(ticketList: list[int], sleepTime: int):
             toRefund.append(ticket.get("ticketId"))
             needToRefund = True
             break
-    if needToRefund:
-        for ticket in tickets:
-            try:
-                if ticket.get("status") == "sold" and ticket.get("preference") == "refund":
-                    print("[PROCESS] Calling refund now")
-                    # toRefund.append(ticket.get("ticketId"))
-                    refund = requests.post(
-                        f"{STRIPE_SERVICE_URL}/refund",
-                        json={"payment_intent_id": ticket.get("paymentIntentId")}
-                    )
-                    refund_data = refund.json()
-                    ## insert notif here
-                    ticket_id = ticket.get("ticketId")
-                    toRefund.append(ticket_id)
-                    user_id = ticket.get("userId")
-                    event_id = ticket.get("eventId")
-                    send_refund_notification(
-                            user_id=user_id,
-                            event_id=event_id,
-                            ticket_id=ticket_id,
-                            amount_cents=refund_data.get("amount", 0),  # Use amount from refund response
-                            reason="Group booking cancelled - some participants did not complete payment"
-                        )
-            except Exception as e:
-                print(f"Unexpected error: {str(e)}")
-                return {"status": "error", "message": f"Unexpected error: {str(e)}"}
-        
-        try:
-            print("[PROCESS] Calling cancellation now")
-            cancel = requests.patch(
-                f"{TICKET_INVENTORY_URL}/tickets/cancel-ticket",
-                json={"ticketList": toRefund}
-            )
-            print(cancel.json())
-
-            return {"status": "ok"}
-        except Exception as e:
-            print(f"Unexpected error: {str(e)}")
-            return {"status": "error", "message": f"Unexpected error: {str(e)}"}
-    else:
+    if not needToRefund:
         return {"status": "ok", "message": "No tickets to refund"}
 
+    paid = [ticket for ticket in tickets if ticket.get("status") == "sold" and ticket.get("preference") == "refund"]
+    # Nothing to refund a sale against without its payment intent: report it and leave the booking as is
+    unrefundable = [ticket.get("ticketId") for ticket in paid if not ticket.get("paymentIntentId")]
+    if unrefundable:
+        print(f"[PROCESS] Sold tickets {unrefundable} have no payment intent, skipping their refunds")
+        paid = [ticket for ticket in paid if ticket.get("paymentIntentId")]
+    outcomes = await asyncio.to_thread(refund_ledger.outcomes, [refund_key(ticket) for ticket in paid])
+    # A retried check only redoes payments whose refund didn't go through
+    pending = [ticket for ticket in paid if outcomes.get(refund_key(ticket), {}).get("status") != REFUNDED]
+    print(f"[PROCESS] Refunding {len(pending)} tickets ({len(paid) - len(pending)} already refunded)")
+    await refund_tickets(pending)
+
+    outcomes = await asyncio.to_thread(refund_ledger.outcomes, [refund_key(ticket) for ticket in paid])
+    refunded = [ticket for ticket in paid if outcomes.get(refund_key(ticket), {}).get("status") == REFUNDED]
+    failed = [ticket.get("ticketId") for ticket in paid if ticket not in refunded] + unrefundable
+
+    to_notify = [ticket for ticket in refunded if not outcomes[refund_key(ticket)]["notified"]]
+    notifications = await asyncio.gather(*(
+        build_refund_notification(
+            user_id=ticket.get("userId"),
+            event_id=ticket.get("eventId"),
+            ticket_id=ticket.get("ticketId"),
+            amount_cents=outcomes[refund_key(ticket)]["amount"],  # Use amount from refund response
+            reason="Group booking cancelled - some participants did not complete payment"
+        )
+        for ticket in to_notify
+    ))
+    built = [(ticket, message) for ticket, message in zip(to_notify, notifications) if message is not None]
+    # One batch over a pooled channel instead of a connection per refund
+    sent = await asyncio.to_thread(publisher.publish_many, [message for _, message in built])
+    await asyncio.to_thread(refund_ledger.mark_notified, [refund_key(ticket) for ticket, _ in built[:sent]])
+    print(f"Sent {sent}/{len(to_notify)} refund notifications")
+
+    if failed:
+        # Tickets are only cancelled once every refund went through, the scheduler retries the rest
+        return {
+            "status": "error",
+            "message": f"Refunds failed for tickets {failed}",
+            "failed": failed,
+            "missing_payment_intent": unrefundable,
+        }
+
+    toRefund.extend(ticket.get("ticketId") for ticket in refunded)
+    try:
+        print("[PROCESS] Calling cancellation now")
+        cancel = await client.patch(
+            f"{TICKET_INVENTORY_URL}/tickets/cancel-ticket",
+            json={"ticketList": toRefund}
+        )
+        print(cancel.json())
+
+        return {"status": "ok"}
+    except Exception as e:
+        print(f"Unexpected error: {str(e)}")
+        return {"status": "error", "message": f"Unexpected error: {str(e)}"}
+
 
 # this will be moved to orchestrator to react to webhook events
 @app.post("/webhook", response_model=schemas.WebhookResponse)
@@ -243,6 +368,8 @@ async def stripe_webhook(request: Request):
     1. Your server must be publicly accessible (e.g., via ngrok in development)
     2. You must configure the webhook URL in your Stripe dashboard to point to this endpoint
     3. Set up the webhook signing secret in your Stripe dashboard and environment variables
+
+    Events are stored and acknowledged right away, webhook workers process them afterwards.
     """
     payload = await request.body()
     sig_header = request.headers.get("stripe-signature")
@@ -258,159 +385,195 @@ async def stripe_webhook(request: Request):
         # For development purposes - parse payload directly without verification
         # WARNING: In production, always verify signatures
         payload_json = json.loads(payload)
-        event_data = stripe.util.convert_to_stripe_object(payload_json, stripe.api_key)
-        event = stripe.Event.construct_from(event_data, stripe.api_key)
+    except ValueError as e:
+        # Log the error details
+        print(f"Error processing webhook: {str(e)}")
+        # Return success anyway to acknowledge the webhook (prevents retries)
+        # In development, this allows us to see events even when verification fails
+        return {"status": "success"}
+
+    event_id = payload_json.get("id")
+    if event_id and seen_events.seen(event_id):
+        return {"status": "ok", "message": "Duplicate event"}
+    # The queue's primary key still catches redeliveries that race past the index
+    if not await webhook_queue.put(event_id, payload_json.get("type"), payload):
+        return {"status": "ok", "message": "Duplicate event"}
+    if event_id:
+        seen_events.add(event_id)
+    return {"status": "ok"}
+
+
+async def process_webhook(payload: bytes):
+    """
+    Handle one stored Stripe event. Raising or returning an error status retries it later.
+
+    A retry may follow a failure after money already moved, so every step must
+    be safe to repeat: the seller refund of a transfer carries an idempotency
+    key derived from the Stripe event id, and a split payment's confirmation
+    email is only sent once its ticket is confirmed, never on a retry.
+    """
+    payload_json = json.loads(payload)
+    event_data = stripe.util.convert_to_stripe_object(payload_json, stripe.api_key)
+    event = stripe.Event.construct_from(event_data, stripe.api_key)
+    
+    print(f"Event type: {event.type}")
+    
+    # Handle the event
+    if event.type == "payment_intent.succeeded":
+        try:
+            payment_intent = event.data.object
+            # Update your database to mark payment as complete
+            print(f"Payment for {payment_intent.metadata.get('event_id')} succeeded!")
+            return {"status": "ok"}
+        except Exception as e:
+            return {"status": "ok"}
         
-        print(f"Event type: {event.type}")
+        # Here you would typically make an API call to your tickets service
+        # to create the tickets now that payment is confirmed
         
-        # Handle the event
-        if event.type == "payment_intent.succeeded":
+    elif event.type == "payment_intent.payment_failed":
+        try:
+            payment_intent = event.data.object
+            print(f"Payment for {payment_intent.metadata.get('event_id')} failed.")
+            # Release the held seats
+            return {"status": "ok"}
+        except Exception as e:
+            return {"status": "ok"}
+        
+    elif event.type == "checkout.session.completed":
+        # Handle completed payments from payment links
+        session = event.data.object
+        # print("[DEBUG] IM HERE")
+        # print(session.metadata)
+
+        # If this is a ticket transfer checkout
+        if session.metadata and "transfer_id" in session.metadata:
+            ticket_id = session.metadata.get("ticket_id")
+            seller_id = session.metadata.get("seller_id")
+            seller_email = session.metadata.get("seller_email")
+            buyer_email = session.metadata.get("buyer_email")
+            buyer_id = session.metadata.get("buyer_id")
+            amount_in_cents = session.metadata.get("amount_in_cents")
+            event_id = session.metadata.get("event_id")
+            # original_payment_intent_id = session.metadata.get("original_payment_intent")
+
+            # Extract the new payment intent ID from the session
+            new_payment_intent_id = session.payment_intent
+
+            transfer_body = {
+                # "original_payment_intent": original_payment_intent_id,
+                "new_payment_intent": new_payment_intent_id,
+                "idempotency_key": f"transfer-refund-{payload_json['id']}" if payload_json.get("id") else None,
+                "ticket_id": ticket_id,
+                "seller_id": seller_id,
+                "seller_email": seller_email,
+                "buyer_id": buyer_id,
+                "buyer_email": buyer_email,
+                "amount": amount_in_cents,
+                "event_id": event_id
+            }
+            # print(f"[PROCESS] Transfer body is {transfer_body}")
             try:
-                payment_intent = event.data.object
-                # Update your database to mark payment as complete
-                print(f"Payment for {payment_intent.metadata.get('event_id')} succeeded!")
-                return {"status": "ok"}
+                # transfer_id = session.metadata.get("transfer_id")
+                print(f"[CALL] Calling {TICKET_TRANSFER_URL} to transfer tickets with {transfer_body}")
+                ticket_transfer = await get_http_client().patch(
+                    f"{TICKET_TRANSFER_URL}/transfer",
+                    json=transfer_body,
+                    timeout=httpx.Timeout(HTTP_TIMEOUT, read=TRANSFER_READ_TIMEOUT),
+                )
+                if ticket_transfer.status_code != 200 or ticket_transfer.json().get("status") == "error":
+                    return {"status": "error", "message": f"Transfer failed: {ticket_transfer.text}"}
+                
+                return { "status": "ok"}
             except Exception as e:
-                return {"status": "ok"}
+                return {"status": "error", "message": f"Transfer failed: {str(e)}"}
             
-            # Here you would typically make an API call to your tickets service
-            # to create the tickets now that payment is confirmed
             
-        elif event.type == "payment_intent.payment_failed":
+        # If this is a split payment link checkout
+        elif session.metadata and "split_payment_id" in session.metadata:
+            # split_payment_id = session.metadata.get("split_payment_id")
+            # if split_payment_id in split_payments:
+            #     print(f"Payment for split payment {split_payment_id} by {session.metadata.get('participant_email')} completed!")
+                
+                # Extract the payment intent ID
+            payment_intent_id = session.payment_intent
+            participant_email = session.metadata.get("participant_email")
+            user_id = session.metadata.get("user_id")
+            reservation_id = session.metadata.get("reservation_id")
+            ticket_id = session.metadata.get("ticket_id")
+            print(f"Reservation ID is {reservation_id} and Ticket ID is {ticket_id} and belongs to {participant_email}")
+            print(f"Payment Intent ID: {payment_intent_id}")
+            # need to use this payment id to update ticket service for update, for future use for refund
+                
+            # to change one more field to include ticket id for one ticket reservation
+            ticket_confirm_req = {
+                "paymentIntentId": payment_intent_id,
+                "reservationId": reservation_id,
+                "userId": user_id,
+                "ticketId": ticket_id
+            }
+
+            print(ticket_confirm_req)
+
             try:
-                payment_intent = event.data.object
-                print(f"Payment for {payment_intent.metadata.get('event_id')} failed.")
-                # Release the held seats
-                return {"status": "ok"}
-            except Exception as e:
-                return {"status": "ok"}
-            
-        elif event.type == "checkout.session.completed":
-            # Handle completed payments from payment links
-            session = event.data.object
-            # print("[DEBUG] IM HERE")
-            # print(session.metadata)
-
-            # If this is a ticket transfer checkout
-            if session.metadata and "transfer_id" in session.metadata:
-                ticket_id = session.metadata.get("ticket_id")
-                seller_id = session.metadata.get("seller_id")
-                seller_email = session.metadata.get("seller_email")
-                buyer_email = session.metadata.get("buyer_email")
-                buyer_id = session.metadata.get("buyer_id")
-                amount_in_cents = session.metadata.get("amount_in_cents")
-                event_id = session.metadata.get("event_id")
-                # original_payment_intent_id = session.metadata.get("original_payment_intent")
-
-                # Extract the new payment intent ID from the session
-                new_payment_intent_id = session.payment_intent
-
-                transfer_body = {
-                    # "original_payment_intent": original_payment_intent_id,
-                    "new_payment_intent": new_payment_intent_id,
-                    "ticket_id": ticket_id,
-                    "seller_id": seller_id,
-                    "seller_email": seller_email,
-                    "buyer_id": buyer_id,
-                    "buyer_email": buyer_email,
-                    "amount": amount_in_cents,
-                    "event_id": event_id
-                }
-                # print(f"[PROCESS] Transfer body is {transfer_body}")
-                try:
-                    # transfer_id = session.metadata.get("transfer_id")
-                    print(f"[CALL] Calling {TICKET_TRANSFER_URL} to transfer tickets with {transfer_body}")
-                    ticket_transfer = requests.patch(
-                        f"{TICKET_TRANSFER_URL}/transfer",
-                        json=transfer_body,
-                        timeout=10  # Set a timeout of 10 seconds
-                    )
-                    if ticket_transfer.status_code != 200:
-                        return {"status": "error", "message": f"Transfer failed: {ticket_transfer.text}"}
-                    
-                    return { "status": "ok"}
-                except Exception as e:
-                    raise HTTPException(status_code=500, detail=str(e))
+                confirm_ticket_endpoint = f"{TICKET_INVENTORY_URL}/tickets/confirm-split"
+                print(f"Calling ticket service at: {confirm_ticket_endpoint}")
+                ticket_response = await get_http_client().patch(
+                    confirm_ticket_endpoint, 
+                    json=ticket_confirm_req,
+                )
                 
+                ticket_response_object = ticket_response.json()
+                print(ticket_response_object)
+                if not ticket_response.is_success or ticket_response_object.get("status") == "error":
+                    return {"status": "error", "message": f"Confirming ticket failed: {ticket_response.text}"}
+                await asyncio.to_thread(record_split_payment, reservation_id, ticket_id)
+            except Exception as e:
+                print(f"Unexpected error: {str(e)}")
+                return {"status": "error", "message": f"Unexpected error: {str(e)}"}
+
+            # The ticket is confirmed, a failed email must not retry the event and confirm it again
+            try:
+                # payload = {
+                #     # "notificationId": str(uuid.uuid4()),
+                #     # "timestamp": datetime.now().isoformat(),
+                #     "message": f"Your payment of ${payment_intent_id} has been completed for reservation {reservation_id}",
+                #     "subject": "Payment Completed",
+                #     "recipientEmailAddress": participant_email,
+                #     # "notificationType": "PAYMENT_CONFIRMATION"
+                # }
                 
-            # If this is a split payment link checkout
-            elif session.metadata and "split_payment_id" in session.metadata:
-                # split_payment_id = session.metadata.get("split_payment_id")
-                # if split_payment_id in split_payments:
-                #     print(f"Payment for split payment {split_payment_id} by {session.metadata.get('participant_email')} completed!")
-                    
-                    # Extract the payment intent ID
-                payment_intent_id = session.payment_intent
-                participant_email = session.metadata.get("participant_email")
-                user_id = session.metadata.get("user_id")
-                reservation_id = session.metadata.get("reservation_id")
-                ticket_id = session.metadata.get("ticket_id")
-                print(f"Reservation ID is {reservation_id} and Ticket ID is {ticket_id} and belongs to {participant_email}")
-                print(f"Payment Intent ID: {payment_intent_id}")
-                # need to use this payment id to update ticket service for update, for future use for refund
-                    
-                # to change one more field to include ticket id for one ticket reservation
-                ticket_confirm_req = {
-                    "paymentIntentId": payment_intent_id,
-                    "reservationId": reservation_id,
-                    "userId": user_id,
-                    "ticketId": ticket_id
-                }
-
-                print(ticket_confirm_req)
-
-                try:
-                    confirm_ticket_endpoint = f"{TICKET_INVENTORY_URL}/tickets/confirm-split"
-                    print(f"Calling ticket service at: {confirm_ticket_endpoint}")
-                    ticket_response = requests.patch(
-                        confirm_ticket_endpoint, 
-                        json=ticket_confirm_req,
-                        timeout=10)
-                    
-                    ticket_response_object = ticket_response.json()
-                    print(ticket_response_object)
-
-                    # payload = {
-                    #     # "notificationId": str(uuid.uuid4()),
-                    #     # "timestamp": datetime.now().isoformat(),
-                    #     "message": f"Your payment of ${payment_intent_id} has been completed for reservation {reservation_id}",
-                    #     "subject": "Payment Completed",
-                    #     "recipientEmailAddress": participant_email,
-                    #     # "notificationType": "PAYMENT_CONFIRMATION"
-                    # }
-                    
-                    # Publish to notification queue
-                    # publish_success = publish_message(payload)
-
-                    send_payment_notification(
-                        user_id=user_id,
-                        event_id=session.metadata["event_id"],
-                        ticket_id=session.metadata["ticket_id"],
-                        amount_cents=int(session.amount_total),
-                        url="",  # no link needed for confirmation
-                        subject_prefix="Confirmation: Payment Completed"
-                    )
-                                    
-                    # if publish_success:
-                    #     print(f"Successfully published payment completion notification for {participant_email}")
-                    # else:
-                    #     print(f"Failed to publish notification for {participant_email}")
-                    
-                    return ticket_response_object
-                except Exception as e:
-                    print(f"Unexpected error: {str(e)}")
-                    return {"status": "error", "message": f"Unexpected error: {str(e)}"}
+                # Publish to notification queue
+                # publish_success = publish_message(payload)
+
+                await send_payment_notification(
+                    user_id=user_id,
+                    event_id=session.metadata["event_id"],
+                    ticket_id=session.metadata["ticket_id"],
+                    amount_cents=int(session.amount_total),
+                    url="",  # no link needed for confirmation
+                    subject_prefix="Confirmation: Payment Completed"
+                )
+                                
+                # if publish_success:
+                #     print(f"Successfully published payment completion notification for {participant_email}")
+                # else:
+                #     print(f"Failed to publish notification for {participant_email}")
                 
-        else:
-            print("Event type not covered")
-            return {"status": "ok"}
-        
-    except Exception as e:
-        # Log the error details
-        print(f"Error processing webhook: {str(e)}")
-        # Return success anyway to acknowledge the webhook (prevents retries)
-        # In development, this allows us to see events even when verification fails
-        return {"status": "success"}
+            except Exception as e:
+                print(f"Failed to send payment confirmation for ticket {ticket_id}: {str(e)}")
+            return ticket_response_object
+            
+    else:
+        print("Event type not covered")
+        return {"status": "ok"}
+
+
+async def handle_webhook(payload: bytes) -> bool:
+    """Webhook queue handler, False sends the event back to be retried later."""
+    result = await process_webhook(payload)
+    return not (isinstance(result, dict) and result.get("status") == "error")
+
 
 @app.post("/party-booking")
 async def party_booking(request: schemas.PartyBookingRequest, background_tasks: BackgroundTasks):
@@ -447,57 +610,42 @@ async def party_booking(request: schemas.PartyBookingRequest, background_tasks:
         create_split_endpoint = f"{STRIPE_SERVICE_URL}/create-split-payment"
         print(f"Calling stripe service at: {create_split_endpoint}")
         
-        payment_links_response = requests.post(
+        payment_links_response = await get_http_client().post(
             create_split_endpoint, 
             json=split_payments_req,  # Fixed variable name here - was split_payments
-            timeout=10  # Add timeout to prevent hanging requests
         )
         
         if payment_links_response.status_code != 200:
             print(f"Error response from stripe service: {payment_links_response.status_code}")
             print(f"Response content: {payment_links_response.text}")
+            # Stripe service creates every participant's link or none, nobody can pay, so nobody is invited
+            await release_reservation(ticket_ids)
             return {"status": "error", "message": f"Stripe service returned {payment_links_response.status_code}"}
             
         payment_link_objects = payment_links_response.json()
         
         res = {}
+        invites = []
         # Access the payment_links array correctly
         for payment_link_obj in payment_link_objects.get("payment_links", []):
             if payment_link_obj.get('participant_email') == leader:
                 res["redirect_url"] = payment_link_obj.get('url')
             else:
-                # Push notification about payment link to queue
-                # notification_payload = {
-                #     "subject": "Payment Link Created",
-                #     "message": f"Please complete your payment using this link: {payment_link_obj.get('url')}. Amount: ${payment_link_obj.get('amount')/100:.2f}",
-                #     "recipientEmailAddress": payment_link_obj.get('participant_email'),
-                #     "notificationType": "PAYMENT_LINK"
-                # }
-                # payload = {
-                #         # "notificationId": str(uuid.uuid4()),
-                #         # "timestamp": datetime.now().isoformat(),
-                #         "message": f"Please complete your payment using this link: {payment_link_obj.get('url')}. Amount: ${payment_link_obj.get('amount')/100:.2f}",
-                #         "subject": "Payment Link",
-                #         "recipientEmailAddress": payment_link_obj.get('participant_email'),
-                #         # "notificationType": "PAYMENT_LINK"
-                #     }
-                # publish_message(payload)
-
-                send_payment_notification(
-                    user_id=payment_link_obj["user_id"],
-                    event_id=event_id,
-                    ticket_id=payment_link_obj["ticket_id"],
-                    amount_cents=payment_link_obj["amount"],
-                    url=payment_link_obj["url"],
-                    subject_prefix="Action Required: Complete Your Payment"
-                )
-                                
-                print(f"Published payment link for {payment_link_obj.get('participant_email')} to notification queue")
+                invites.append(payment_link_obj)
+        if "redirect_url" not in res:
+            print(f"No payment link for party leader {leader!r}")
+            await release_reservation(ticket_ids)
+            return {"status": "error", "message": "No payment link for the party leader"}
 
-        background_tasks.add_task(refund_split, ticket_ids, 75)
+        # Notify the rest of the party after responding, so the leader's redirect doesn't wait on it
+        background_tasks.add_task(notify_payment_links, event_id, invites)
+        # Persisted, so the expiry check survives restarts
+        await asyncio.to_thread(split_tracker.start, reservation_id, ticket_ids)
+        await asyncio.to_thread(scheduler.schedule, ticket_ids, SPLIT_CHECK_DELAY, reservation_id)
         return {"status": "ok", "data": res}
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print(f"Connection error: {str(e)}")
+        await release_reservation(ticket_ids)
         return {"status": "error", "message": f"Connection to stripe service failed: {str(e)}"}
     except Exception as e:
         print(f"Unexpected error: {str(e)}")
@@ -510,6 +658,18 @@ async def ticket_booking():
     """
     return None
 
+@app.get("/metrics")
+async def get_metrics():
+    """Pending split-payment expiry checks, refund outcomes, webhook queue lag and event cache hits."""
+    return {
+        "split_checks": await asyncio.to_thread(scheduler.snapshot),
+        "refunds": await asyncio.to_thread(refund_ledger.snapshot),
+        "split_reservations": await asyncio.to_thread(split_tracker.snapshot),
+        "webhooks": await asyncio.to_thread(webhook_queue.snapshot),
+        "seen_events": seen_events.snapshot(),
+        "event_cache": event_cache.snapshot(),
+    }
+
 @app.get("/health", response_model=schemas.HealthResponse)
 def get_health():
     return {"status": "healthy", "stripe_configured": bool(stripe.api_key)}
\ No newline at end of file
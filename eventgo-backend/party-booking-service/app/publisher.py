@@ -0,0 +1,174 @@
+"""
+Long-lived RabbitMQ publisher.
+
+pika's BlockingConnection is not thread-safe, so the pool holds up to
+RABBITMQ_POOL_SIZE independent connections with one transactional channel
+each, opened on first use and reused afterwards. ``publish_many`` publishes
+a whole batch and then commits it once, a single round trip to the broker
+instead of waiting for a confirm after every message (pika's blocking
+channel can only wait for confirms one message at a time). Once the commit
+returns the broker has taken the batch; if the connection drops before that,
+none of it was taken, so the connection is replaced and the batch resent.
+Publishing never raises: failures are logged and show up in the return value.
+"""
+import json
+import os
+import queue
+import threading
+
+import pika
+from pika.exceptions import AMQPChannelError, AMQPConnectionError
+
+RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST", "rabbitmq")
+RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT", 5672))
+RABBITMQ_USERNAME = os.environ.get("RABBITMQ_USERNAME", "guest")
+RABBITMQ_PASSWORD = os.environ.get("RABBITMQ_PASSWORD", "guest")
+RABBITMQ_POOL_SIZE = int(os.environ.get("RABBITMQ_POOL_SIZE", 4))
+RABBITMQ_PUBLISH_RETRIES = int(os.environ.get("RABBITMQ_PUBLISH_RETRIES", 2))  # Reconnects per publish
+NOTIFICATION_EXCHANGE = os.environ.get("NOTIFICATION_EXCHANGE", "notification_exchange")
+NOTIFICATION_ROUTING_KEY = os.environ.get("NOTIFICATION_ROUTING_KEY", "notification.queue")
+
+
+class PooledChannel:
+    def __init__(self, parameters: pika.ConnectionParameters, exchange: str):
+        self.connection = pika.BlockingConnection(parameters)
+        self.channel = self.connection.channel()
+        self.channel.exchange_declare(exchange=exchange, exchange_type="topic", durable=True)
+        self.channel.tx_select()
+
+    @property
+    def is_open(self) -> bool:
+        return self.connection.is_open and self.channel.is_open
+
+    def publish_batch(self, bodies: list[str], routing_key: str):
+        properties = pika.BasicProperties(delivery_mode=2, content_type="application/json")
+        for body in bodies:
+            self.channel.basic_publish(exchange="", routing_key=routing_key, body=body, properties=properties)
+        self.channel.tx_commit()
+
+    def close(self):
+        try:
+            if self.connection.is_open:
+                self.connection.close()
+        except AMQPConnectionError:
+            pass
+
+
+class RabbitPublisher:
+    def __init__(
+        self,
+        host: str = RABBITMQ_HOST,
+        port: int = RABBITMQ_PORT,
+        username: str = RABBITMQ_USERNAME,
+        password: str = RABBITMQ_PASSWORD,
+        exchange: str = NOTIFICATION_EXCHANGE,
+        pool_size: int = RABBITMQ_POOL_SIZE,
+        retries: int = RABBITMQ_PUBLISH_RETRIES,
+    ):
+        self.parameters = pika.ConnectionParameters(
+            host=host, port=port, credentials=pika.PlainCredentials(username, password)
+        )
+        self.exchange = exchange
+        self.pool_size = pool_size
+        self.retries = retries
+        self.connections_opened = 0
+        self._idle: queue.LifoQueue[PooledChannel] = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(pool_size)
+        self._closed = False
+
+    def _checkout(self) -> PooledChannel:
+        self._slots.acquire()
+        while True:
+            try:
+                pooled = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                # Services heartbeats that piled up while the connection sat idle
+                pooled.connection.process_data_events(time_limit=0)
+            except AMQPConnectionError:
+                pooled.close()
+                continue
+            if pooled.is_open:
+                return pooled
+            pooled.close()
+        try:
+            pooled = PooledChannel(self.parameters, self.exchange)
+        except Exception:
+            self._slots.release()
+            raise
+        self.connections_opened += 1
+        return pooled
+
+    def _checkin(self, pooled: PooledChannel | None):
+        if pooled is not None:
+            if self._closed or not pooled.is_open:
+                pooled.close()
+            else:
+                self._idle.put(pooled)
+        self._slots.release()
+
+    def _send(self, bodies: list[str], routing_key: str) -> bool:
+        """Publish and commit the batch, reconnecting on broken connections. Returns whether the broker took it."""
+        failures = 0
+        while True:
+            pooled = None
+            try:
+                pooled = self._checkout()
+                pooled.publish_batch(bodies, routing_key)
+            except (AMQPConnectionError, AMQPChannelError) as e:
+                # The channel is gone and with it every uncommitted message, resend the whole batch
+                if pooled is not None:
+                    pooled.close()
+                    self._checkin(None)
+                failures += 1
+                if failures > self.retries:
+                    print(f"Failed to publish message: {e!r}")
+                    return False
+                print(f"RabbitMQ connection lost ({e!r}), reconnecting")
+                continue
+            except Exception as e:
+                # e.g. DNS failure, not worth a reconnect
+                if pooled is not None:
+                    pooled.close()
+                    self._checkin(None)
+                print(f"Failed to publish message: {e!r}")
+                return False
+            except BaseException:
+                if pooled is not None:
+                    pooled.close()
+                    self._checkin(None)
+                raise
+            self._checkin(pooled)
+            return True
+
+    def publish(self, message: dict, routing_key: str = NOTIFICATION_ROUTING_KEY) -> bool:
+        return self.publish_many([message], routing_key) == 1
+
+    def publish_many(self, messages: list[dict], routing_key: str = NOTIFICATION_ROUTING_KEY) -> int:
+        """
+        Publish a batch in one transaction. Returns how many messages the
+        broker took: all of them, none, or the ones before the first message
+        that can't be serialized.
+        """
+        bodies = []
+        for message in messages:
+            try:
+                bodies.append(json.dumps(message))
+            except (TypeError, ValueError) as e:
+                print(f"Failed to publish message: {e!r}")
+                break
+        if not bodies:
+            return 0
+        return len(bodies) if self._send(bodies, routing_key) else 0
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+publisher = RabbitPublisher()
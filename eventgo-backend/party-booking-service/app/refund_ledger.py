@@ -0,0 +1,92 @@
+"""
+Per-payment refund outcomes.
+
+refund_split records whether each paid ticket's refund succeeded and whether
+its owner was notified, in the same SQLite file as the scheduler. When a
+split check is retried, payments already refunded or notified are skipped and
+only the failed ones are redone. Stripe service also receives an idempotency
+key derived from the same key, so a refund whose response was lost is not
+paid out twice.
+
+Outcomes are keyed on (ticket id, payment intent id): a cancelled ticket goes
+back on sale under the same id, and its next buyer pays with a new payment
+intent that must not inherit the previous buyer's refund.
+"""
+import time
+
+from eventgo_shared.sqlite import SQLiteStore
+
+from .scheduler import SCHEDULER_DB_PATH
+
+REFUNDED = "refunded"
+FAILED = "failed"
+
+
+def refund_key(ticket: dict) -> tuple[int, str]:
+    """Ledger key of a paid ticket from ticket-inventory."""
+    return int(ticket.get("ticketId")), ticket.get("paymentIntentId")
+
+
+def refund_idempotency_key(ticket_id, payment_intent_id) -> str:
+    return f"split-refund-ticket-{ticket_id}-{payment_intent_id}"
+
+
+class RefundLedger(SQLiteStore):
+    schema = (
+        "CREATE TABLE IF NOT EXISTS refund_outcomes ("
+        " ticket_id INTEGER NOT NULL,"
+        " payment_intent_id TEXT NOT NULL,"
+        " status TEXT NOT NULL,"
+        " amount INTEGER,"
+        " error TEXT,"
+        " attempts INTEGER NOT NULL DEFAULT 0,"
+        " notified INTEGER NOT NULL DEFAULT 0,"
+        " updated_at REAL NOT NULL,"
+        " PRIMARY KEY (ticket_id, payment_intent_id))",
+    )
+
+    def __init__(self, path: str = SCHEDULER_DB_PATH):
+        super().__init__(path)
+
+    def outcomes(self, keys: list[tuple[int, str]]) -> dict[tuple[int, str], dict]:
+        """Recorded outcomes by ``(ticket_id, payment_intent_id)``, keys without one are left out."""
+        if not keys:
+            return {}
+        placeholders = ",".join("(?, ?)" for _ in keys)
+        with self.db_lock:
+            rows = self.conn.execute(
+                f"SELECT ticket_id, payment_intent_id, status, amount, error, attempts, notified FROM refund_outcomes"
+                f" WHERE (ticket_id, payment_intent_id) IN (VALUES {placeholders})",
+                [value for ticket_id, payment_intent_id in keys for value in (int(ticket_id), payment_intent_id)],
+            ).fetchall()
+        return {
+            (row[0], row[1]): {"status": row[2], "amount": row[3], "error": row[4], "attempts": row[5], "notified": bool(row[6])}
+            for row in rows
+        }
+
+    def record(self, key: tuple[int, str], status: str, amount: int | None = None, error: str | None = None):
+        ticket_id, payment_intent_id = key
+        with self.db_lock:
+            self.conn.execute(
+                "INSERT INTO refund_outcomes (ticket_id, payment_intent_id, status, amount, error, attempts, updated_at)"
+                " VALUES (?, ?, ?, ?, ?, 1, ?)"
+                " ON CONFLICT (ticket_id, payment_intent_id) DO UPDATE SET"
+                " status = excluded.status, amount = excluded.amount, error = excluded.error,"
+                " attempts = attempts + 1, updated_at = excluded.updated_at",
+                (int(ticket_id), payment_intent_id, status, amount, error, time.time()),
+            )
+
+    def mark_notified(self, keys: list[tuple[int, str]]):
+        with self.db_lock:
+            self.conn.executemany(
+                "UPDATE refund_outcomes SET notified = 1 WHERE ticket_id = ? AND payment_intent_id = ?",
+                [(int(ticket_id), payment_intent_id) for ticket_id, payment_intent_id in keys],
+            )
+
+    def snapshot(self) -> dict:
+        with self.db_lock:
+            counts = dict(self.conn.execute("SELECT status, COUNT(*) FROM refund_outcomes GROUP BY status").fetchall())
+        return {REFUNDED: counts.get(REFUNDED, 0), FAILED: counts.get(FAILED, 0)}
+
+
+refund_ledger = RefundLedger()
@@ -0,0 +1,220 @@
+"""
+Durable delay queue for split-payment expiry checks.
+
+Each pending check is one row in a local SQLite database, so a restart or
+deploy keeps every scheduled check and a waiting party costs a row instead
+of a sleeping coroutine. A single runner claims due checks in batches, runs
+them concurrently, deletes the ones that finished and pushes failed ones
+back with a delay. A check claimed by a process that died is picked up again
+after SCHEDULER_CLAIM_TIMEOUT seconds. A check that still fails after
+SCHEDULER_MAX_ATTEMPTS attempts is moved to split_checks_dead instead of being
+dropped, so its reservation's expiry can still be handled by hand; /metrics
+reports how many are there.
+"""
+import asyncio
+import json
+import os
+import time
+
+from eventgo_shared.sqlite import SQLiteStore
+
+SCHEDULER_DB_PATH = os.getenv("SCHEDULER_DB_PATH", "data/party_booking.db")
+SCHEDULER_POLL_INTERVAL = float(os.getenv("SCHEDULER_POLL_INTERVAL", 1))  # Max seconds between due checks
+SCHEDULER_BATCH_SIZE = int(os.getenv("SCHEDULER_BATCH_SIZE", 100))
+SCHEDULER_CLAIM_TIMEOUT = float(os.getenv("SCHEDULER_CLAIM_TIMEOUT", 300))
+SCHEDULER_RETRY_DELAY = float(os.getenv("SCHEDULER_RETRY_DELAY", 30))
+SCHEDULER_MAX_ATTEMPTS = int(os.getenv("SCHEDULER_MAX_ATTEMPTS", 5))
+
+
+class ScheduledCheck:
+    __slots__ = ("id", "reservation_id", "ticket_ids", "due_at", "attempts")
+
+    def __init__(self, id: int, reservation_id: str | None, ticket_ids: list[int], due_at: float, attempts: int):
+        self.id = id
+        self.reservation_id = reservation_id
+        self.ticket_ids = ticket_ids
+        self.due_at = due_at
+        self.attempts = attempts
+
+
+class SplitCheckScheduler(SQLiteStore):
+    schema = (
+        "CREATE TABLE IF NOT EXISTS split_checks ("
+        " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " reservation_id TEXT,"
+        " ticket_ids TEXT NOT NULL,"
+        " due_at REAL NOT NULL,"
+        " claimed_at REAL,"
+        " attempts INTEGER NOT NULL DEFAULT 0)",
+        "CREATE INDEX IF NOT EXISTS ix_split_checks_due_at ON split_checks (due_at)",
+        "CREATE INDEX IF NOT EXISTS ix_split_checks_reservation ON split_checks (reservation_id)",
+        "CREATE TABLE IF NOT EXISTS split_checks_dead ("
+        " id INTEGER PRIMARY KEY,"
+        " reservation_id TEXT,"
+        " ticket_ids TEXT NOT NULL,"
+        " due_at REAL NOT NULL,"
+        " attempts INTEGER NOT NULL,"
+        " failed_at REAL NOT NULL)",
+    )
+
+    def __init__(
+        self,
+        path: str = SCHEDULER_DB_PATH,
+        batch_size: int = SCHEDULER_BATCH_SIZE,
+        poll_interval: float = SCHEDULER_POLL_INTERVAL,
+        claim_timeout: float = SCHEDULER_CLAIM_TIMEOUT,
+        retry_delay: float = SCHEDULER_RETRY_DELAY,
+        max_attempts: int = SCHEDULER_MAX_ATTEMPTS,
+    ):
+        super().__init__(path)
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.completed = 0
+        self.failed = 0
+
+    def schedule(self, ticket_ids: list[int], delay: float, reservation_id=None) -> int:
+        due_at = time.time() + delay
+        with self.db_lock:
+            cursor = self.conn.execute(
+                "INSERT INTO split_checks (reservation_id, ticket_ids, due_at) VALUES (?, ?, ?)",
+                (None if reservation_id is None else str(reservation_id), json.dumps(ticket_ids), due_at),
+            )
+        return cursor.lastrowid
+
+    def cancel(self, reservation_id) -> int:
+        """Drop every pending check of a reservation. Returns how many were removed."""
+        with self.db_lock:
+            return self.conn.execute(
+                "DELETE FROM split_checks WHERE reservation_id = ?", (str(reservation_id),)
+            ).rowcount
+
+    def claim_due(self, now: float | None = None, limit: int | None = None) -> list[ScheduledCheck]:
+        now = time.time() if now is None else now
+        with self.db_lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                rows = conn.execute(
+                    "SELECT id, reservation_id, ticket_ids, due_at, attempts FROM split_checks"
+                    " WHERE due_at <= ? AND (claimed_at IS NULL OR claimed_at <= ?)"
+                    " ORDER BY due_at LIMIT ?",
+                    (now, now - self.claim_timeout, limit or self.batch_size),
+                ).fetchall()
+                conn.executemany(
+                    "UPDATE split_checks SET claimed_at = ?, attempts = attempts + 1 WHERE id = ?",
+                    [(now, row[0]) for row in rows],
+                )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        return [
+            ScheduledCheck(id, reservation_id, json.loads(ticket_ids), due_at, attempts + 1)
+            for id, reservation_id, ticket_ids, due_at, attempts in rows
+        ]
+
+    def complete(self, check_ids: list[int]):
+        with self.db_lock:
+            self.conn.executemany("DELETE FROM split_checks WHERE id = ?", [(check_id,) for check_id in check_ids])
+
+    def retry_later(self, check: ScheduledCheck):
+        if check.attempts >= self.max_attempts:
+            print(f"[Scheduler] Giving up on split check {check.id} after {check.attempts} attempts, moving it to split_checks_dead")
+            self.bury(check)
+            return
+        with self.db_lock:
+            self.conn.execute(
+                "UPDATE split_checks SET claimed_at = NULL, due_at = ? WHERE id = ?",
+                (time.time() + self.retry_delay, check.id),
+            )
+
+    def bury(self, check: ScheduledCheck):
+        """Move a check out of the queue into split_checks_dead."""
+        with self.db_lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.execute(
+                    "INSERT OR REPLACE INTO split_checks_dead (id, reservation_id, ticket_ids, due_at, attempts, failed_at)"
+                    " SELECT id, reservation_id, ticket_ids, due_at, attempts, ? FROM split_checks WHERE id = ?",
+                    (time.time(), check.id),
+                )
+                conn.execute("DELETE FROM split_checks WHERE id = ?", (check.id,))
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+
+    def dead_checks(self) -> list[ScheduledCheck]:
+        """Checks that ran out of attempts, oldest deadline first."""
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT id, reservation_id, ticket_ids, due_at, attempts FROM split_checks_dead ORDER BY due_at"
+            ).fetchall()
+        return [
+            ScheduledCheck(id, reservation_id, json.loads(ticket_ids), due_at, attempts)
+            for id, reservation_id, ticket_ids, due_at, attempts in rows
+        ]
+
+    def next_due_at(self) -> float | None:
+        with self.db_lock:
+            row = self.conn.execute("SELECT MIN(due_at) FROM split_checks WHERE claimed_at IS NULL").fetchone()
+        return row[0]
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self.db_lock:
+            pending, due, claimed, oldest_due = self.conn.execute(
+                "SELECT COUNT(*),"
+                " COALESCE(SUM(due_at <= ? AND claimed_at IS NULL), 0),"
+                " COALESCE(SUM(claimed_at IS NOT NULL), 0),"
+                " MIN(CASE WHEN claimed_at IS NULL THEN due_at END)"
+                " FROM split_checks",
+                (now,),
+            ).fetchone()
+            (dead,) = self.conn.execute("SELECT COUNT(*) FROM split_checks_dead").fetchone()
+        return {
+            "pending": pending,
+            "due": due,
+            "running": claimed,
+            "lag_seconds": round(max(0.0, now - oldest_due), 3) if oldest_due is not None else 0.0,
+            "completed": self.completed,
+            "failed": self.failed,
+            "dead": dead,
+        }
+
+    async def run_due(self, handler) -> int:
+        """Run one batch of due checks concurrently. Returns how many were claimed."""
+        checks = await asyncio.to_thread(self.claim_due)
+        if not checks:
+            return 0
+        results = await asyncio.gather(*(handler(check) for check in checks), return_exceptions=True)
+        done = []
+        for check, result in zip(checks, results):
+            if isinstance(result, BaseException) or result is False:
+                if isinstance(result, BaseException):
+                    print(f"[Scheduler] Split check {check.id} failed: {result!r}")
+                self.failed += 1
+                await asyncio.to_thread(self.retry_later, check)
+            else:
+                self.completed += 1
+                done.append(check.id)
+        await asyncio.to_thread(self.complete, done)
+        return len(checks)
+
+    async def run(self, handler):
+        """Process due checks until cancelled."""
+        while True:
+            while await self.run_due(handler) == self.batch_size:
+                pass  # More may be due already
+            next_due = await asyncio.to_thread(self.next_due_at)
+            if next_due is None:
+                await asyncio.sleep(self.poll_interval)
+            else:
+                await asyncio.sleep(min(self.poll_interval, max(0.0, next_due - time.time())))
+
+
+scheduler = SplitCheckScheduler()
@@ -0,0 +1,160 @@
+"""
+Recently seen Stripe event ids.
+
+Stripe retries a webhook until it gets a 200 and may deliver the same event
+more than once, which would confirm a split ticket and send its emails
+again. /webhook looks the event id up here before touching the queue, an
+in-memory dict lookup, so duplicates are answered without a database round
+trip. The index holds at most SEEN_EVENTS_CAPACITY ids and forgets them after
+WEBHOOK_DEDUP_TTL seconds, oldest first.
+
+With a path the ids are also written to SQLite, in batches of
+SEEN_EVENTS_FLUSH_SIZE or every SEEN_EVENTS_FLUSH_INTERVAL seconds, and
+loaded back at startup so a restart doesn't forget them. Loading and flushing
+run in a worker thread (``load`` and ``run``), ``seen`` and ``add`` only
+touch the dict. Ids not flushed yet when the process dies, or received
+before the load finished, are still caught by the webhook queue's primary
+key.
+"""
+from collections import OrderedDict
+import asyncio
+import os
+import threading
+import time
+
+from eventgo_shared.sqlite import SQLiteStore
+
+from .scheduler import SCHEDULER_DB_PATH
+from .webhook_queue import WEBHOOK_DEDUP_TTL
+
+SEEN_EVENTS_CAPACITY = int(os.getenv("SEEN_EVENTS_CAPACITY", 100_000))
+SEEN_EVENTS_DB_PATH = os.getenv("SEEN_EVENTS_DB_PATH", SCHEDULER_DB_PATH)  # Empty keeps the index in memory only
+SEEN_EVENTS_FLUSH_SIZE = int(os.getenv("SEEN_EVENTS_FLUSH_SIZE", 100))
+SEEN_EVENTS_FLUSH_INTERVAL = float(os.getenv("SEEN_EVENTS_FLUSH_INTERVAL", 1))
+
+
+class SeenEventIndex(SQLiteStore):
+    schema = (
+        "CREATE TABLE IF NOT EXISTS seen_events (event_id TEXT PRIMARY KEY, expires_at REAL NOT NULL)",
+        "CREATE INDEX IF NOT EXISTS ix_seen_events_expires_at ON seen_events (expires_at)",
+    )
+
+    def __init__(
+        self,
+        path: str | None = None,
+        capacity: int = SEEN_EVENTS_CAPACITY,
+        ttl: float = WEBHOOK_DEDUP_TTL,
+        flush_size: int = SEEN_EVENTS_FLUSH_SIZE,
+        flush_interval: float = SEEN_EVENTS_FLUSH_INTERVAL,
+    ):
+        super().__init__(path or None)
+        self.capacity = capacity
+        self.ttl = ttl
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        # Event id -> expiry. Every id gets the same TTL, so insertion order is also expiry order
+        self._expires: OrderedDict[str, float] = OrderedDict()
+        self._unflushed: list[tuple[str, float]] = []
+        self._flush_due: asyncio.Event | None = None
+        self._lock = threading.Lock()  # Guards the dict and the unflushed batch
+
+    def _load(self):
+        """Read back the ids that haven't expired yet, newest capacity of them."""
+        with self.db_lock:
+            rows = self.conn.execute(
+                "SELECT event_id, expires_at FROM seen_events WHERE expires_at > ? ORDER BY expires_at DESC LIMIT ?",
+                (time.time(), self.capacity),
+            ).fetchall()
+        with self._lock:
+            # Stored ids expire before any added since startup, keep them first
+            loaded = OrderedDict((event_id, expires_at) for event_id, expires_at in reversed(rows))
+            loaded.update(self._expires)
+            self._expires = loaded
+            self._evict(time.time())
+
+    async def load(self):
+        if self.path is not None:
+            await asyncio.to_thread(self._load)
+
+    def _evict(self, now: float):
+        expires = self._expires
+        while expires and (len(expires) > self.capacity or next(iter(expires.values())) <= now):
+            expires.popitem(last=False)
+            self.evicted += 1
+
+    def seen(self, event_id: str, now: float | None = None) -> bool:
+        now = time.time() if now is None else now
+        with self._lock:
+            expires_at = self._expires.get(event_id)
+            if expires_at is not None and expires_at > now:
+                self.hits += 1
+                return True
+            self.misses += 1
+            return False
+
+    def add(self, event_id: str, now: float | None = None) -> bool:
+        """Remember an event id. Returns False if it was already known."""
+        now = time.time() if now is None else now
+        with self._lock:
+            expires_at = self._expires.get(event_id)
+            if expires_at is not None and expires_at > now:
+                return False
+            if expires_at is not None:
+                del self._expires[event_id]  # Expired but not evicted yet, re-add at the end
+            self._expires[event_id] = now + self.ttl
+            self._evict(now)
+            if self.path is not None:
+                self._unflushed.append((event_id, now + self.ttl))
+                if len(self._unflushed) >= self.flush_size and self._flush_due is not None:
+                    self._flush_due.set()
+        return True
+
+    def flush(self):
+        """Write the ids added since the last flush, blocking: call it from a worker thread."""
+        if self.path is None:
+            return
+        now = time.time()
+        with self._lock:
+            pending, self._unflushed = self._unflushed, []
+        if not pending:
+            return
+        with self.db_lock:
+            conn = self.conn
+            conn.execute("BEGIN")
+            conn.executemany("INSERT OR REPLACE INTO seen_events (event_id, expires_at) VALUES (?, ?)", pending)
+            conn.execute("DELETE FROM seen_events WHERE expires_at <= ?", (now,))
+            conn.execute("COMMIT")
+
+    async def run(self):
+        """Flush every flush_interval seconds, or as soon as flush_size ids are waiting, until cancelled."""
+        self._flush_due = asyncio.Event()
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_due.wait(), self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._flush_due.clear()
+            await asyncio.to_thread(self.flush)
+
+    def __len__(self) -> int:
+        return len(self._expires)
+
+    def snapshot(self) -> dict:
+        return {
+            "size": len(self._expires),
+            "capacity": self.capacity,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evicted": self.evicted,
+            "persisted": self.path is not None,
+        }
+
+    def close(self):
+        self.flush()
+        super().close()
+
+
+seen_events = SeenEventIndex(SEEN_EVENTS_DB_PATH)
@@ -0,0 +1,73 @@
+"""
+Paid tickets per split-payment reservation.
+
+Each checkout.session.completed webhook marks its ticket paid. Once every
+ticket of a reservation is paid the booking is final, so its scheduled
+expiry check is cancelled instead of looking the tickets up again at the
+deadline. Rows live in the scheduler's SQLite file and are deleted when the
+reservation is finalized or its check has run.
+"""
+import json
+
+from eventgo_shared.sqlite import SQLiteStore
+
+from .scheduler import SCHEDULER_DB_PATH
+
+
+class SplitTracker(SQLiteStore):
+    schema = (
+        "CREATE TABLE IF NOT EXISTS split_reservations ("
+        " reservation_id TEXT PRIMARY KEY,"
+        " ticket_ids TEXT NOT NULL)",
+        "CREATE TABLE IF NOT EXISTS split_paid_tickets ("
+        " reservation_id TEXT NOT NULL,"
+        " ticket_id INTEGER NOT NULL,"
+        " PRIMARY KEY (reservation_id, ticket_id))",
+    )
+
+    def __init__(self, path: str = SCHEDULER_DB_PATH):
+        super().__init__(path)
+
+    def start(self, reservation_id, ticket_ids: list[int]):
+        with self.db_lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO split_reservations (reservation_id, ticket_ids) VALUES (?, ?)",
+                (str(reservation_id), json.dumps([int(ticket_id) for ticket_id in ticket_ids])),
+            )
+
+    def mark_paid(self, reservation_id, ticket_id) -> tuple[int, int] | None:
+        """
+        Record a paid ticket, repeated webhooks for the same ticket count once.
+        Returns (paid, total) for the reservation, or None if it isn't tracked.
+        """
+        reservation_id = str(reservation_id)
+        with self.db_lock:
+            row = self.conn.execute(
+                "SELECT ticket_ids FROM split_reservations WHERE reservation_id = ?", (reservation_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            ticket_ids = json.loads(row[0])
+            if int(ticket_id) in ticket_ids:
+                self.conn.execute(
+                    "INSERT OR IGNORE INTO split_paid_tickets (reservation_id, ticket_id) VALUES (?, ?)",
+                    (reservation_id, int(ticket_id)),
+                )
+            (paid,) = self.conn.execute(
+                "SELECT COUNT(*) FROM split_paid_tickets WHERE reservation_id = ?", (reservation_id,)
+            ).fetchone()
+        return paid, len(ticket_ids)
+
+    def finish(self, reservation_id):
+        reservation_id = str(reservation_id)
+        with self.db_lock:
+            self.conn.execute("DELETE FROM split_paid_tickets WHERE reservation_id = ?", (reservation_id,))
+            self.conn.execute("DELETE FROM split_reservations WHERE reservation_id = ?", (reservation_id,))
+
+    def snapshot(self) -> dict:
+        with self.db_lock:
+            (open_reservations,) = self.conn.execute("SELECT COUNT(*) FROM split_reservations").fetchone()
+        return {"open": open_reservations}
+
+
+split_tracker = SplitTracker()
@@ -0,0 +1,215 @@
+"""
+Durable queue of received Stripe webhooks.
+
+/webhook only stores the raw event and answers 200, so slow downstream
+services can no longer make Stripe time out and redeliver. A pool of
+WEBHOOK_WORKERS workers processes stored events in arrival order. Events are
+keyed by their Stripe event id, so a redelivered event is acknowledged but
+not processed twice; finished events are kept for WEBHOOK_DEDUP_TTL seconds
+for that purpose. Failed events are retried after WEBHOOK_RETRY_DELAY
+seconds, up to WEBHOOK_MAX_ATTEMPTS times.
+"""
+import asyncio
+import hashlib
+import os
+import time
+
+from eventgo_shared.sqlite import SQLiteStore
+
+from .scheduler import SCHEDULER_DB_PATH
+
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", 4))
+WEBHOOK_POLL_INTERVAL = float(os.getenv("WEBHOOK_POLL_INTERVAL", 1))
+WEBHOOK_CLAIM_TIMEOUT = float(os.getenv("WEBHOOK_CLAIM_TIMEOUT", 300))
+WEBHOOK_RETRY_DELAY = float(os.getenv("WEBHOOK_RETRY_DELAY", 10))
+WEBHOOK_MAX_ATTEMPTS = int(os.getenv("WEBHOOK_MAX_ATTEMPTS", 5))
+WEBHOOK_DEDUP_TTL = float(os.getenv("WEBHOOK_DEDUP_TTL", 3 * 24 * 3600))  # Stripe redelivers for up to 3 days
+
+QUEUED = "queued"
+DONE = "done"
+FAILED = "failed"
+
+
+class WebhookQueue(SQLiteStore):
+    schema = (
+        "CREATE TABLE IF NOT EXISTS webhook_events ("
+        " event_id TEXT PRIMARY KEY,"
+        " event_type TEXT,"
+        " payload BLOB NOT NULL,"
+        " status TEXT NOT NULL,"
+        " received_at REAL NOT NULL,"
+        " available_at REAL NOT NULL,"
+        " claimed_at REAL,"
+        " finished_at REAL,"
+        " attempts INTEGER NOT NULL DEFAULT 0)",
+        "CREATE INDEX IF NOT EXISTS ix_webhook_events_status ON webhook_events (status, available_at)",
+    )
+
+    def __init__(
+        self,
+        path: str = SCHEDULER_DB_PATH,
+        workers: int = WEBHOOK_WORKERS,
+        poll_interval: float = WEBHOOK_POLL_INTERVAL,
+        claim_timeout: float = WEBHOOK_CLAIM_TIMEOUT,
+        retry_delay: float = WEBHOOK_RETRY_DELAY,
+        max_attempts: int = WEBHOOK_MAX_ATTEMPTS,
+        dedup_ttl: float = WEBHOOK_DEDUP_TTL,
+    ):
+        super().__init__(path)
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.claim_timeout = claim_timeout
+        self.retry_delay = retry_delay
+        self.max_attempts = max_attempts
+        self.dedup_ttl = dedup_ttl
+        self.received = 0
+        self.duplicates = 0
+        self.processed = 0
+        self.failed = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+        # One token per stored event, so each put wakes one idle worker
+        self._wakeups: asyncio.Queue | None = None
+        self._last_prune = 0.0
+
+    def enqueue(self, event_id: str | None, event_type: str | None, payload: bytes) -> bool:
+        """Store an event. Returns False for an event id that was already received."""
+        if not event_id:
+            event_id = "sha256:" + hashlib.sha256(payload).hexdigest()
+        now = time.time()
+        with self.db_lock:
+            inserted = self.conn.execute(
+                "INSERT OR IGNORE INTO webhook_events"
+                " (event_id, event_type, payload, status, received_at, available_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (event_id, event_type, payload, QUEUED, now, now),
+            ).rowcount == 1
+        if inserted:
+            self.received += 1
+        else:
+            self.duplicates += 1
+        return inserted
+
+    async def put(self, event_id: str | None, event_type: str | None, payload: bytes) -> bool:
+        inserted = await asyncio.to_thread(self.enqueue, event_id, event_type, payload)
+        if inserted and self._wakeups is not None:
+            self._wakeups.put_nowait(None)
+        return inserted
+
+    def claim(self, now: float | None = None) -> tuple[str, bytes, float, int] | None:
+        now = time.time() if now is None else now
+        with self.db_lock:
+            conn = self.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT event_id, payload, received_at, attempts FROM webhook_events"
+                    " WHERE status = ? AND available_at <= ? AND (claimed_at IS NULL OR claimed_at <= ?)"
+                    " ORDER BY received_at LIMIT 1",
+                    (QUEUED, now, now - self.claim_timeout),
+                ).fetchone()
+                if row is not None:
+                    conn.execute(
+                        "UPDATE webhook_events SET claimed_at = ?, attempts = attempts + 1 WHERE event_id = ?",
+                        (now, row[0]),
+                    )
+                conn.execute("COMMIT")
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+        if row is None:
+            return None
+        event_id, payload, received_at, attempts = row
+        return event_id, payload, received_at, attempts + 1
+
+    def finish(self, event_id: str, received_at: float):
+        now = time.time()
+        with self.db_lock:
+            self.conn.execute(
+                "UPDATE webhook_events SET status = ?, finished_at = ?, payload = x'' WHERE event_id = ?",
+                (DONE, now, event_id),
+            )
+        latency = now - received_at
+        self.processed += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+        if now - self._last_prune > 60:
+            self.prune(now)
+
+    def retry_later(self, event_id: str, attempts: int):
+        now = time.time()
+        with self.db_lock:
+            if attempts >= self.max_attempts:
+                print(f"[Webhooks] Giving up on {event_id} after {attempts} attempts")
+                self.failed += 1
+                self.conn.execute(
+                    "UPDATE webhook_events SET status = ?, finished_at = ? WHERE event_id = ?", (FAILED, now, event_id)
+                )
+            else:
+                self.conn.execute(
+                    "UPDATE webhook_events SET claimed_at = NULL, available_at = ? WHERE event_id = ?",
+                    (now + self.retry_delay, event_id),
+                )
+
+    def prune(self, now: float | None = None):
+        """Forget finished events once Stripe can no longer redeliver them."""
+        now = time.time() if now is None else now
+        self._last_prune = now
+        with self.db_lock:
+            self.conn.execute(
+                "DELETE FROM webhook_events WHERE status != ? AND finished_at <= ?", (QUEUED, now - self.dedup_ttl)
+            )
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        with self.db_lock:
+            queued, running, oldest = self.conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(claimed_at IS NOT NULL), 0), MIN(received_at)"
+                " FROM webhook_events WHERE status = ?",
+                (QUEUED,),
+            ).fetchone()
+        return {
+            "workers": self.workers,
+            "queued": queued,
+            "running": running,
+            "lag_seconds": round(now - oldest, 3) if oldest is not None else 0.0,
+            "received": self.received,
+            "duplicates": self.duplicates,
+            "processed": self.processed,
+            "failed": self.failed,
+            "avg_latency_ms": round(1000 * self.total_latency / self.processed, 2) if self.processed else 0.0,
+            "max_latency_ms": round(1000 * self.max_latency, 2),
+        }
+
+    async def process_next(self, handler) -> bool:
+        """Process one stored event. Returns False when nothing was ready."""
+        item = await asyncio.to_thread(self.claim)
+        if item is None:
+            return False
+        event_id, payload, received_at, attempts = item
+        try:
+            succeeded = await handler(payload) is not False
+        except Exception as e:
+            print(f"[Webhooks] Processing {event_id} failed: {e!r}")
+            succeeded = False
+        if succeeded:
+            await asyncio.to_thread(self.finish, event_id, received_at)
+        else:
+            await asyncio.to_thread(self.retry_later, event_id, attempts)
+        return True
+
+    async def _work(self, handler):
+        while True:
+            if not await self.process_next(handler):
+                # A token left by an event another worker already took only costs one empty claim
+                try:
+                    await asyncio.wait_for(self._wakeups.get(), self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run(self, handler):
+        """Run the worker pool until cancelled."""
+        self._wakeups = asyncio.Queue()
+        await asyncio.gather(*(self._work(handler) for _ in range(self.workers)))
+
+
+webhook_queue = WebhookQueue()
@@ -0,0 +1,91 @@
+"""
+Wall time of concurrent split-payment webhooks against slow local stubs.
+
+Each checkout.session.completed webhook confirms the ticket, fetches the user
+and the event (three round trips of STUB_DELAY each) and publishes a
+notification. With blocking calls on the event loop, N webhooks take N times as
+long as one; with the shared async client they overlap. Events are processed
+the way the webhook workers do, /webhook itself only stores them:
+
+    python benchmarks/bench_concurrent_webhooks.py
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+
+STUB_DELAY = 0.05  # Seconds per stubbed round trip
+CONCURRENCY = [1, 10, 50]
+
+
+class SlowStub(BaseHTTPRequestHandler):
+    def _reply(self):
+        time.sleep(STUB_DELAY)
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        if self.path.startswith("/users/"):
+            body = {"id": 1, "email": "guest@example.com", "full_name": "Guest"}
+        elif self.path.startswith("/events/"):
+            body = {"EventAPI": {"title": "Gig", "date": "2025-06-01T20:00:00Z", "venue": "Hall"}}
+        else:
+            body = {"status": "ok"}
+        payload = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    do_GET = do_PATCH = do_POST = _reply
+
+    def log_message(self, format, *args):
+        pass
+
+
+stub = ThreadingHTTPServer(("127.0.0.1", 0), SlowStub)
+stub.daemon_threads = True
+threading.Thread(target=stub.serve_forever, daemon=True).start()
+STUB_URL = f"http://127.0.0.1:{stub.server_port}"
+for name in ("TICKET_INVENTORY_URL", "AUTH_API_URL", "EVENTS_API_URL", "STRIPE_SERVICE_URL"):
+    os.environ[name] = STUB_URL
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import main
+
+main.publisher.publish = lambda message, routing_key=None: True  # No broker needed
+
+
+def webhook(i: int) -> dict:
+    return {
+        "id": f"evt_{i}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {
+            "object": "checkout.session",
+            "payment_intent": f"pi_{i}",
+            "amount_total": 1000,
+            "metadata": {
+                "split_payment_id": "split_1", "participant_email": "guest@example.com", "user_id": "1",
+                "reservation_id": "res_1", "ticket_id": str(i), "event_id": "1",
+            },
+        }},
+    }
+
+
+async def run():
+    await main.process_webhook(json.dumps(webhook(0)).encode())  # Warm up connections
+    print(f"{'webhooks':>8} | {'wall ms':>8} | {'serialized ms':>13}")
+    for count in CONCURRENCY:
+        started = time.perf_counter()
+        results = await asyncio.gather(*(main.process_webhook(json.dumps(webhook(i)).encode()) for i in range(count)))
+        elapsed = (time.perf_counter() - started) * 1000
+        assert all(result["status"] == "ok" for result in results)
+        print(f"{count:>8} | {elapsed:>8.0f} | {count * 3 * STUB_DELAY * 1000:>13.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
@@ -0,0 +1,43 @@
+"""
+Per-webhook cost of the seen-event index.
+
+Every delivery does one lookup and, for a new event, one add. Measured on a
+full index (SEEN_EVENTS_CAPACITY ids) for new and duplicate events, in memory
+and with SQLite persistence. The budget is 100µs per webhook:
+
+    python benchmarks/bench_seen_events.py
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.seen_events import SEEN_EVENTS_CAPACITY, SeenEventIndex
+
+WEBHOOKS = 100_000
+
+
+def per_webhook_us(index: SeenEventIndex, event_ids: list[str]) -> float:
+    started = time.perf_counter()
+    for event_id in event_ids:
+        if not index.seen(event_id):
+            index.add(event_id)
+    return (time.perf_counter() - started) / len(event_ids) * 1e6
+
+
+def run():
+    directory = tempfile.mkdtemp(prefix="seen-events-bench-")
+    print(f"{'index':>10} | {'new µs':>7} | {'duplicate µs':>12}")
+    for label, path in (("memory", None), ("sqlite", os.path.join(directory, "seen.db"))):
+        index = SeenEventIndex(path)
+        per_webhook_us(index, [f"evt_fill_{i}" for i in range(SEEN_EVENTS_CAPACITY)])
+        new = per_webhook_us(index, [f"evt_new_{i}" for i in range(WEBHOOKS)])
+        duplicate = per_webhook_us(index, [f"evt_new_{i}" for i in range(WEBHOOKS)])
+        index.close()
+        print(f"{label:>10} | {new:>7.2f} | {duplicate:>12.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,13 @@
+import os
+import sys
+import tempfile
+
+# Keep the scheduler's SQLite file out of the working tree, before app modules are imported
+os.environ.setdefault("SCHEDULER_DB_PATH", os.path.join(tempfile.mkdtemp(prefix="party-booking-tests-"), "party_booking.db"))
+
+# Service URLs app.main reads at import time, every outbound call is stubbed in the tests
+for name in ("TICKET_INVENTORY_URL", "TICKET_TRANSFER_URL", "AUTH_API_URL", "EVENTS_API_URL", "STRIPE_SERVICE_URL"):
+    os.environ.setdefault(name, "http://stub")
+
+# Add the parent directory to the path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
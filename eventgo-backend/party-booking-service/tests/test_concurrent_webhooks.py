@@ -0,0 +1,86 @@
+import asyncio
+import json
+
+import httpx
+
+from app import http_client, main
+
+STUB_DELAY = 0.05
+
+
+class SlowStubs:
+    def __init__(self):
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            return await slow_stub(request)
+        finally:
+            self.in_flight -= 1
+
+
+async def slow_stub(request: httpx.Request) -> httpx.Response:
+    await asyncio.sleep(STUB_DELAY)
+    if request.url.path.startswith("/users/"):
+        return httpx.Response(200, json={"id": 1, "email": "guest@example.com", "full_name": "Guest"})
+    if request.url.path.startswith("/events/"):
+        return httpx.Response(200, json={"EventAPI": {"title": "Gig", "date": "2025-06-01T20:00:00Z", "venue": "Hall"}})
+    return httpx.Response(200, json={"status": "ok"})
+
+
+def split_webhook(ticket_id: int) -> dict:
+    return {
+        "id": f"evt_{ticket_id}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {
+            "object": "checkout.session",
+            "payment_intent": f"pi_{ticket_id}",
+            "amount_total": 1000,
+            "metadata": {
+                "split_payment_id": "split_1", "participant_email": "guest@example.com", "user_id": "1",
+                "reservation_id": "res_1", "ticket_id": str(ticket_id), "event_id": "1",
+            },
+        }},
+    }
+
+
+def test_client_is_shared_per_loop():
+    async def twice():
+        return http_client.get_http_client(), http_client.get_http_client()
+
+    first, second = asyncio.run(twice())
+    assert first is second
+    assert asyncio.run(twice())[0] is not first
+
+
+def test_close_only_closes_the_running_loops_client():
+    async def open_and_close():
+        client = http_client.get_http_client()
+        await http_client.close_http_client()
+        return client, http_client.get_http_client()
+
+    closed, reopened = asyncio.run(open_and_close())
+
+    assert closed.is_closed
+    assert reopened is not closed and not reopened.is_closed
+
+
+def test_concurrent_webhooks_do_not_serialize(monkeypatch):
+    stubs = SlowStubs()
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(stubs.handle)))
+    published = []
+    monkeypatch.setattr(main.publisher, "publish", lambda message, routing_key=None: published.append(message) or True)
+
+    async def fire(count):
+        return await asyncio.gather(*(main.process_webhook(json.dumps(split_webhook(i)).encode()) for i in range(count)))
+
+    results = asyncio.run(fire(20))
+
+    assert all(result["status"] == "ok" for result in results)
+    assert len(published) == 20
+    # Stub calls from different webhooks overlapped instead of running one after another
+    assert stubs.max_in_flight > 1
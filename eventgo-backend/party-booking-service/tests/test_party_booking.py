@@ -0,0 +1,130 @@
+import asyncio
+import json
+
+import httpx
+from eventgo_shared.event_cache import EventCache, events_api_loader
+
+from app import http_client, main
+from app.scheduler import SplitCheckScheduler
+from app.split_tracker import SplitTracker
+
+PARTY_SIZE = 10
+
+
+def booking_request() -> dict:
+    items = [
+        {"user_id": i, "user_email": f"guest{i}@example.com" + (";" if i == 0 else ""), "ticket_id": 100 + i, "price": 2500}
+        for i in range(PARTY_SIZE)
+    ]
+    return {"reservation_id": 1, "event_id": 7, "event_title": "Gig", "event_description": "Live", "items": items}
+
+
+def stub_services(calls: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        if request.url.path == "/create-split-payment":
+            participants = json.loads(request.content)["participants"]
+            links = [
+                {"participant_email": p["email"], "user_id": p["user_id"], "ticket_id": p["ticket_id"],
+                 "amount": p["amount"], "url": f"https://pay.example/{p['ticket_id']}"}
+                for p in participants
+            ]
+            return httpx.Response(200, json={"payment_links": links})
+        if request.url.path == "/users/query":
+            ids = json.loads(request.content)["ids"]
+            return httpx.Response(200, json=[{"id": i, "email": f"guest{i}@example.com", "full_name": f"Guest {i}"} for i in ids])
+        if request.url.path.startswith("/users/"):
+            user_id = int(request.url.path.rsplit("/", 1)[1])
+            return httpx.Response(200, json={"id": user_id, "email": f"guest{user_id}@example.com", "full_name": f"Guest {user_id}"})
+        if request.url.path.startswith("/events/"):
+            return httpx.Response(200, json={"EventAPI": {"title": "Gig", "date": "2025-06-01T20:00:00Z", "venue": "Hall"}})
+        return httpx.Response(404)
+
+    return httpx.MockTransport(handler)
+
+
+def fresh_event_cache() -> EventCache:
+    return EventCache(events_api_loader(main.EVENTS_URL, http_client.get_http_client))
+
+
+def test_party_notified_with_one_user_and_one_event_lookup(monkeypatch, tmp_path):
+    calls, order, batches = [], [], []
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=stub_services(calls)))
+    monkeypatch.setattr(main.publisher, "publish_many", lambda messages, routing_key=None: batches.append(messages) or order.append("published") or len(messages))
+    monkeypatch.setattr(main, "event_cache", fresh_event_cache())
+
+    scheduler = SplitCheckScheduler(str(tmp_path / "scheduler.db"))
+    monkeypatch.setattr(main, "scheduler", scheduler)
+    tracker = SplitTracker(str(tmp_path / "scheduler.db"))
+    monkeypatch.setattr(main, "split_tracker", tracker)
+
+    async def recording_app(scope, receive, send):
+        async def recording_send(message):
+            if message["type"] == "http.response.body" and not message.get("more_body"):
+                order.append("responded")
+            await send(message)
+
+        await main.app(scope, receive, recording_send)
+
+    async def book():
+        transport = httpx.ASGITransport(app=recording_app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://party-booking") as client:
+            return await client.post("/party-booking", json=booking_request())
+
+    response = asyncio.run(book())
+
+    assert response.json() == {"status": "ok", "data": {"redirect_url": "https://pay.example/100"}}
+    assert order == ["responded", "published"]
+    assert calls.count(("POST", "/users/query")) == 1
+    assert calls.count(("GET", "/events/7")) == 1
+    assert not any(path.startswith("/users/") and path != "/users/query" for _, path in calls)
+    assert [message["recipientEmailAddress"] for message in batches[0]] == [f"guest{i}@example.com" for i in range(1, PARTY_SIZE)]
+    assert scheduler.snapshot()["pending"] == 1
+    assert tracker.mark_paid(1, 100) == (1, PARTY_SIZE)
+
+
+def test_failed_payment_links_release_the_reservation(monkeypatch, tmp_path):
+    calls, published, released = [], [], []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append((request.method, request.url.path))
+        if request.url.path == "/create-split-payment":
+            return httpx.Response(400, json={"detail": "Payment links failed for tickets [103]"})
+        if request.url.path == "/tickets/cancel-ticket":
+            released.extend(json.loads(request.content)["ticketList"])
+            return httpx.Response(200, json={"status": "success"})
+        return httpx.Response(404)
+
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main.publisher, "publish_many", lambda messages, routing_key=None: published.extend(messages) or len(messages))
+    scheduler = SplitCheckScheduler(str(tmp_path / "scheduler.db"))
+    monkeypatch.setattr(main, "scheduler", scheduler)
+
+    async def book():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://party-booking") as client:
+            return await client.post("/party-booking", json=booking_request())
+
+    response = asyncio.run(book())
+
+    assert response.json()["status"] == "error"
+    assert released == [100 + i for i in range(PARTY_SIZE)]
+    assert published == []
+    assert scheduler.snapshot()["pending"] == 0
+
+
+def test_payment_emails_for_one_event_share_one_event_lookup(monkeypatch):
+    calls = []
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=stub_services(calls)))
+    monkeypatch.setattr(main, "event_cache", fresh_event_cache())
+
+    async def burst():
+        return await asyncio.gather(*(
+            main.build_refund_notification(1, 7, 100 + i, 2500) for i in range(500)
+        ))
+
+    notifications = asyncio.run(burst())
+
+    assert all(n is not None and n["subject"] == "Refund Processed: 'Gig'" for n in notifications)
+    assert calls.count(("GET", "/events/7")) == 1
+    assert main.event_cache.snapshot()["loads"] == 1
@@ -0,0 +1,150 @@
+import threading
+from unittest.mock import patch
+
+import pytest
+from pika.exceptions import AMQPConnectionError, ChannelClosedByBroker, StreamLostError
+
+from app.publisher import RabbitPublisher
+
+
+class FakeBroker:
+    def __init__(self):
+        self.delivered = []
+        self.commits = 0
+        self.connections = []
+        self.failures = []  # Outcomes of the next basic_publish calls: an exception to raise, or None
+        self.down = False
+        self.lock = threading.Lock()
+
+    def connect(self, parameters):
+        if self.down:
+            raise AMQPConnectionError("connection refused")
+        connection = FakeConnection(self)
+        with self.lock:
+            self.connections.append(connection)
+        return connection
+
+
+class FakeConnection:
+    def __init__(self, broker):
+        self.broker = broker
+        self.is_open = True
+
+    def channel(self):
+        return FakeChannel(self)
+
+    def process_data_events(self, time_limit=None):
+        if not self.is_open:
+            raise StreamLostError("connection lost")
+
+    def close(self):
+        self.is_open = False
+
+
+class FakeChannel:
+    def __init__(self, connection):
+        self.connection = connection
+        self.transactional = False
+        self.uncommitted = []
+
+    @property
+    def is_open(self):
+        return self.connection.is_open
+
+    def exchange_declare(self, **kwargs):
+        pass
+
+    def tx_select(self):
+        self.transactional = True
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        assert self.transactional
+        broker = self.connection.broker
+        error = broker.failures.pop(0) if broker.failures else None
+        if error is not None:
+            self.connection.is_open = False  # Uncommitted messages are lost with the channel
+            raise error
+        self.uncommitted.append((routing_key, body))
+
+    def tx_commit(self):
+        broker = self.connection.broker
+        with broker.lock:
+            broker.delivered.extend(self.uncommitted)
+            broker.commits += 1
+        self.uncommitted = []
+
+
+@pytest.fixture
+def broker():
+    fake = FakeBroker()
+    with patch("app.publisher.pika.BlockingConnection", side_effect=fake.connect):
+        yield fake
+
+
+def test_reuses_one_connection(broker):
+    publisher = RabbitPublisher(pool_size=2)
+
+    assert all(publisher.publish({"n": i}) for i in range(10))
+
+    assert len(broker.connections) == 1
+    assert len(broker.delivered) == 10
+
+
+def test_publish_many_commits_the_batch_once(broker):
+    publisher = RabbitPublisher()
+
+    assert publisher.publish_many([{"n": i} for i in range(10)], routing_key="q") == 10
+
+    assert broker.delivered == [("q", f'{{"n": {i}}}') for i in range(10)]
+    assert broker.commits == 1
+    assert len(broker.connections) == 1
+
+
+def test_reconnects_after_lost_connection(broker):
+    publisher = RabbitPublisher()
+    publisher.publish({"n": 0})
+    broker.connections[0].close()  # Dropped while idle in the pool
+    broker.failures = [None, StreamLostError("reset by peer")]  # And again after the first message of the batch
+
+    assert publisher.publish_many([{"n": 1}, {"n": 2}]) == 2
+
+    # Nothing of the broken batch was committed, it was resent as a whole
+    assert [body for _, body in broker.delivered] == ['{"n": 0}', '{"n": 1}', '{"n": 2}']
+    assert len(broker.connections) == 3
+
+
+def test_broker_down_or_closing_the_channel_does_not_raise(broker):
+    publisher = RabbitPublisher(retries=1)
+    broker.down = True
+    assert publisher.publish({"n": 0}) is False
+
+    broker.down = False
+    broker.failures = [ChannelClosedByBroker(406, "PRECONDITION_FAILED")] * 2
+    assert publisher.publish_many([{"n": 1}, {"n": 2}]) == 0
+    assert publisher.publish({"n": 3}) is True
+    assert [body for _, body in broker.delivered] == ['{"n": 3}']
+
+
+def test_unexpected_errors_do_not_raise(broker):
+    publisher = RabbitPublisher(pool_size=1)
+
+    with patch("app.publisher.pika.BlockingConnection", side_effect=OSError("Name or service not known")):
+        assert publisher.publish({"n": 0}) is False
+    assert publisher.publish_many([{"n": 1}, {"bad": object()}, {"n": 2}]) == 1
+
+    # Neither failure leaked the only pool slot
+    assert publisher.publish({"n": 3}) is True
+    assert [body for _, body in broker.delivered] == ['{"n": 1}', '{"n": 3}']
+
+
+def test_pool_size_caps_connections(broker):
+    publisher = RabbitPublisher(pool_size=2)
+
+    threads = [threading.Thread(target=publisher.publish_many, args=([{"n": i}] * 50,)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(broker.delivered) == 400
+    assert len(broker.connections) <= 2
@@ -0,0 +1,119 @@
+import asyncio
+import json
+
+import httpx
+
+from app import http_client, main
+from eventgo_shared import refunds
+from app.refund_ledger import RefundLedger
+
+TICKETS = [{"ticketId": 1, "status": "reserved", "userId": 1, "eventId": 7}] + [
+    {"ticketId": i, "status": "sold", "preference": "refund", "paymentIntentId": f"pi_{i}", "userId": i, "eventId": 7}
+    for i in range(2, 8)
+] + [{"ticketId": 8, "status": "sold", "preference": "keep", "paymentIntentId": "pi_8", "userId": 8, "eventId": 7}]
+
+
+class StubServices:
+    def __init__(self):
+        self.tickets = TICKETS
+        self.refund_keys = []
+        self.batches = 0
+        self.cancelled = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.failing = {"pi_4"}
+
+    async def handle(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if path == "/tickets/tickets-by-ids":
+            return httpx.Response(200, json={"data": self.tickets})
+        if path == "/refunds/batch":
+            refunds = json.loads(request.content)["refunds"]
+            self.batches += 1
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(0.01)
+            self.in_flight -= 1
+            lines = []
+            for index, refund in enumerate(refunds):
+                self.refund_keys.append(refund["idempotency_key"])
+                result = {"index": index, "payment_intent_id": refund["payment_intent_id"],
+                          "idempotency_key": refund["idempotency_key"], "refund": None, "error": None}
+                if refund["payment_intent_id"] in self.failing:
+                    result["error"] = "card_declined"
+                else:
+                    result["refund"] = {"id": "re_1", "amount": 2500, "status": "succeeded"}
+                lines.append(json.dumps(result) + "\n")
+            return httpx.Response(200, text="".join(lines), headers={"content-type": "application/x-ndjson"})
+        if path == "/tickets/cancel-ticket":
+            self.cancelled.append(json.loads(request.content)["ticketList"])
+            return httpx.Response(200, json={"status": "ok"})
+        if path.startswith("/users/"):
+            user_id = int(path.rsplit("/", 1)[1])
+            return httpx.Response(200, json={"id": user_id, "email": f"guest{user_id}@example.com", "full_name": "Guest"})
+        if path.startswith("/events/"):
+            return httpx.Response(200, json={"EventAPI": {"title": "Gig", "date": "2025-06-01T20:00:00Z", "venue": "Hall"}})
+        return httpx.Response(404)
+
+
+def test_retry_only_redoes_failed_refunds(monkeypatch, tmp_path):
+    stubs = StubServices()
+    published = []
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(stubs.handle)))
+    monkeypatch.setattr(main.publisher, "publish_many", lambda messages, routing_key=None: published.extend(messages) or len(messages))
+    monkeypatch.setattr(main, "refund_ledger", RefundLedger(str(tmp_path / "ledger.db")))
+    monkeypatch.setattr(refunds, "REFUND_BATCH_SIZE", 4)
+
+    first = asyncio.run(main.refund_split([t["ticketId"] for t in TICKETS]))
+
+    assert first["status"] == "error" and first["failed"] == [4]
+    assert len(stubs.refund_keys) == 6
+    # Two batch requests instead of six refunds, one after the other
+    assert stubs.batches == 2 and stubs.max_in_flight == 1
+    assert stubs.cancelled == []
+    assert sorted(m["recipientEmailAddress"] for m in published) == [f"guest{i}@example.com" for i in (2, 3, 5, 6, 7)]
+
+    stubs.failing.clear()
+    second = asyncio.run(main.refund_split([t["ticketId"] for t in TICKETS]))
+
+    assert second == {"status": "ok"}
+    assert stubs.refund_keys[6:] == ["split-refund-ticket-4-pi_4"]
+    assert [m["recipientEmailAddress"] for m in published[5:]] == ["guest4@example.com"]
+    assert sorted(stubs.cancelled[0]) == [1, 2, 3, 4, 5, 6, 7]
+    assert main.refund_ledger.snapshot() == {"refunded": 6, "failed": 0}
+
+
+def test_resold_ticket_is_refunded_for_its_new_payment(monkeypatch, tmp_path):
+    stubs = StubServices()
+    stubs.failing.clear()
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(stubs.handle)))
+    monkeypatch.setattr(main.publisher, "publish_many", lambda messages, routing_key=None: len(messages))
+    monkeypatch.setattr(main, "refund_ledger", RefundLedger(str(tmp_path / "ledger.db")))
+    assert asyncio.run(main.refund_split([t["ticketId"] for t in TICKETS]))["status"] == "ok"
+
+    # Ticket 2 was cancelled, sold again and paid with a new payment intent
+    stubs.tickets = [dict(ticket, paymentIntentId="pi_2_resold") if ticket["ticketId"] == 2 else ticket for ticket in TICKETS]
+    stubs.refund_keys.clear()
+    assert asyncio.run(main.refund_split([t["ticketId"] for t in TICKETS]))["status"] == "ok"
+
+    assert stubs.refund_keys == ["split-refund-ticket-2-pi_2_resold"]
+    assert main.refund_ledger.snapshot() == {"refunded": 7, "failed": 0}
+
+
+def test_sold_ticket_without_payment_intent_is_reported_not_refunded(monkeypatch, tmp_path):
+    stubs = StubServices()
+    stubs.failing.clear()
+    # Ticket 3 was marked sold without a payment intent
+    stubs.tickets = [dict(ticket, paymentIntentId=None) if ticket["ticketId"] == 3 else ticket for ticket in TICKETS]
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(stubs.handle)))
+    monkeypatch.setattr(main.publisher, "publish_many", lambda messages, routing_key=None: len(messages))
+    monkeypatch.setattr(main, "refund_ledger", RefundLedger(str(tmp_path / "ledger.db")))
+
+    result = asyncio.run(main.refund_split([t["ticketId"] for t in TICKETS]))
+
+    assert result["status"] == "error"
+    assert result["failed"] == [3] and result["missing_payment_intent"] == [3]
+    # Everyone else is still refunded, but the booking isn't cancelled until ticket 3 is sorted out
+    assert len(stubs.refund_keys) == 5
+    assert stubs.cancelled == []
+    assert main.refund_ledger.snapshot() == {"refunded": 5, "failed": 0}
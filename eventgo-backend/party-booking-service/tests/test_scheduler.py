@@ -0,0 +1,82 @@
+import asyncio
+import time
+
+from app.scheduler import SplitCheckScheduler
+
+
+def test_pending_checks_survive_restart(tmp_path):
+    path = str(tmp_path / "scheduler.db")
+    first = SplitCheckScheduler(path)
+    first.schedule([1, 2], delay=0, reservation_id=10)
+    first.schedule([3], delay=3600, reservation_id=11)
+    first.close()
+
+    restarted = SplitCheckScheduler(path)
+    due = restarted.claim_due()
+
+    assert [(check.reservation_id, check.ticket_ids) for check in due] == [("10", [1, 2])]
+    assert restarted.snapshot()["pending"] == 2
+    assert restarted.snapshot()["running"] == 1
+
+
+def test_runs_due_checks_in_batches(tmp_path):
+    scheduler = SplitCheckScheduler(str(tmp_path / "scheduler.db"), batch_size=500)
+    for i in range(2000):
+        scheduler.schedule([i], delay=0)
+    scheduler.schedule([-1], delay=3600)
+    handled = []
+
+    async def handler(check):
+        handled.append(check.ticket_ids[0])
+        return True
+
+    async def drain():
+        batches = []
+        while claimed := await scheduler.run_due(handler):
+            batches.append(claimed)
+        return batches
+
+    assert asyncio.run(drain()) == [500, 500, 500, 500]
+    assert sorted(handled) == list(range(2000))
+    assert scheduler.snapshot()["pending"] == 1
+
+
+def test_failed_checks_are_retried_then_kept_as_dead(tmp_path):
+    path = str(tmp_path / "scheduler.db")
+    scheduler = SplitCheckScheduler(path, retry_delay=0, max_attempts=3)
+    scheduler.schedule([1, 2], delay=0, reservation_id=7)
+    attempts = []
+
+    async def flaky(check):
+        attempts.append(check.attempts)
+        if check.attempts == 1:
+            raise RuntimeError("ticket inventory down")
+        return False
+
+    async def run_four_times():
+        for _ in range(4):
+            await scheduler.run_due(flaky)
+
+    asyncio.run(run_four_times())
+    scheduler.close()
+
+    # Out of attempts: no longer claimed, but still there after a restart
+    assert attempts == [1, 2, 3]
+    restarted = SplitCheckScheduler(path)
+    assert restarted.snapshot()["pending"] == 0
+    assert restarted.snapshot()["dead"] == 1
+    assert [(check.reservation_id, check.ticket_ids, check.attempts) for check in restarted.dead_checks()] == [
+        ("7", [1, 2], 3)
+    ]
+
+
+def test_cancel_and_reclaim_after_crash(tmp_path):
+    scheduler = SplitCheckScheduler(str(tmp_path / "scheduler.db"), claim_timeout=60)
+    scheduler.schedule([1], delay=0, reservation_id=1)
+    scheduler.schedule([2], delay=0, reservation_id=2)
+
+    assert scheduler.cancel(1) == 1
+    assert len(scheduler.claim_due()) == 1
+    # Claimed by a process that died: invisible until the claim times out
+    assert scheduler.claim_due() == []
+    assert [check.ticket_ids for check in scheduler.claim_due(now=time.time() + 61)] == [[2]]
@@ -0,0 +1,96 @@
+import asyncio
+
+import httpx
+
+from app import main
+from app.seen_events import SeenEventIndex
+
+
+def test_ids_expire_after_ttl():
+    index = SeenEventIndex(ttl=10)
+    assert index.add("evt_1", now=100) is True
+    assert index.add("evt_1", now=105) is False
+    assert index.seen("evt_1", now=109) is True
+    assert index.seen("evt_1", now=110) is False
+
+    index.add("evt_2", now=111)
+    assert len(index) == 1  # evt_1 evicted
+
+
+def test_oldest_ids_are_evicted_at_capacity():
+    index = SeenEventIndex(capacity=3)
+    for i in range(5):
+        index.add(f"evt_{i}")
+
+    assert [index.seen(f"evt_{i}") for i in range(5)] == [False, False, True, True, True]
+    assert index.snapshot()["evicted"] == 2
+
+
+def test_ids_survive_a_restart(tmp_path):
+    path = str(tmp_path / "seen.db")
+    index = SeenEventIndex(path, flush_size=100)
+    index.add("evt_1")
+    index.add("evt_2")
+    index.close()
+
+    restarted = SeenEventIndex(path)
+    asyncio.run(restarted.load())
+    assert restarted.seen("evt_1") and restarted.seen("evt_2")
+    assert not restarted.seen("evt_3")
+
+
+def test_add_leaves_the_write_to_the_flusher(tmp_path):
+    index = SeenEventIndex(str(tmp_path / "seen.db"), flush_size=2, flush_interval=60)
+    written = []
+
+    async def run():
+        flusher = asyncio.create_task(index.run())
+        await asyncio.sleep(0)
+        index.add("evt_1")
+        index.add("evt_2")  # Fills the batch, the flusher writes it without waiting out the interval
+        for _ in range(100):
+            written[:] = index.conn.execute("SELECT event_id FROM seen_events ORDER BY event_id").fetchall()
+            if written:
+                break
+            await asyncio.sleep(0.01)
+        flusher.cancel()
+
+    asyncio.run(run())
+
+    assert written == [("evt_1",), ("evt_2",)]
+
+
+def test_ids_added_before_the_load_finishes_are_kept(tmp_path):
+    path = str(tmp_path / "seen.db")
+    stored = SeenEventIndex(path, ttl=10)
+    stored.add("evt_1")
+    stored.close()
+
+    index = SeenEventIndex(path, ttl=10)
+    index.add("evt_2")
+    asyncio.run(index.load())
+
+    assert index.seen("evt_1") and index.seen("evt_2")
+    # Stored ids expire first, so they stay ahead of newer ones for eviction
+    assert list(index._expires) == ["evt_1", "evt_2"]
+
+
+def test_webhook_duplicate_is_answered_from_the_index(monkeypatch):
+    index = SeenEventIndex()
+    index.add("evt_1")
+    monkeypatch.setattr(main, "seen_events", index)
+
+    async def stored(*args):
+        raise AssertionError("duplicate reached the webhook queue")
+
+    monkeypatch.setattr(main.webhook_queue, "put", stored)
+
+    async def deliver():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://party-booking") as client:
+            return await client.post("/webhook", json={"id": "evt_1", "type": "checkout.session.completed"})
+
+    response = asyncio.run(deliver())
+
+    assert response.json()["message"] == "Duplicate event"
+    assert index.snapshot()["hits"] == 1
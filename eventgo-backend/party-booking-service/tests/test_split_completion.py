@@ -0,0 +1,94 @@
+import asyncio
+import json
+
+import httpx
+
+from app import http_client, main
+from app.scheduler import SplitCheckScheduler
+from app.split_tracker import SplitTracker
+
+
+def stub_services(calls: list):
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.startswith("/users/"):
+            return httpx.Response(200, json={"id": 1, "email": "guest@example.com", "full_name": "Guest"})
+        if request.url.path.startswith("/events/"):
+            return httpx.Response(200, json={"EventAPI": {"title": "Gig", "date": "2025-06-01T20:00:00Z", "venue": "Hall"}})
+        return httpx.Response(200, json={"status": "ok"})
+
+    return httpx.MockTransport(handler)
+
+
+def paid_webhook(ticket_id: int) -> dict:
+    return {
+        "id": f"evt_{ticket_id}",
+        "object": "event",
+        "type": "checkout.session.completed",
+        "data": {"object": {
+            "object": "checkout.session",
+            "payment_intent": f"pi_{ticket_id}",
+            "amount_total": 1000,
+            "metadata": {
+                "split_payment_id": "split_9", "participant_email": "guest@example.com", "user_id": "1",
+                "reservation_id": "9", "ticket_id": str(ticket_id), "event_id": "1",
+            },
+        }},
+    }
+
+
+def test_reservation_finalized_when_last_ticket_is_paid(monkeypatch, tmp_path):
+    calls = []
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=stub_services(calls)))
+    monkeypatch.setattr(main.publisher, "publish", lambda message, routing_key=None: True)
+    scheduler = SplitCheckScheduler(str(tmp_path / "split.db"))
+    tracker = SplitTracker(str(tmp_path / "split.db"))
+    monkeypatch.setattr(main, "scheduler", scheduler)
+    monkeypatch.setattr(main, "split_tracker", tracker)
+
+    tracker.start(9, [1, 2, 3])
+    scheduler.schedule([1, 2, 3], delay=75, reservation_id=9)
+
+    async def pay(*ticket_ids):
+        for ticket_id in ticket_ids:
+            await main.process_webhook(json.dumps(paid_webhook(ticket_id)).encode())
+
+    asyncio.run(pay(1, 2, 2))  # Stripe may deliver a webhook twice
+    assert scheduler.snapshot()["pending"] == 1
+    assert tracker.snapshot() == {"open": 1}
+
+    asyncio.run(pay(3))
+    assert scheduler.snapshot()["pending"] == 0
+    assert tracker.snapshot() == {"open": 0}
+    assert "/tickets/tickets-by-ids" not in calls
+
+
+def test_unconfirmed_ticket_is_retried_without_email(monkeypatch, tmp_path):
+    published = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(503, json={"status": "error", "message": "Ticket inventory unavailable"})
+
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main.publisher, "publish", lambda message, routing_key=None: published.append(message) or True)
+    monkeypatch.setattr(main, "split_tracker", SplitTracker(str(tmp_path / "split.db")))
+
+    assert asyncio.run(main.handle_webhook(json.dumps(paid_webhook(1)).encode())) is False
+    assert published == []
+
+
+def test_failed_confirmation_email_does_not_retry_the_event(monkeypatch, tmp_path):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        if request.url.path.startswith("/users/"):
+            return httpx.Response(500)
+        return httpx.Response(200, json={"status": "ok"})
+
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    monkeypatch.setattr(main, "split_tracker", SplitTracker(str(tmp_path / "split.db")))
+
+    # A retry would confirm the ticket again and resend the email once it works
+    assert asyncio.run(main.handle_webhook(json.dumps(paid_webhook(1)).encode())) is True
+    assert calls.count("/tickets/confirm-split") == 1
@@ -0,0 +1,150 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from app import http_client, main
+from app.seen_events import SeenEventIndex
+from app.webhook_queue import WebhookQueue
+
+
+def event(event_id: str) -> dict:
+    return {"id": event_id, "object": "event", "type": "payment_intent.succeeded", "data": {"object": {}}}
+
+
+def test_webhook_is_stored_and_acknowledged_once(monkeypatch, tmp_path):
+    queue = WebhookQueue(str(tmp_path / "webhooks.db"))
+    monkeypatch.setattr(main, "webhook_queue", queue)
+    monkeypatch.setattr(main, "seen_events", SeenEventIndex())
+
+    async def deliver(*event_ids):
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://party-booking") as client:
+            return [(await client.post("/webhook", json=event(event_id))).json() for event_id in event_ids]
+
+    responses = asyncio.run(deliver("evt_1", "evt_2", "evt_1"))
+
+    assert [response["status"] for response in responses] == ["ok", "ok", "ok"]
+    assert responses[2]["message"] == "Duplicate event"
+    snapshot = queue.snapshot()
+    assert (snapshot["queued"], snapshot["received"]) == (2, 2)
+
+
+def test_workers_process_events_in_arrival_order(tmp_path):
+    queue = WebhookQueue(str(tmp_path / "webhooks.db"), workers=1, poll_interval=0.01)
+    handled = []
+
+    async def handler(payload):
+        handled.append(json.loads(payload)["id"])
+
+    async def run():
+        for i in range(3):
+            await queue.put(f"evt_{i}", "payment_intent.succeeded", json.dumps(event(f"evt_{i}")).encode())
+        worker = asyncio.create_task(queue.run(handler))
+        while queue.snapshot()["processed"] < 3:
+            await asyncio.sleep(0.01)
+        worker.cancel()
+
+    asyncio.run(run())
+
+    assert handled == ["evt_0", "evt_1", "evt_2"]
+    snapshot = queue.snapshot()
+    assert (snapshot["queued"], snapshot["lag_seconds"]) == (0, 0.0)
+    # A redelivery after processing is still recognised
+    assert queue.enqueue("evt_1", "payment_intent.succeeded", b"{}") is False
+
+
+def test_each_stored_event_wakes_an_idle_worker(tmp_path):
+    # Polling alone would leave the events waiting for a minute
+    queue = WebhookQueue(str(tmp_path / "webhooks.db"), workers=2, poll_interval=60)
+    running = []
+
+    async def run():
+        done = asyncio.Event()
+
+        async def handler(payload):
+            running.append(json.loads(payload)["id"])
+            await done.wait()
+
+        workers = asyncio.create_task(queue.run(handler))
+        await asyncio.sleep(0.05)  # Both workers idle
+        for i in range(2):
+            await queue.put(f"evt_{i}", "payment_intent.succeeded", json.dumps(event(f"evt_{i}")).encode())
+        for _ in range(100):
+            if len(running) == 2:
+                break
+            await asyncio.sleep(0.01)
+        done.set()
+        while queue.snapshot()["processed"] < len(running):
+            await asyncio.sleep(0.01)
+        workers.cancel()
+
+    asyncio.run(run())
+
+    assert sorted(running) == ["evt_0", "evt_1"]
+
+
+def test_failed_event_is_retried_then_given_up(tmp_path):
+    queue = WebhookQueue(str(tmp_path / "webhooks.db"), retry_delay=0, max_attempts=2)
+    attempts = []
+
+    async def handler(payload):
+        attempts.append(payload)
+        raise RuntimeError("ticket inventory down")
+
+    queue.enqueue("evt_1", "checkout.session.completed", b"{}")
+    assert asyncio.run(queue.process_next(handler)) is True
+    assert queue.snapshot()["queued"] == 1
+    assert asyncio.run(queue.process_next(handler)) is True
+    assert asyncio.run(queue.process_next(handler)) is False
+
+    assert len(attempts) == 2
+    snapshot = queue.snapshot()
+    assert (snapshot["queued"], snapshot["failed"], snapshot["processed"]) == (0, 1, 0)
+
+
+def test_error_result_is_retried(monkeypatch, tmp_path):
+    async def failing(payload):
+        return {"status": "error", "message": "Ticket inventory unavailable"}
+
+    monkeypatch.setattr(main, "process_webhook", failing)
+    queue = WebhookQueue(str(tmp_path / "webhooks.db"), retry_delay=60)
+    queue.enqueue("evt_1", "checkout.session.completed", b"{}")
+
+    asyncio.run(queue.process_next(main.handle_webhook))
+
+    assert queue.snapshot()["queued"] == 1
+    assert queue.claim() is None  # Not due again before the retry delay
+    assert queue.claim(now=time.time() + 61)[0] == "evt_1"
+
+
+def test_transfer_retry_reuses_the_seller_refund_key(monkeypatch):
+    bodies = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        bodies.append(json.loads(request.content))
+        if len(bodies) == 1:
+            # ticket-transfer may already have refunded the seller
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, json={"status": "success"})
+
+    monkeypatch.setattr(http_client, "create_http_client", lambda: httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    payload = json.dumps({
+        "id": "evt_transfer", "object": "event", "type": "checkout.session.completed",
+        "data": {"object": {"object": "checkout.session", "payment_intent": "pi_buyer", "metadata": {
+            "transfer_id": "tr_1", "ticket_id": "5", "seller_id": "1", "buyer_id": "2", "amount_in_cents": "2500", "event_id": "7",
+        }}},
+    }).encode()
+
+    assert asyncio.run(main.handle_webhook(payload)) is False
+    assert asyncio.run(main.handle_webhook(payload)) is True
+    assert [body["idempotency_key"] for body in bodies] == ["transfer-refund-evt_transfer"] * 2
+
+
+def test_snapshot_reports_lag_of_oldest_event(tmp_path):
+    queue = WebhookQueue(str(tmp_path / "webhooks.db"))
+    queue.enqueue("evt_1", "checkout.session.completed", b"{}")
+    queue.conn.execute("UPDATE webhook_events SET received_at = received_at - 30")
+
+    assert queue.snapshot()["lag_seconds"] >= 30
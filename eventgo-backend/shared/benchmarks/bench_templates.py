@@ -0,0 +1,83 @@
+"""
+Rendering 100k event cancellation emails for one event.
+
+"inline" is how the services built messages before: an f-string per message
+that parses and formats the event date again each time. "render" calls
+NotificationTemplate.render per recipient with the event fields worked out
+once, "render_batch" renders every recipient in one call. str.format_map is
+no faster than an f-string, so "render" is about as fast as "inline" (the
+keyword arguments cost what the date formatting saved); "render_batch" is
+around 10% faster, all of it from formatting the event date once:
+
+    python benchmarks/bench_templates.py
+"""
+from datetime import datetime
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventgo_shared.templates import NotificationTemplate, event_fields
+
+EMAILS = 100_000
+EVENT = {"title": "Midnight Orchestra", "date": "2025-06-01T20:00:00Z", "venue": "Esplanade Hall"}
+RECIPIENTS = [
+    {"full_name": f"Guest {i}", "seat_numbers": f"A{i % 300}, A{i % 300 + 1}", "amount": 25.0 * (i % 4 + 1), "status": "succeeded"}
+    for i in range(EMAILS)
+]
+
+EVENT_CANCELLED = NotificationTemplate(
+    subject="Important Notice: The Event '{title}' Has Been Canceled",
+    message=(
+        "Hello {full_name},\n\n"
+        "We regret to inform you that '{title}' scheduled for {date} at {venue} has been canceled. "
+        "Your tickets {seat_numbers} have been refunded automatically—no action is needed. "
+        "Total refunded amount: ${amount:.2f}. Refund status: {status}.\n\n"
+        "If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
+        "We apologize for the inconvenience and appreciate your understanding.\n\n"
+        "Sincerely,\nEventGo Customer Support"
+    ),
+)
+
+
+def inline(event: dict, recipients: list[dict]) -> list[tuple[str, str]]:
+    rendered = []
+    for user in recipients:
+        formatted_date = datetime.fromisoformat(event.get("date").replace("Z", "+00:00")).strftime("%B %d, %Y at %I:%M %p")
+        subject = f"Important Notice: The Event '{event.get('title')}' Has Been Canceled"
+        message = (
+            f"Hello {user.get('full_name', '')},\n\n"
+            f"We regret to inform you that '{event.get('title')}' scheduled for {formatted_date} at {event.get('venue')} has been canceled. "
+            f"Your tickets {user['seat_numbers']} have been refunded automatically—no action is needed. "
+            f"Total refunded amount: ${user['amount']:.2f}. Refund status: {user['status']}.\n\n"
+            f"If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
+            "We apologize for the inconvenience and appreciate your understanding.\n\n"
+            "Sincerely,\nEventGo Customer Support"
+        )
+        rendered.append((subject, message))
+    return rendered
+
+
+def render(event: dict, recipients: list[dict]) -> list[tuple[str, str]]:
+    fields = event_fields(event)
+    return [EVENT_CANCELLED.render(**fields, **user) for user in recipients]
+
+
+def render_batch(event: dict, recipients: list[dict]) -> list[tuple[str, str]]:
+    return EVENT_CANCELLED.render_batch(event, recipients)
+
+
+def run():
+    expected = inline(EVENT, RECIPIENTS[:10])
+    print(f"{'renderer':>12} | {'total ms':>8} | {'µs/email':>8}")
+    for renderer in (inline, render, render_batch):
+        assert renderer(EVENT, RECIPIENTS[:10]) == expected
+        started = time.perf_counter()
+        renderer(EVENT, RECIPIENTS)
+        elapsed = time.perf_counter() - started
+        print(f"{renderer.__name__:>12} | {elapsed * 1000:>8.0f} | {elapsed / EMAILS * 1e6:>8.2f}")
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,117 @@
+"""
+In-process cache of event details from the Events API.
+
+Every notification builder needs an event's title, date and venue, and the
+Events API is a remote OutSystems host. Entries are fresh for ``ttl``
+seconds. For ``stale_ttl`` seconds after that the cached value is still
+returned while one background request refreshes it, and if that request
+fails the stale value is kept. Concurrent misses for the same event share
+one upstream request, so a burst of 500 emails for one event loads it once.
+"""
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+EVENT_CACHE_TTL = float(os.getenv("EVENT_CACHE_TTL", 60))
+EVENT_CACHE_STALE_TTL = float(os.getenv("EVENT_CACHE_STALE_TTL", 600))
+EVENT_CACHE_SIZE = int(os.getenv("EVENT_CACHE_SIZE", 1000))
+
+
+def events_api_loader(events_url: str, get_client: Callable) -> Callable[[str], Awaitable[dict]]:
+    """Loader for ``GET {events_url}/events/{id}`` with an httpx-style async client."""
+
+    async def load(event_id: str) -> dict:
+        response = await get_client().get(f"{events_url}/events/{event_id}")
+        response.raise_for_status()
+        return response.json().get("EventAPI", {})
+
+    return load
+
+
+class EventCache:
+    """
+    Args:
+        loader: Coroutine function returning the details of one event id
+        ttl: Seconds an entry is served without checking upstream
+        stale_ttl: Seconds after ``ttl`` a stale entry is served while it is refreshed
+        max_entries: Least recently used events are dropped beyond this
+    """
+
+    def __init__(
+        self,
+        loader: Callable[[str], Awaitable[dict]],
+        ttl: float = EVENT_CACHE_TTL,
+        stale_ttl: float = EVENT_CACHE_STALE_TTL,
+        max_entries: int = EVENT_CACHE_SIZE,
+    ):
+        self.loader = loader
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.loads = 0
+        self.errors = 0
+        # event id -> (details, loaded_at)
+        self._entries: OrderedDict[str, tuple[dict, float]] = OrderedDict()
+        # event id -> upstream request in flight, shared by everyone waiting for that event
+        self._loading: dict[str, asyncio.Task] = {}
+
+    async def get(self, event_id) -> dict:
+        key = str(event_id)
+        entry = self._entries.get(key)
+        if entry is not None:
+            event, loaded_at = entry
+            age = time.monotonic() - loaded_at
+            if age < self.ttl:
+                self.hits += 1
+                self._entries.move_to_end(key)
+                return event
+            if age < self.ttl + self.stale_ttl:
+                self.stale_hits += 1
+                self._entries.move_to_end(key)
+                self._load(key)
+                return event
+        self.misses += 1
+        return await asyncio.shield(self._load(key))
+
+    def _load(self, key: str) -> asyncio.Task:
+        task = self._loading.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            return task
+        task = asyncio.get_running_loop().create_task(self._fetch(key))
+        self._loading[key] = task
+        task.add_done_callback(lambda done: self._loaded(key, done))
+        return task
+
+    async def _fetch(self, key: str) -> dict:
+        self.loads += 1
+        event = await self.loader(key)
+        self._entries[key] = (event, time.monotonic())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return event
+
+    def _loaded(self, key: str, task: asyncio.Task):
+        if self._loading.get(key) is task:
+            del self._loading[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.errors += 1
+            print(f"[EventCache] Failed to load event {key}: {task.exception()!r}")
+
+    def invalidate(self, event_id):
+        self._entries.pop(str(event_id), None)
+
+    def snapshot(self) -> dict:
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "stale_hits": self.stale_hits,
+            "misses": self.misses,
+            "loads": self.loads,
+            "errors": self.errors,
+        }
@@ -0,0 +1,59 @@
+"""
+Client for stripe-service ``POST /refunds/batch``.
+
+Sends refunds REFUND_BATCH_SIZE at a time and yields every result as
+stripe-service streams it back (NDJSON, completion order). ``index`` in each
+result is the refund's position in the full list given to
+``refund_in_batches``. If a batch request fails part way, every refund it
+hadn't answered yet is yielded with ``error`` set, so callers always get
+exactly one result per refund.
+"""
+import json
+import os
+from typing import AsyncIterator
+
+import httpx
+
+REFUND_BATCH_SIZE = int(os.getenv("REFUND_BATCH_SIZE", 500))
+# Seconds to wait for the next result, longer than stripe-service's longest rate-limit pause
+REFUND_BATCH_READ_TIMEOUT = float(os.getenv("REFUND_BATCH_READ_TIMEOUT", 60))
+
+
+async def refund_in_batches(
+    client: httpx.AsyncClient, stripe_url: str, refunds: list[dict], batch_size: int | None = None
+) -> AsyncIterator[dict]:
+    """
+    Args:
+        client: Async client used for the requests
+        stripe_url: Base URL of stripe-service
+        refunds: ``{"payment_intent_id", "amount", "reason", "idempotency_key"}``, only the id is required
+        batch_size: Refunds per request (REFUND_BATCH_SIZE), at most stripe-service's REFUND_BATCH_MAX_SIZE
+    """
+    batch_size = batch_size or REFUND_BATCH_SIZE
+    for start in range(0, len(refunds), batch_size):
+        batch = refunds[start:start + batch_size]
+        answered = set()
+        try:
+            async with client.stream(
+                "POST",
+                f"{stripe_url}/refunds/batch",
+                json={"refunds": batch},
+                timeout=httpx.Timeout(10, read=REFUND_BATCH_READ_TIMEOUT),
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line:
+                        result = json.loads(line)
+                        answered.add(result["index"])
+                        result["index"] += start
+                        yield result
+        except (httpx.HTTPError, ValueError) as e:
+            for index, refund in enumerate(batch):
+                if index not in answered:
+                    yield {
+                        "index": start + index,
+                        "payment_intent_id": refund["payment_intent_id"],
+                        "idempotency_key": refund.get("idempotency_key"),
+                        "refund": None,
+                        "error": f"Batch refund request failed: {e}",
+                    }
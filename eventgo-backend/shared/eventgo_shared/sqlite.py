@@ -0,0 +1,88 @@
+"""
+Local SQLite stores sharing one database file.
+
+A service keeps its durable state (queues, ledgers, caches) as tables in one
+SQLite file. Every ``SQLiteStore`` on the same path shares one connection,
+opened on first use in WAL mode, and one lock, so the pragmas and locking
+live here instead of in each store. Each statement a store runs, and each
+``BEGIN ... COMMIT`` block, must hold ``db_lock``; that also keeps one
+store's transaction from interleaving with another's on the shared
+connection. Each store creates its own tables (``schema``) on first use. The
+connection is closed when the last store using it is closed.
+"""
+import os
+import sqlite3
+import threading
+
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    if path != ":memory:":
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+
+class _Database:
+    __slots__ = ("key", "conn", "lock", "stores")
+
+    def __init__(self, key: str, path: str):
+        self.key = key
+        self.conn = connect_sqlite(path)
+        self.lock = threading.Lock()
+        self.stores = 0
+
+
+_databases: dict[str, _Database] = {}
+_databases_lock = threading.Lock()
+
+
+def _database_key(path: str) -> str:
+    return path if path == ":memory:" else os.path.abspath(path)
+
+
+class SQLiteStore:
+    schema: tuple[str, ...] = ()  # CREATE ... IF NOT EXISTS statements, run on first use
+
+    def __init__(self, path: str | None):
+        self.path = path
+        self._db: _Database | None = None
+
+    def _open(self) -> _Database:
+        db = self._db
+        if db is not None:
+            return db
+        key = _database_key(self.path)
+        with _databases_lock:
+            if self._db is not None:  # Opened by another thread meanwhile
+                return self._db
+            db = _databases.get(key)
+            if db is None:
+                db = _databases[key] = _Database(key, self.path)
+            with db.lock:
+                for statement in self.schema:
+                    db.conn.execute(statement)
+            db.stores += 1
+            self._db = db
+        return db
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        return self._open().conn
+
+    @property
+    def db_lock(self) -> threading.Lock:
+        return self._open().lock
+
+    def close(self):
+        db, self._db = self._db, None
+        if db is None:
+            return
+        with _databases_lock:
+            db.stores -= 1
+            if db.stores:
+                return
+            del _databases[db.key]
+        with db.lock:
+            db.conn.close()
@@ -0,0 +1,74 @@
+"""
+Notification templates with memoized event dates.
+
+Templates use ``str.format`` syntax with plain field names (``"Hello
+{full_name}"``, ``"${amount:.2f}"``). Each template is checked when it is
+defined and rendered with ``str.format_map``, so it can't reach attributes,
+items or positional arguments of its fields. Rendering itself is no faster
+than an f-string; the saving is in the event fields (``title``, ``venue``
+and the formatted ``date``), worked out once per event and shared by every
+recipient of a batch, with formatted dates memoized across events.
+"""
+import functools
+import keyword
+from datetime import datetime
+from string import Formatter
+
+DATE_FORMAT = "%B %d, %Y at %I:%M %p"
+
+
+@functools.lru_cache(maxsize=1024)
+def format_event_date(value: str) -> str:
+    """``"2025-06-01T20:00:00Z"`` -> ``"June 01, 2025 at 08:00 PM"``"""
+    return datetime.fromisoformat(value.replace("Z", "+00:00")).strftime(DATE_FORMAT)
+
+
+def format_timestamp(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp).strftime(DATE_FORMAT)
+
+
+def event_fields(event: dict) -> dict:
+    """Template fields of an Events API event."""
+    return {"title": event.get("title"), "venue": event.get("venue"), "date": format_event_date(event["date"])}
+
+
+def check_template(template: str) -> str:
+    """Raise ValueError unless every field of a ``str.format`` template is a plain name."""
+    for _, field, spec, _ in Formatter().parse(template):
+        if field is not None and (not field.isidentifier() or keyword.iskeyword(field) or (spec and "{" in spec)):
+            raise ValueError(f"Template fields must be plain names, got {{{field}}}")
+    return template
+
+
+def _render(template: str, fields: dict) -> str:
+    try:
+        return template.format_map(fields)
+    except KeyError as e:
+        raise TypeError(f"Missing template field {e.args[0]!r}") from None
+
+
+class NotificationTemplate:
+    """
+    Subject and message of one kind of notification.
+
+    ``render`` takes every field as a keyword argument, unused ones are
+    ignored and a missing one raises TypeError. ``render_batch``
+    renders one event's notification for many recipients, the event fields
+    are computed once and each recipient dict supplies the rest.
+    """
+
+    def __init__(self, subject: str, message: str):
+        self._subject = check_template(subject)
+        self._message = check_template(message)
+
+    def render(self, **fields) -> tuple[str, str]:
+        return _render(self._subject, fields), _render(self._message, fields)
+
+    def render_batch(self, event: dict, recipients: list[dict], **shared) -> list[tuple[str, str]]:
+        fields = {**event_fields(event), **shared}
+        subject, message = self._subject, self._message
+        rendered = []
+        for recipient in recipients:
+            context = {**fields, **recipient}
+            rendered.append((_render(subject, context), _render(message, context)))
+        return rendered
@@ -0,0 +1,180 @@
+"""
+Local verification of auth-service JWTs.
+
+Tokens minted by auth-service are HS256-signed and carry ``sub`` (email),
+``role``, ``user_id`` and ``exp``, so any service holding the signing key can
+check them without calling ``/validate-token``. Revoked (logged out) tokens
+are replicated from auth-service ``/revoked-tokens`` (keyed by ``jti``, or by
+the token fingerprint for tokens minted without one) and auth-service is only
+consulted for tokens whose principal cannot be built from the claims.
+"""
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import requests
+from jose import JWTError, jwt
+
+JWT_SECRET_KEY = os.getenv("JWT_SECRET_KEY", "your_super_secret_key_here")
+JWT_ALGORITHM = os.getenv("JWT_ALGORITHM", "HS256")
+AUTH_SERVICE_URL = os.getenv("AUTH_SERVICE_URL", "http://auth-service:8000")
+
+
+class TokenVerificationError(Exception):
+    """Raised when a token is malformed, expired, revoked or unknown."""
+
+
+def token_fingerprint(token: str) -> str:
+    """Stable identifier used to share revoked tokens without the token itself."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def revocation_key(token: str, claims: dict) -> str:
+    """Same key auth-service uses when it revokes a token."""
+    return claims.get("jti") or token_fingerprint(token)
+
+
+class RevocationSet:
+    """
+    Read-only replica of the revoked token keys held by auth-service.
+
+    The snapshot is refreshed lazily, at most once every ``refresh_interval``
+    seconds. If auth-service is unreachable the last snapshot is kept.
+    """
+
+    def __init__(self, auth_service_url: str = AUTH_SERVICE_URL, refresh_interval: float = 5.0, timeout: float = 2.0):
+        self.auth_service_url = auth_service_url
+        self.refresh_interval = refresh_interval
+        self.timeout = timeout
+        self._keys: frozenset[str] = frozenset()
+        self._last_refresh = float("-inf")
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        response = requests.get(f"{self.auth_service_url}/revoked-tokens", timeout=self.timeout)
+        response.raise_for_status()
+        self._keys = frozenset(response.json().get("revoked", []))
+
+    def _refresh_if_stale(self):
+        if time.monotonic() - self._last_refresh < self.refresh_interval:
+            return
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if time.monotonic() - self._last_refresh < self.refresh_interval:
+                return
+            self._last_refresh = time.monotonic()
+            try:
+                self.refresh()
+            except (requests.RequestException, ValueError) as e:
+                print(f"[TokenVerifier] Failed to refresh revoked tokens: {e}")
+
+    def __contains__(self, key: str) -> bool:
+        self._refresh_if_stale()
+        return key in self._keys
+
+
+class TokenVerifier:
+    """
+    Verifies access tokens locally and returns the same principal as
+    auth-service ``/validate-token``: ``{"email": ..., "id": ...}``.
+
+    ``verify`` is synchronous and may block on auth-service (revocation
+    refresh, remote fallback), so call it from a plain ``def`` dependency,
+    which FastAPI runs in its threadpool, never from ``async def``.
+
+    Args:
+        secret_key: HS256 signing key shared with auth-service
+        algorithm: JWT algorithm
+        auth_service_url: Base URL used for revocations and the remote fallback
+        revocations: Revoked token keys, defaults to a ``RevocationSet``
+        cache_size: Maximum number of verified tokens kept in memory
+        timeout: Timeout in seconds for the remote fallback
+    """
+
+    def __init__(
+        self,
+        secret_key: str = JWT_SECRET_KEY,
+        algorithm: str = JWT_ALGORITHM,
+        auth_service_url: str = AUTH_SERVICE_URL,
+        revocations=None,
+        cache_size: int = 10_000,
+        timeout: float = 5.0,
+    ):
+        self.secret_key = secret_key
+        self.algorithm = algorithm
+        self.auth_service_url = auth_service_url
+        self.revocations = revocations if revocations is not None else RevocationSet(auth_service_url)
+        self.cache_size = cache_size
+        self.timeout = timeout
+        # fingerprint -> (principal, revocation key, exp)
+        self._principals: OrderedDict[str, tuple[dict, str, float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def verify(self, token: str) -> dict:
+        if token.startswith("Bearer "):
+            token = token[len("Bearer "):]
+
+        fingerprint = token_fingerprint(token)
+        cached = self._cached(fingerprint)
+        if cached is not None:
+            principal, key = cached
+            if key in self.revocations:
+                raise TokenVerificationError("Token has been revoked")
+            return principal
+
+        try:
+            claims = jwt.decode(token, self.secret_key, algorithms=[self.algorithm])
+        except JWTError as e:
+            raise TokenVerificationError("Invalid token") from e
+
+        key = revocation_key(token, claims)
+        if key in self.revocations:
+            raise TokenVerificationError("Token has been revoked")
+
+        email = claims.get("sub")
+        if email is None:
+            raise TokenVerificationError("Token has no subject")
+
+        user_id = claims.get("user_id")
+        if user_id is None:
+            # Tokens minted before user_id was added to the claims
+            principal = self._validate_remotely(token)
+        else:
+            principal = {"email": email, "id": user_id}
+
+        self._remember(fingerprint, principal, key, claims.get("exp"))
+        return principal
+
+    def _validate_remotely(self, token: str) -> dict:
+        try:
+            response = requests.post(
+                f"{self.auth_service_url}/validate-token", json={"token": token}, timeout=self.timeout
+            )
+        except requests.RequestException as e:
+            raise TokenVerificationError(f"Auth service unavailable: {e}") from e
+        if response.status_code != 200:
+            raise TokenVerificationError("Invalid token")
+        return response.json()
+
+    def _cached(self, fingerprint: str) -> tuple[dict, str] | None:
+        with self._lock:
+            entry = self._principals.get(fingerprint)
+            if entry is None:
+                return None
+            principal, key, expires_at = entry
+            if expires_at <= time.time():
+                del self._principals[fingerprint]
+                return None
+            self._principals.move_to_end(fingerprint)
+            return principal, key
+
+    def _remember(self, fingerprint: str, principal: dict, key: str, expires_at):
+        if expires_at is None:
+            return
+        with self._lock:
+            self._principals[fingerprint] = (principal, key, float(expires_at))
+            self._principals.move_to_end(fingerprint)
+            while len(self._principals) > self.cache_size:
+                self._principals.popitem(last=False)
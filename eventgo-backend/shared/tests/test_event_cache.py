@@ -0,0 +1,103 @@
+import asyncio
+import os
+import sys
+import time
+
+import pytest
+
+# Add the parent directory to the path so we can import eventgo_shared
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventgo_shared.event_cache import EventCache
+
+EVENT = {"title": "Gig", "date": "2025-06-01T20:00:00Z", "venue": "Hall"}
+
+
+class Upstream:
+    def __init__(self, delay=0.01):
+        self.delay = delay
+        self.calls = []
+        self.fail = False
+
+    async def load(self, event_id):
+        self.calls.append(event_id)
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("events api down")
+        return dict(EVENT, id=event_id, version=len(self.calls))
+
+
+def test_concurrent_misses_share_one_request():
+    """A burst of notifications for one event loads it once."""
+    upstream = Upstream()
+    cache = EventCache(upstream.load)
+
+    async def burst():
+        return await asyncio.gather(*(cache.get(7) for _ in range(500)))
+
+    events = asyncio.run(burst())
+
+    assert upstream.calls == ["7"]
+    assert all(event is events[0] for event in events)
+    assert cache.snapshot()["loads"] == 1
+
+
+def test_fresh_entry_is_served_from_memory():
+    upstream = Upstream(delay=0)
+    cache = EventCache(upstream.load, ttl=60)
+
+    asyncio.run(cache.get(7))
+    asyncio.run(cache.get("7"))
+
+    assert upstream.calls == ["7"]
+    assert cache.snapshot()["hits"] == 1
+
+
+def test_stale_entry_is_returned_while_refreshing():
+    upstream = Upstream(delay=0)
+    cache = EventCache(upstream.load, ttl=0.05, stale_ttl=60)
+
+    async def stale_then_fresh():
+        await cache.get(7)
+        await asyncio.sleep(0.06)
+        stale = await cache.get(7)
+        await asyncio.sleep(0.01)  # Let the background refresh finish
+        return stale, await cache.get(7)
+
+    stale, fresh = asyncio.run(stale_then_fresh())
+
+    assert stale["version"] == 1
+    assert fresh["version"] == 2
+    assert cache.snapshot()["stale_hits"] == 1
+
+
+def test_failed_refresh_keeps_stale_entry():
+    upstream = Upstream(delay=0)
+    cache = EventCache(upstream.load, ttl=0.05, stale_ttl=0.2)
+    asyncio.run(cache.get(7))
+
+    upstream.fail = True
+
+    async def stale():
+        await asyncio.sleep(0.06)
+        event = await cache.get(7)
+        await asyncio.sleep(0.01)
+        return event
+
+    assert asyncio.run(stale())["version"] == 1
+    assert cache.snapshot()["errors"] == 1
+
+    time.sleep(0.2)
+    with pytest.raises(ConnectionError):
+        asyncio.run(cache.get(7))
+
+
+def test_least_recently_used_event_is_dropped():
+    upstream = Upstream(delay=0)
+    cache = EventCache(upstream.load, max_entries=2)
+
+    for event_id in (1, 2, 1, 3):
+        asyncio.run(cache.get(event_id))
+    asyncio.run(cache.get(2))
+
+    assert upstream.calls == ["1", "2", "3", "2"]
@@ -0,0 +1,57 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+# Add the parent directory to the path so we can import eventgo_shared
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventgo_shared.refunds import refund_in_batches
+
+
+class StripeService:
+    def __init__(self, fail_batch=None):
+        self.batches = []
+        self.fail_batch = fail_batch
+
+    def handle(self, request: httpx.Request) -> httpx.Response:
+        refunds = json.loads(request.content)["refunds"]
+        self.batches.append([refund["payment_intent_id"] for refund in refunds])
+        if len(self.batches) == self.fail_batch:
+            return httpx.Response(503)
+        # Answered last to first, like refunds finishing out of order
+        lines = [
+            json.dumps({"index": index, "payment_intent_id": refund["payment_intent_id"],
+                        "idempotency_key": refund.get("idempotency_key"), "refund": {"status": "succeeded"}, "error": None})
+            for index, refund in reversed(list(enumerate(refunds)))
+        ]
+        return httpx.Response(200, text="\n".join(lines) + "\n", headers={"content-type": "application/x-ndjson"})
+
+
+async def collect(service, refunds, batch_size):
+    async with httpx.AsyncClient(transport=httpx.MockTransport(service.handle)) as client:
+        return [result async for result in refund_in_batches(client, "http://stripe-service", refunds, batch_size)]
+
+
+def test_refunds_are_sent_in_batches():
+    service = StripeService()
+    refunds = [{"payment_intent_id": f"pi_{i}", "idempotency_key": f"k{i}"} for i in range(5)]
+
+    results = asyncio.run(collect(service, refunds, batch_size=2))
+
+    assert service.batches == [["pi_0", "pi_1"], ["pi_2", "pi_3"], ["pi_4"]]
+    # Indexes point into the full list
+    assert {result["index"]: result["payment_intent_id"] for result in results} == {i: f"pi_{i}" for i in range(5)}
+
+
+def test_failed_batch_reports_each_refund():
+    service = StripeService(fail_batch=2)
+    refunds = [{"payment_intent_id": f"pi_{i}"} for i in range(4)]
+
+    results = asyncio.run(collect(service, refunds, batch_size=2))
+
+    errors = {result["index"]: result["error"] for result in results}
+    assert errors[0] is None and errors[1] is None
+    assert "503" in errors[2] and "503" in errors[3]
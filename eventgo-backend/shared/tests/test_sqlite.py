@@ -0,0 +1,43 @@
+import os
+import sys
+
+# Add the parent directory to the path so we can import eventgo_shared
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventgo_shared.sqlite import SQLiteStore
+
+
+class Notes(SQLiteStore):
+    schema = ("CREATE TABLE IF NOT EXISTS notes (body TEXT NOT NULL)",)
+
+
+class Tags(SQLiteStore):
+    schema = ("CREATE TABLE IF NOT EXISTS tags (name TEXT PRIMARY KEY)",)
+
+
+def test_stores_on_one_file_share_a_connection_and_lock(tmp_path):
+    notes, tags = Notes(str(tmp_path / "app.db")), Tags(str(tmp_path / "app.db"))
+
+    assert notes.conn is tags.conn
+    assert notes.db_lock is tags.db_lock
+    assert notes.conn.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    tables = {row[0] for row in notes.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+    assert tables == {"notes", "tags"}
+
+    notes.close()
+    tags.close()
+
+
+def test_connection_closes_with_the_last_store(tmp_path):
+    notes, tags = Notes(str(tmp_path / "app.db")), Tags(str(tmp_path / "app.db"))
+    conn = notes.conn
+    tags.conn.execute("INSERT INTO tags (name) VALUES ('gig')")
+
+    notes.close()
+    assert conn.execute("SELECT name FROM tags").fetchall() == [("gig",)]  # Still open for tags
+
+    tags.close()
+    reopened = Tags(str(tmp_path / "app.db"))
+    assert reopened.conn is not conn
+    assert reopened.conn.execute("SELECT name FROM tags").fetchall() == [("gig",)]
+    reopened.close()
@@ -0,0 +1,62 @@
+import os
+import sys
+
+import pytest
+
+# Add the parent directory to the path so we can import eventgo_shared
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventgo_shared.templates import NotificationTemplate, event_fields, format_event_date
+
+EVENT = {"title": "Gig", "date": "2025-06-01T20:00:00Z", "venue": "Hall"}
+
+CANCELLED = NotificationTemplate(
+    subject="Important Notice: The Event '{title}' Has Been Canceled",
+    message=(
+        "Hello {full_name},\n\n"
+        "'{title}' scheduled for {date} at {venue} has been canceled. "
+        "Total refunded amount: ${amount:.2f}. {{Braces}} stay as written."
+    ),
+)
+
+
+def test_renders_like_str_format():
+    template = "Hi {name!r}, you owe ${amount:.2f} for “{title}”\\n{{x}}"
+    fields = {"name": "Ann", "amount": 2.5, "title": "Gig"}
+
+    assert NotificationTemplate(template, template).render(**fields) == (template.format(**fields),) * 2
+
+
+def test_unused_fields_are_ignored_and_missing_fields_raise():
+    greeting = NotificationTemplate("Hi", "Hello {full_name}")
+
+    assert greeting.render(full_name="Ann", email="ann@example.com") == ("Hi", "Hello Ann")
+    with pytest.raises(TypeError):
+        greeting.render(email="ann@example.com")
+
+
+@pytest.mark.parametrize("template", ["{user[name]}", "{user.name}", "{0}", "{class}", "{amount:{width}}"])
+def test_only_plain_field_names_are_allowed(template):
+    with pytest.raises(ValueError):
+        NotificationTemplate("Hi", template)
+
+
+def test_event_date_is_formatted_once():
+    format_event_date.cache_clear()
+    for _ in range(3):
+        assert event_fields(EVENT)["date"] == "June 01, 2025 at 08:00 PM"
+
+    assert format_event_date.cache_info().misses == 1
+
+
+def test_render_batch_shares_event_fields():
+    recipients = [{"full_name": "Ann", "amount": 10}, {"full_name": "Bob", "amount": 12.5}]
+
+    rendered = CANCELLED.render_batch(EVENT, recipients)
+
+    assert rendered[0] == CANCELLED.render(full_name="Ann", amount=10, **event_fields(EVENT))
+    assert rendered[1][0] == "Important Notice: The Event 'Gig' Has Been Canceled"
+    assert rendered[1][1] == (
+        "Hello Bob,\n\n'Gig' scheduled for June 01, 2025 at 08:00 PM at Hall has been canceled. "
+        "Total refunded amount: $12.50. {Braces} stay as written."
+    )
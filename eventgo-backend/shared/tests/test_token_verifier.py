@@ -0,0 +1,92 @@
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+import os
+import sys
+
+import pytest
+import requests
+from jose import jwt
+
+# Add the parent directory to the path so we can import eventgo_shared
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from eventgo_shared.token_verifier import (
+    RevocationSet,
+    TokenVerifier,
+    TokenVerificationError,
+    token_fingerprint,
+)
+
+SECRET_KEY = "test_secret"
+
+
+def make_token(minutes=60, secret=SECRET_KEY, **claims):
+    to_encode = {"sub": "alice@example.com", "role": "user", "user_id": 7}
+    to_encode.update(claims)
+    to_encode["exp"] = datetime.utcnow() + timedelta(minutes=minutes)
+    return jwt.encode({k: v for k, v in to_encode.items() if v is not None}, secret, algorithm="HS256")
+
+
+def make_verifier(revoked=()):
+    return TokenVerifier(secret_key=SECRET_KEY, auth_service_url="http://auth", revocations=set(revoked))
+
+
+@patch("requests.post")
+def test_verify_locally(mock_post):
+    """A valid token is verified without calling auth-service."""
+    principal = make_verifier().verify(make_token())
+
+    assert principal == {"email": "alice@example.com", "id": 7}
+    mock_post.assert_not_called()
+
+
+def test_verify_strips_bearer_prefix():
+    assert make_verifier().verify("Bearer " + make_token())["id"] == 7
+
+
+@pytest.mark.parametrize("token", [make_token(minutes=-1), make_token(secret="other"), "not-a-jwt"])
+def test_verify_rejects_invalid_tokens(token):
+    with pytest.raises(TokenVerificationError):
+        make_verifier().verify(token)
+
+
+def test_verify_rejects_revoked_token():
+    token = make_token()
+    verifier = make_verifier(revoked={token_fingerprint(token)})
+
+    with pytest.raises(TokenVerificationError):
+        verifier.verify(token)
+
+
+def test_verify_rejects_token_revoked_after_caching():
+    """Revocations are keyed by jti and still apply to already cached tokens."""
+    token = make_token(jti="abc123")
+    revoked = set()
+    verifier = TokenVerifier(secret_key=SECRET_KEY, auth_service_url="http://auth", revocations=revoked)
+    verifier.verify(token)
+
+    revoked.add("abc123")
+    with pytest.raises(TokenVerificationError):
+        verifier.verify(token)
+
+
+@patch("requests.post")
+def test_fallback_only_on_cache_miss(mock_post):
+    """Tokens without user_id are validated remotely once, then served from cache."""
+    mock_post.return_value = MagicMock(status_code=200, json=lambda: {"email": "alice@example.com", "id": 7})
+    verifier = make_verifier()
+    token = make_token(user_id=None)
+
+    assert verifier.verify(token) == {"email": "alice@example.com", "id": 7}
+    assert verifier.verify(token) == {"email": "alice@example.com", "id": 7}
+    mock_post.assert_called_once()
+
+
+@patch("requests.get")
+def test_revocation_set_keeps_snapshot_when_auth_is_down(mock_get):
+    mock_get.return_value = MagicMock(json=lambda: {"revoked": ["abc"]})
+    revocations = RevocationSet("http://auth", refresh_interval=0)
+    assert "abc" in revocations
+
+    mock_get.side_effect = requests.ConnectionError("down")
+    assert "abc" in revocations
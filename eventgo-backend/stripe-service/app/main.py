@@ -1,8 +1,10 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 import stripe
 import os
 from . import schemas
+import asyncio
 import uuid
 import time
 import json
@@ -11,6 +13,10 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+from .price_cache import price_cache
+from .refund_batch import REFUND_BATCH_MAX_SIZE, run_refund_batch
+from .stripe_gateway import stripe_gateway
+
 app = FastAPI(title="Stripe Service")
 
 app.add_middleware(
@@ -22,6 +28,7 @@ app.add_middleware(
 )
 
 stripe.api_key = os.environ.get("STRIPE_SECRET_KEY")
+SPLIT_PAYMENT_CONCURRENCY = int(os.getenv("SPLIT_PAYMENT_CONCURRENCY", 8))  # Participants' links created at once
 
 # Global dictionary to store split payment records
 # In production, use a database instead
@@ -33,7 +40,8 @@ async def create_payment_intent(payment: schemas.PaymentIntent):
     Create a new PaymentIntent for the given amount, with seats and event upon checkout click.
     """
     try:
-        intent = stripe.PaymentIntent.create(
+        intent = await stripe_gateway.call(
+            "PaymentIntent.create",
             amount=payment.amount,
             currency=payment.currency,
             metadata={
@@ -52,7 +60,7 @@ async def get_payment_status(payment_intent_id: str):
     Get the status for a given PaymentIntent ID.
     """
     try:
-        payment = stripe.PaymentIntent.retrieve(payment_intent_id)
+        payment = await stripe_gateway.call("PaymentIntent.retrieve", id=payment_intent_id)
         return {
             "status": payment.status,
             "amount": payment.amount,
@@ -66,7 +74,7 @@ async def get_payment_status(payment_intent_id: str):
 async def validate_payment(payment: schemas.PaymentValidationRequest):
     try:
         # Retrieve the payment intent to verify its status
-        payment_intent = stripe.PaymentIntent.retrieve(payment.payment_intent_id)
+        payment_intent = await stripe_gateway.call("PaymentIntent.retrieve", id=payment.payment_intent_id)
         
         # Check if payment was successful
         if payment_intent.status != "succeeded":
@@ -109,19 +117,50 @@ async def confirm_booking(payment: schemas.PaymentValidationRequest):
 async def refund_booking(payment: schemas.RefundRequest):
     """Refund a payment intent. Payment intent must have a valid payment method to refund to."""
     try:
-        refund = stripe.Refund.create(
+        refund = await stripe_gateway.call(
+            "Refund.create",
             payment_intent=payment.payment_intent_id,
             amount=payment.amount,
-            reason=payment.reason
+            reason=payment.reason,
+            idempotency_key=payment.idempotency_key
         )
         return refund
     except stripe.error.StripeError as e:
         raise HTTPException(status_code=400, detail=str(e))
 
+@app.post("/refunds/batch")
+async def refund_batch(request: schemas.BatchRefundRequest):
+    """
+    Refund up to REFUND_BATCH_MAX_SIZE payment intents in one call. Streams one
+    BatchRefundResult per line (NDJSON) as each refund finishes, ``index`` maps
+    it back to the request. A failed refund has ``error`` set and can be sent
+    again with its ``idempotency_key``.
+    """
+    if len(request.refunds) > REFUND_BATCH_MAX_SIZE:
+        raise HTTPException(status_code=400, detail=f"At most {REFUND_BATCH_MAX_SIZE} refunds per batch")
+    return StreamingResponse(
+        (result.model_dump_json() + "\n" async for result in run_refund_batch(request.refunds)),
+        media_type="application/x-ndjson",
+    )
+
 @app.get("/health", response_model=schemas.HealthResponse)
 def get_health():
     return {"status": "healthy", "stripe_configured": bool(stripe.api_key)}
 
+@app.get("/metrics")
+def get_metrics():
+    """Stripe calls in flight, retried, timed out and failed, rate limiter queue waits and price cache hits."""
+    return {
+        "stripe": stripe_gateway.snapshot(),
+        "rate_limit": stripe_gateway.limiter.snapshot(),
+        "prices": price_cache.snapshot(),
+    }
+
+@app.on_event("shutdown")
+def close_stripe_gateway():
+    stripe_gateway.close()
+    price_cache.close()
+
 async def generate_payment_link(
     amount: int,
     currency: str,
@@ -150,24 +189,39 @@ async def generate_payment_link(
         expiration = int(time.time()) + 10 * 60 # 10 mins from now
         
     try:
-        # Create a one-time price
-        price = stripe.Price.create(
-            unit_amount=amount,
-            currency=currency,
-            product_data={
-                'name': name,
-            }
-        )
-        
-        # Create a payment link that references the price
-        payment_link = stripe.PaymentLink.create(
-            line_items=[{
-                'price': price.id,
-                'quantity': 1
-            }],
-            after_completion={'type': 'redirect', 'redirect': {'url': redirect_url}},
-            metadata=metadata or {}
-        )
+        async def create_price() -> str:
+            price = await stripe_gateway.call(
+                "Price.create",
+                unit_amount=amount,
+                currency=currency,
+                product_data={
+                    'name': name,
+                }
+            )
+            return price.id
+
+        async def create_link(price_id: str):
+            return await stripe_gateway.call(
+                "PaymentLink.create",
+                line_items=[{
+                    'price': price_id,
+                    'quantity': 1
+                }],
+                after_completion={'type': 'redirect', 'redirect': {'url': redirect_url}},
+                metadata=metadata or {}
+            )
+
+        # Reuse the price of an earlier link with the same amount, currency and name
+        price_id, cached = await price_cache.get_or_create(amount, currency, name, create_price)
+        try:
+            payment_link = await create_link(price_id)
+        except stripe.error.InvalidRequestError:
+            if not cached:
+                raise
+            # The cached price was archived or deleted on Stripe, make a new one
+            await asyncio.to_thread(price_cache.invalidate, amount, currency, name)
+            price_id, _ = await price_cache.get_or_create(amount, currency, name, create_price)
+            payment_link = await create_link(price_id)
         
         # Return payment link details
         return {
@@ -212,15 +266,19 @@ async def create_payment_link(request: schemas.CreatePaymentLinkRequest):
 @app.post("/create-split-payment", response_model=schemas.SplitPaymentResponse)
 async def create_split_payment(request: schemas.CreateSplitPaymentRequest):
     """
-    Create payment links for multiple participants in a split payment scenario
+    Create payment links for multiple participants in a split payment scenario.
+    Links are created concurrently, up to SPLIT_PAYMENT_CONCURRENCY at a time,
+    and participants whose link failed are tried once more. The party pays
+    all or nothing, so if any link still fails the links already created are
+    deactivated and the request fails.
     """
     try:
         # Generate a unique ID for this split payment
         split_payment_id = str(uuid.uuid4())
         total_amount = sum(participant.amount for participant in request.participants)
-        payment_links = []
-        
-        for participant in request.participants:
+        semaphore = asyncio.Semaphore(SPLIT_PAYMENT_CONCURRENCY)
+
+        async def create_participant_link(participant: schemas.SplitPaymentParticipant) -> dict:
             # Create metadata for this participant's payment
             metadata = {
                 "split_payment_id": split_payment_id,
@@ -231,25 +289,48 @@ async def create_split_payment(request: schemas.CreateSplitPaymentRequest):
                 "user_id": participant.user_id,
                 "description": f"Your ticket is {participant.ticket_id}"
             }
-            
+
             # Generate payment link using the reusable function
-            payment_link = await generate_payment_link(
-                amount=participant.amount,
-                currency=request.currency,
-                name=f"Split payment for {request.description} - {participant.email}",
-                email=participant.email,
-                redirect_url=participant.redirect_url,
-                metadata=metadata
-            )
-            
+            async with semaphore:
+                payment_link = await generate_payment_link(
+                    amount=participant.amount,
+                    currency=request.currency,
+                    name=f"Split payment for {request.description}",
+                    email=participant.email,
+                    redirect_url=participant.redirect_url,
+                    metadata=metadata
+                )
+
             # Ensure we have participant_email in the result
             payment_link["participant_email"] = participant.email
             payment_link["user_id"] = participant.user_id
             payment_link["ticket_id"] = participant.ticket_id
-            
+            return payment_link
+
+        async def create_links(participants: list[schemas.SplitPaymentParticipant]) -> list:
+            return await asyncio.gather(
+                *(create_participant_link(participant) for participant in participants), return_exceptions=True
+            )
+
+        links = await create_links(request.participants)
+        retry = [index for index, link in enumerate(links) if isinstance(link, Exception)]
+        if retry:
+            print(f"Retrying payment links for tickets {[request.participants[index].ticket_id for index in retry]}")
+            for index, link in zip(retry, await create_links([request.participants[index] for index in retry])):
+                links[index] = link
+
+        payment_links = [link for link in links if not isinstance(link, Exception)]
+        failed = [
+            (participant.ticket_id, link) for participant, link in zip(request.participants, links) if isinstance(link, Exception)
+        ]
+        if failed:
+            # Nobody is sent a link, so none of the created ones may take a payment
+            await asyncio.gather(*(
+                stripe_gateway.call("PaymentLink.modify", sid=link["payment_link_id"], active=False) for link in payment_links
+            ), return_exceptions=True)
+            ticket_ids = [ticket_id for ticket_id, _ in failed]
+            raise HTTPException(status_code=400, detail=f"Payment links failed for tickets {ticket_ids}: {failed[0][1]}")
 
-            payment_links.append(payment_link)
-        
         # # Store the split payment info (in production, use a database)
         # split_payments[split_payment_id] = {
         #     "event_id": request.event_id,
@@ -258,14 +339,16 @@ async def create_split_payment(request: schemas.CreateSplitPaymentRequest):
         #     "payment_links": payment_links,
         #     "created_at": int(time.time())
         # }
-        
+
         return {
-            "split_payment_id": split_payment_id, 
+            "split_payment_id": split_payment_id,
             "payment_links": payment_links,
             "total_amount": total_amount,
             "event_id": request.event_id,
         }
-        
+
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
 
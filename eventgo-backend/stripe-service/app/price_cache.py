@@ -0,0 +1,133 @@
+"""
+Stripe Price ids reused across payment links.
+
+Every seat in a tier of the same event has the same amount, currency and
+product name, so instead of creating a new one-off Price (and Product) for
+every link, the first Price created for that combination is remembered and
+reused. Ids are kept in a local SQLite file, so they survive restarts, and
+the PRICE_CACHE_SIZE most recently used ones also in memory. Only a memory
+hit is answered on the event loop, SQLite reads and writes run in a worker
+thread. Concurrent links for the same combination wait for one Price.create
+instead of racing to create several.
+"""
+from collections import OrderedDict
+import asyncio
+import os
+import threading
+import time
+from typing import Awaitable, Callable
+
+from eventgo_shared.sqlite import SQLiteStore
+
+PRICE_CACHE_DB_PATH = os.getenv("PRICE_CACHE_DB_PATH", "data/stripe_service.db")
+PRICE_CACHE_SIZE = int(os.getenv("PRICE_CACHE_SIZE", 10_000))  # Price ids kept in memory
+
+PriceKey = tuple[int, str, str]  # (unit amount, currency, product name)
+
+
+class PriceCache(SQLiteStore):
+    schema = (
+        "CREATE TABLE IF NOT EXISTS prices ("
+        " unit_amount INTEGER NOT NULL,"
+        " currency TEXT NOT NULL,"
+        " product TEXT NOT NULL,"
+        " price_id TEXT NOT NULL,"
+        " created_at REAL NOT NULL,"
+        " PRIMARY KEY (unit_amount, currency, product))",
+    )
+
+    def __init__(self, path: str = PRICE_CACHE_DB_PATH, size: int = PRICE_CACHE_SIZE):
+        super().__init__(path)
+        self.size = size
+        self.hits = 0
+        self.misses = 0
+        self._prices: OrderedDict[PriceKey, str] = OrderedDict()  # Least recently used first
+        self._creating: dict[PriceKey, asyncio.Task] = {}
+        self._lock = threading.Lock()  # Guards the in-memory ids
+
+    def _remember(self, key: PriceKey, price_id: str):
+        with self._lock:
+            self._prices[key] = price_id
+            self._prices.move_to_end(key)
+            while len(self._prices) > self.size:
+                self._prices.popitem(last=False)
+
+    def cached(self, key: PriceKey) -> str | None:
+        """In-memory lookup only, safe on the event loop."""
+        with self._lock:
+            price_id = self._prices.get(key)
+            if price_id is not None:
+                self._prices.move_to_end(key)
+            return price_id
+
+    def get(self, amount: int, currency: str, product: str) -> str | None:
+        """Memory, then SQLite. Blocks on a miss, call it from a worker thread."""
+        key = (amount, currency.lower(), product)
+        price_id = self.cached(key)
+        if price_id is None:
+            with self.db_lock:
+                row = self.conn.execute(
+                    "SELECT price_id FROM prices WHERE unit_amount = ? AND currency = ? AND product = ?", key
+                ).fetchone()
+            if row is not None:
+                price_id = row[0]
+                self._remember(key, price_id)
+        return price_id
+
+    def put(self, amount: int, currency: str, product: str, price_id: str):
+        key = (amount, currency.lower(), product)
+        self._remember(key, price_id)
+        with self.db_lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO prices (unit_amount, currency, product, price_id, created_at) VALUES (?, ?, ?, ?, ?)",
+                (*key, price_id, time.time()),
+            )
+
+    def invalidate(self, amount: int, currency: str, product: str):
+        """Forget a price Stripe no longer accepts (archived or deleted)."""
+        key = (amount, currency.lower(), product)
+        with self._lock:
+            self._prices.pop(key, None)
+        with self.db_lock:
+            self.conn.execute(
+                "DELETE FROM prices WHERE unit_amount = ? AND currency = ? AND product = ?", key
+            )
+
+    async def get_or_create(
+        self, amount: int, currency: str, product: str, create: Callable[[], Awaitable[str]]
+    ) -> tuple[str, bool]:
+        """
+        Price id for the combination, calling ``create`` only if none is known.
+        Returns (price id, whether it came from the cache).
+        """
+        key = (amount, currency.lower(), product)
+        price_id = self.cached(key)
+        if price_id is None and key not in self._creating:
+            price_id = await asyncio.to_thread(self.get, *key)
+        if price_id is not None:
+            self.hits += 1
+            return price_id, True
+
+        task = self._creating.get(key)
+        if task is not None and task.get_loop() is asyncio.get_running_loop():
+            # Another link is already creating this price, share it
+            self.hits += 1
+            return await asyncio.shield(task), True
+        self.misses += 1
+        task = self._creating[key] = asyncio.ensure_future(self._create(key, create))
+        return await asyncio.shield(task), False
+
+    async def _create(self, key: PriceKey, create: Callable[[], Awaitable[str]]) -> str:
+        try:
+            price_id = await create()
+            await asyncio.to_thread(self.put, *key, price_id)
+            return price_id
+        finally:
+            if self._creating.get(key) is asyncio.current_task():
+                del self._creating[key]
+
+    def snapshot(self) -> dict:
+        return {"size": len(self._prices), "hits": self.hits, "misses": self.misses}
+
+
+price_cache = PriceCache()
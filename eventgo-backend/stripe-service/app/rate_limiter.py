@@ -0,0 +1,137 @@
+"""
+Client-side rate limit for Stripe API calls.
+
+Stripe rejects requests beyond its per-second limit (100/s live, 25/s in
+test mode) with a 429. Every call the gateway makes, retries included, first
+takes a token from one bucket shared by all endpoints. The bucket holds up to
+STRIPE_RATE_BURST tokens and refills at STRIPE_RATE_LIMIT per second. When it
+is empty, callers queue instead of failing. Queued calls are served by
+priority class, checkout first, then refunds, then payment link generation,
+so a mass cancellation or a ticket drop can't starve people paying at the
+checkout. When Stripe still answers 429, the bucket is drained for
+STRIPE_RATE_LIMIT_PAUSE seconds so every caller backs off together.
+
+The bucket is per process, with several workers split STRIPE_RATE_LIMIT
+between them.
+"""
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from typing import Awaitable, Callable
+
+STRIPE_RATE_LIMIT = float(os.getenv("STRIPE_RATE_LIMIT", 80))  # Requests per second
+STRIPE_RATE_BURST = int(os.getenv("STRIPE_RATE_BURST", 20))
+STRIPE_RATE_LIMIT_PAUSE = float(os.getenv("STRIPE_RATE_LIMIT_PAUSE", 1))  # Seconds, after a 429
+
+# Served in this order when calls are queued
+PRIORITIES = ("checkout", "refunds", "links")
+
+OPERATION_PRIORITIES = {
+    "PaymentIntent.create": "checkout",
+    "PaymentIntent.retrieve": "checkout",
+    "Refund.create": "refunds",
+    "Price.create": "links",
+    "PaymentLink.create": "links",
+}
+
+
+class TokenBucket:
+    """
+    Args:
+        rate: Tokens added per second
+        burst: Most tokens the bucket holds
+        pause: Seconds without tokens after ``throttle``
+        clock: Current time in seconds, ``sleep`` waits on the same clock
+    """
+
+    def __init__(
+        self,
+        rate: float = STRIPE_RATE_LIMIT,
+        burst: int = STRIPE_RATE_BURST,
+        pause: float = STRIPE_RATE_LIMIT_PAUSE,
+        clock: Callable[[], float] = time.monotonic,
+        sleep: Callable[[float], Awaitable] = asyncio.sleep,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.pause = pause
+        self.clock = clock
+        self.sleep = sleep
+        self.tokens = float(burst)
+        self.updated = clock()
+        self.throttled = 0
+        self.waits = {priority: {"count": 0, "total": 0.0, "max": 0.0} for priority in PRIORITIES}
+        self._queue: list[tuple[int, int, asyncio.Future]] = []  # (priority rank, arrival, waiter)
+        self._arrivals = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, priority: str = "links"):
+        """Wait for a token, behind every queued call of the same or a higher priority."""
+        started = self.clock()
+        self._refill()
+        if not self._queue and self.tokens >= 1:
+            self.tokens -= 1
+        else:
+            loop = asyncio.get_running_loop()
+            waiter = loop.create_future()
+            heapq.heappush(self._queue, (PRIORITIES.index(priority), next(self._arrivals), waiter))
+            if self._dispatcher is None or self._dispatcher.done() or self._dispatcher.get_loop() is not loop:
+                self._dispatcher = loop.create_task(self._dispatch())
+            # A cancelled waiter stays in the queue and is skipped by the dispatcher
+            await waiter
+        self._record(priority, self.clock() - started)
+
+    async def _dispatch(self):
+        """Hand tokens to queued calls in priority order as the bucket refills."""
+        while self._queue:
+            self._refill()
+            if self.tokens < 1:
+                await self.sleep((1 - self.tokens) / self.rate)
+                continue
+            _, _, waiter = heapq.heappop(self._queue)
+            if not waiter.done():
+                self.tokens -= 1
+                waiter.set_result(None)
+
+    def throttle(self):
+        """Stripe answered 429, hand out no tokens for ``pause`` seconds."""
+        self._refill()
+        self.tokens = min(self.tokens, 1 - self.pause * self.rate)
+        self.throttled += 1
+
+    def _record(self, priority: str, waited: float):
+        waits = self.waits[priority]
+        waits["count"] += 1
+        waits["total"] += waited
+        waits["max"] = max(waits["max"], waited)
+
+    def snapshot(self) -> dict:
+        self._refill()
+        queued = {priority: 0 for priority in PRIORITIES}
+        for rank, _, waiter in self._queue:
+            if not waiter.done():
+                queued[PRIORITIES[rank]] += 1
+        return {
+            "rate": self.rate,
+            "tokens": round(max(self.tokens, 0.0), 2),
+            "throttled": self.throttled,
+            "queues": {
+                priority: {
+                    "queued": queued[priority],
+                    "acquired": waits["count"],
+                    "avg_wait_ms": round(1000 * waits["total"] / waits["count"], 2) if waits["count"] else 0.0,
+                    "max_wait_ms": round(1000 * waits["max"], 2),
+                }
+                for priority, waits in self.waits.items()
+            },
+        }
+
+
+stripe_rate_limiter = TokenBucket()
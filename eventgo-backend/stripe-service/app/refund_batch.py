@@ -0,0 +1,116 @@
+"""
+Many refunds in one request.
+
+Cancelling an event means one refund per payment intent, possibly tens of
+thousands. A batch runs its refunds through the Stripe gateway
+REFUND_BATCH_CONCURRENCY at a time and yields each result as soon as it is
+known, so the caller can stream them back instead of waiting for the slowest.
+
+When Stripe keeps answering 429 after the gateway's own retries, the whole
+batch pauses (doubling up to REFUND_BATCH_MAX_PAUSE seconds) before any of
+its refunds calls Stripe again, rather than every refund hammering the limit
+on its own. A rate-limited refund is retried REFUND_BATCH_RATE_LIMIT_RETRIES
+times with the same idempotency key before it is reported as failed.
+"""
+import asyncio
+import os
+import uuid
+from typing import AsyncIterator
+
+import stripe
+
+from . import schemas
+from .stripe_gateway import StripeGateway, stripe_gateway
+
+REFUND_BATCH_MAX_SIZE = int(os.getenv("REFUND_BATCH_MAX_SIZE", 1000))  # Refunds per request
+REFUND_BATCH_CONCURRENCY = int(os.getenv("REFUND_BATCH_CONCURRENCY", 8))  # Refunds in flight per batch
+REFUND_BATCH_RATE_LIMIT_RETRIES = int(os.getenv("REFUND_BATCH_RATE_LIMIT_RETRIES", 5))
+REFUND_BATCH_PAUSE = float(os.getenv("REFUND_BATCH_PAUSE", 1))  # Seconds, first pause after a 429
+REFUND_BATCH_MAX_PAUSE = float(os.getenv("REFUND_BATCH_MAX_PAUSE", 30))
+
+
+class RateLimitPause:
+    """Pause shared by every refund of a batch, growing while Stripe keeps rate limiting."""
+
+    def __init__(self, pause: float = REFUND_BATCH_PAUSE, max_pause: float = REFUND_BATCH_MAX_PAUSE):
+        self.pause = pause
+        self.max_pause = max_pause
+        self.current = 0.0
+        self.paused_at = 0.0
+        self.resume_at = 0.0
+        self.paused = 0
+
+    async def wait(self):
+        loop = asyncio.get_running_loop()
+        while (remaining := self.resume_at - loop.time()) > 0:
+            await asyncio.sleep(remaining)
+
+    def rate_limited(self, started: float):
+        """``started`` is the loop time the rate-limited call began at."""
+        if started < self.paused_at:
+            # Already in flight when the batch paused, that pause covers it
+            return
+        now = asyncio.get_running_loop().time()
+        self.current = min(self.max_pause, self.current * 2 or self.pause)
+        self.paused_at = now
+        self.resume_at = now + self.current
+        self.paused += 1
+
+    def succeeded(self):
+        self.current = 0.0
+
+
+async def run_refund_batch(
+    refunds: list[schemas.RefundRequest],
+    concurrency: int = REFUND_BATCH_CONCURRENCY,
+    rate_limit_retries: int = REFUND_BATCH_RATE_LIMIT_RETRIES,
+    pause: RateLimitPause | None = None,
+    gateway: StripeGateway = stripe_gateway,
+) -> AsyncIterator[schemas.BatchRefundResult]:
+    """Refund every payment intent, yielding results in the order they finish."""
+    semaphore = asyncio.Semaphore(concurrency)
+    pause = pause or RateLimitPause()
+
+    async def refund_one(index: int, request: schemas.RefundRequest) -> schemas.BatchRefundResult:
+        # Fixed up front so rate-limit retries can't refund twice
+        result = schemas.BatchRefundResult(
+            index=index,
+            payment_intent_id=request.payment_intent_id,
+            idempotency_key=request.idempotency_key or str(uuid.uuid4()),
+        )
+        loop = asyncio.get_running_loop()
+        attempt = 0
+        async with semaphore:
+            while True:
+                await pause.wait()
+                started = loop.time()
+                try:
+                    refund = await gateway.call(
+                        "Refund.create",
+                        payment_intent=request.payment_intent_id,
+                        amount=request.amount,
+                        reason=request.reason,
+                        idempotency_key=result.idempotency_key,
+                    )
+                except stripe.error.RateLimitError as e:
+                    pause.rate_limited(started)
+                    if attempt < rate_limit_retries:
+                        attempt += 1
+                        continue
+                    result.error = str(e)
+                    return result
+                except stripe.error.StripeError as e:
+                    result.error = str(e)
+                    return result
+                pause.succeeded()
+                result.refund = schemas.RefundResponse.model_validate(refund)
+                return result
+
+    tasks = [asyncio.ensure_future(refund_one(index, request)) for index, request in enumerate(refunds)]
+    try:
+        for finished in asyncio.as_completed(tasks):
+            yield await finished
+    finally:
+        # The client went away, don't start the refunds it will never hear about
+        for task in tasks:
+            task.cancel()
@@ -19,6 +19,10 @@ class RefundRequest(BaseModel):
     payment_intent_id: str
     amount: Optional[int] = None  # If None, full refund
     reason: Optional[str] = None
+    idempotency_key: Optional[str] = None  # Retries with the same key return the original refund
+
+class BatchRefundRequest(BaseModel):
+    refunds: list[RefundRequest]
 
 # Response models
 class PaymentIntentResponse(BaseModel):
@@ -51,6 +55,13 @@ class RefundResponse(BaseModel):
     payment_intent: str
     status: str
 
+class BatchRefundResult(BaseModel):
+    index: int  # Position of the refund in the request, results arrive in completion order
+    payment_intent_id: str
+    idempotency_key: str  # Resend a failed refund with this key, it is never refunded twice
+    refund: Optional[RefundResponse] = None
+    error: Optional[str] = None  # Set instead of refund when the refund failed
+
 class HealthResponse(BaseModel):
     status: str
     stripe_configured: bool
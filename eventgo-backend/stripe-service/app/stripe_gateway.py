@@ -0,0 +1,179 @@
+"""
+Stripe calls off the event loop.
+
+The stripe SDK is synchronous, so calling it from an ``async def`` route
+blocks every other request in the worker until Stripe answers. The gateway
+runs each call on a bounded thread pool (STRIPE_MAX_WORKERS threads, each
+keeping its own keep-alive session to Stripe). The per-operation timeout is
+the SDK's HTTP timeout on that thread, so a slow request fails in the thread
+that sent it: a retry never goes out while the first attempt is still
+running and holding a pool thread. Connection errors, timeouts, rate limits
+and 5xx responses are retried up to STRIPE_MAX_RETRIES times with
+full-jitter backoff. Create calls get an idempotency key up front, so a
+retried create never makes a second object. Every attempt first waits for a token from the
+shared rate limiter (see ``rate_limiter``).
+
+Operations are named after the SDK method (``"Refund.create"``) and looked
+up on the ``stripe`` module at call time.
+"""
+import asyncio
+import functools
+import os
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+import stripe
+
+from .rate_limiter import OPERATION_PRIORITIES, TokenBucket, stripe_rate_limiter
+
+STRIPE_MAX_WORKERS = int(os.getenv("STRIPE_MAX_WORKERS", 16))
+STRIPE_TIMEOUT = float(os.getenv("STRIPE_TIMEOUT", 15))  # Seconds per attempt, unless listed below
+STRIPE_MAX_RETRIES = int(os.getenv("STRIPE_MAX_RETRIES", 2))
+STRIPE_RETRY_BASE_DELAY = float(os.getenv("STRIPE_RETRY_BASE_DELAY", 0.25))
+STRIPE_RETRY_MAX_DELAY = float(os.getenv("STRIPE_RETRY_MAX_DELAY", 4))
+
+OPERATION_TIMEOUTS = {
+    "PaymentIntent.retrieve": 5,
+    "PaymentIntent.create": 10,
+    "Price.create": 10,
+    "PaymentLink.create": 10,
+    "Refund.create": 20,
+}
+
+
+class StripeTimeout(stripe.error.APIConnectionError):
+    """Raised when Stripe didn't answer within the operation's timeout."""
+
+
+class OperationTimeoutClient(stripe.http_client.RequestsClient):
+    """RequestsClient whose timeout is set per thread, by the gateway before each call."""
+
+    def __init__(self, timeout: float = STRIPE_TIMEOUT):
+        super().__init__(timeout=timeout)
+
+    @property
+    def _timeout(self) -> float:
+        return getattr(self._thread_local, "timeout", self.default_timeout)
+
+    @_timeout.setter
+    def _timeout(self, timeout: float):
+        self.default_timeout = timeout
+
+    def set_thread_timeout(self, timeout: float):
+        self._thread_local.timeout = timeout
+
+    def _handle_request_error(self, e):
+        if isinstance(e, requests.exceptions.Timeout):
+            raise StripeTimeout(f"Stripe didn't answer within {self._timeout}s ({type(e).__name__})", should_retry=True)
+        super()._handle_request_error(e)
+
+
+stripe_http_client = OperationTimeoutClient()
+stripe.default_http_client = stripe_http_client
+
+
+def is_retryable(error: Exception) -> bool:
+    if isinstance(error, (stripe.error.APIConnectionError, stripe.error.RateLimitError)):
+        return True
+    return isinstance(error, stripe.error.StripeError) and (error.http_status or 0) >= 500
+
+
+class StripeGateway:
+    def __init__(
+        self,
+        max_workers: int = STRIPE_MAX_WORKERS,
+        timeout: float = STRIPE_TIMEOUT,
+        timeouts: dict[str, float] = OPERATION_TIMEOUTS,
+        retries: int = STRIPE_MAX_RETRIES,
+        retry_base_delay: float = STRIPE_RETRY_BASE_DELAY,
+        retry_max_delay: float = STRIPE_RETRY_MAX_DELAY,
+        limiter: TokenBucket = stripe_rate_limiter,
+    ):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.timeouts = dict(timeouts)
+        self.retries = retries
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.limiter = limiter
+        self.calls = 0
+        self.retried = 0
+        self.timed_out = 0
+        self.failed = 0
+        self.in_flight = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="stripe")
+            return self._executor
+
+    def retry_delay(self, attempt: int) -> float:
+        """Full jitter: anywhere between 0 and the capped exponential delay."""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** attempt))
+
+    @staticmethod
+    def _run(function, timeout: float, params: dict):
+        """Runs on a pool thread."""
+        stripe_http_client.set_thread_timeout(timeout)
+        return function(**params)
+
+    async def call(self, operation: str, **params):
+        """Run ``stripe.<operation>(**params)``, e.g. ``await gateway.call("Refund.create", payment_intent=...)``."""
+        resource, method = operation.split(".")
+        if method == "create" and not params.get("idempotency_key"):
+            params["idempotency_key"] = str(uuid.uuid4())
+        timeout = self.timeouts.get(operation, self.timeout)
+        priority = OPERATION_PRIORITIES.get(operation, "links")
+        loop = asyncio.get_running_loop()
+        self.calls += 1
+
+        attempt = 0
+        while True:
+            # Resolved on every call so tests can patch e.g. stripe.Refund.create
+            function = getattr(getattr(stripe, resource), method)
+            await self.limiter.acquire(priority)
+            self.in_flight += 1
+            try:
+                return await loop.run_in_executor(self.executor, functools.partial(self._run, function, timeout, params))
+            except stripe.error.StripeError as e:
+                if isinstance(e, StripeTimeout):
+                    self.timed_out += 1
+                elif isinstance(e, stripe.error.RateLimitError):
+                    self.limiter.throttle()
+                error = e
+            finally:
+                self.in_flight -= 1
+
+            if attempt >= self.retries or not is_retryable(error):
+                self.failed += 1
+                raise error
+            attempt += 1
+            self.retried += 1
+            print(f"[Stripe] {operation} failed ({error.__class__.__name__}), retry {attempt}/{self.retries}")
+            await asyncio.sleep(self.retry_delay(attempt))
+
+    def snapshot(self) -> dict:
+        return {
+            "workers": self.max_workers,
+            "in_flight": self.in_flight,
+            "calls": self.calls,
+            "retried": self.retried,
+            "timed_out": self.timed_out,
+            "failed": self.failed,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=False, cancel_futures=True)
+                self._executor = None
+
+
+stripe_gateway = StripeGateway()
@@ -0,0 +1,102 @@
+"""
+Cancelling an event: one /refund request per payment intent against
+/refunds/batch in chunks, with a local fake Stripe.
+
+Every Stripe call takes STRIPE_DELAY seconds and Stripe answers 429 beyond
+REFUNDS_PER_SECOND refunds a second. Per-refund requests are all fired at
+once, as event-cancellation-service used to do; those still rate limited
+after the gateway's retries fail.
+
+It then measures checkout latency (/payment-status) during a mass refund,
+with checkout calls ahead of refunds in the rate limiter's queue and with
+both in one class.
+
+    python benchmarks/bench_refund_batch.py
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+import httpx
+import stripe
+
+from app import rate_limiter, refund_batch
+from app.main import app
+from fake_stripe import FakeStripe
+
+STRIPE_DELAY = 0.02  # Seconds per Stripe call
+REFUNDS = 2000
+BATCH_SIZE = 500
+REFUNDS_PER_SECOND = 100
+CHECKOUTS = 10
+
+refund_batch.REFUND_BATCH_PAUSE = 0.1
+
+
+async def one_by_one(client: httpx.AsyncClient) -> int:
+    responses = await asyncio.gather(*(
+        client.post("/refund", json={"payment_intent_id": f"pi_{i}", "idempotency_key": f"one-{i}"}) for i in range(REFUNDS)
+    ))
+    return sum(1 for response in responses if response.status_code != 200)
+
+
+async def batched(client: httpx.AsyncClient) -> int:
+    failed = 0
+    for start in range(0, REFUNDS, BATCH_SIZE):
+        refunds = [{"payment_intent_id": f"pi_{i}", "idempotency_key": f"batch-{i}"} for i in range(start, start + BATCH_SIZE)]
+        async with client.stream("POST", "/refunds/batch", json={"refunds": refunds}) as response:
+            async for line in response.aiter_lines():
+                if line and json.loads(line)["error"] is not None:
+                    failed += 1
+    return failed
+
+
+async def checkout_latency(client: httpx.AsyncClient) -> float:
+    """Average ms of a checkout status check made while 500 refunds are queued."""
+    refunds = asyncio.create_task(client.post("/refunds/batch", json={
+        "refunds": [{"payment_intent_id": f"pi_{i}"} for i in range(BATCH_SIZE)]
+    }))
+    await asyncio.sleep(0.5)
+    latencies = []
+    for i in range(CHECKOUTS):
+        started = time.perf_counter()
+        response = await client.get(f"/payment-status/pi_checkout_{i}")
+        assert response.status_code == 200, response.text
+        latencies.append(time.perf_counter() - started)
+        await asyncio.sleep(0.1)
+    await refunds
+    return 1000 * sum(latencies) / len(latencies)
+
+
+async def run():
+    fake = FakeStripe(delay=STRIPE_DELAY)
+    fake.per_second["/v1/refunds"] = REFUNDS_PER_SECOND
+    stripe.api_base = fake.url
+    stripe.api_key = "sk_test_fake"
+    transport = httpx.ASGITransport(app=app)
+    print(f"{'':>12} | {'seconds':>7} | {'requests':>8} | {'failed':>6} | {'stripe calls':>12}")
+    async with httpx.AsyncClient(transport=transport, base_url="http://stripe-service", timeout=600) as client:
+        for name, run_refunds, requests in (("/refund", one_by_one, REFUNDS), ("/refunds/batch", batched, REFUNDS // BATCH_SIZE)):
+            fake.requests.clear()
+            await asyncio.sleep(1)
+            started = time.perf_counter()
+            failed = await run_refunds(client)
+            elapsed = time.perf_counter() - started
+            print(f"{name:>12} | {elapsed:>7.2f} | {requests:>8} | {failed:>6} | {len(fake.requests):>12}")
+
+        print()
+        print(f"{'checkout priority':>17} | {'checkout ms':>11}")
+        for name, priority in (("ahead of refunds", "checkout"), ("same as refunds", "refunds")):
+            rate_limiter.OPERATION_PRIORITIES["PaymentIntent.retrieve"] = priority
+            await asyncio.sleep(1)
+            print(f"{name:>17} | {await checkout_latency(client):>11.0f}")
+    fake.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
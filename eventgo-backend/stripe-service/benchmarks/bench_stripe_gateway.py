@@ -0,0 +1,95 @@
+"""
+Throughput of /refund and /create-split-payment against a local fake Stripe.
+
+Every Stripe call takes STRIPE_DELAY seconds. Requests are fired CONCURRENCY
+at a time through the ASGI app; with the SDK called straight from the async
+routes they run one after another, with the gateway they share its thread
+pool. It also reports the latency of a single split payment by party size,
+participants' links are created concurrently. Links for the same amount and
+product share one cached Stripe price, kept in a throwaway SQLite file:
+
+    python benchmarks/bench_stripe_gateway.py
+"""
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "tests"))
+
+import httpx
+import stripe
+
+os.environ.setdefault("PRICE_CACHE_DB_PATH", os.path.join(tempfile.mkdtemp(), "prices.db"))
+os.environ.setdefault("STRIPE_RATE_LIMIT", "10000")  # Measures the thread pool, not the rate limiter
+os.environ.setdefault("STRIPE_RATE_BURST", "10000")
+
+from app.main import app
+from fake_stripe import FakeStripe
+
+STRIPE_DELAY = 0.05  # Seconds per Stripe call
+REQUESTS = 64
+CONCURRENCY = 16
+PARTY_SIZE = 4  # Participants per split payment, two Stripe calls each
+PARTY_SIZES = [1, 4, 12]
+
+
+def split_payment(i: int, party_size: int = PARTY_SIZE) -> dict:
+    return {
+        "event_id": 1,
+        "currency": "sgd",
+        "reservation_id": i,
+        "description": "Gig",
+        "participants": [
+            {"email": f"guest{p}@example.com", "user_id": p, "ticket_id": i * 10 + p, "amount": 2500,
+             "redirect_url": "https://eventgo.test/paid"}
+            for p in range(party_size)
+        ],
+    }
+
+
+async def throughput(client: httpx.AsyncClient, path: str, body) -> float:
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+
+    async def one(i):
+        async with semaphore:
+            response = await client.post(path, json=body(i))
+            assert response.status_code == 200, response.text
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(REQUESTS)))
+    return REQUESTS / (time.perf_counter() - started)
+
+
+async def run():
+    fake = FakeStripe(delay=STRIPE_DELAY)
+    stripe.api_base = fake.url
+    stripe.api_key = "sk_test_fake"
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stripe-service", timeout=60) as client:
+        refunds = await throughput(client, "/refund", lambda i: {"payment_intent_id": f"pi_{i}"})
+        splits = await throughput(client, "/create-split-payment", split_payment)
+        latencies = {}
+        for party_size in PARTY_SIZES:
+            started = time.perf_counter()
+            response = await client.post("/create-split-payment", json=split_payment(0, party_size))
+            assert response.status_code == 200, response.text
+            latencies[party_size] = (time.perf_counter() - started) * 1000
+    fake.close()
+    prices = sum(1 for method, path, key in fake.requests if path == "/v1/prices")
+    links = sum(1 for method, path, key in fake.requests if path == "/v1/payment_links")
+    print(f"{'endpoint':>22} | {'req/s':>7} | {'serialized req/s':>16}")
+    print(f"{'/refund':>22} | {refunds:>7.1f} | {1 / STRIPE_DELAY:>16.1f}")
+    print(f"{'/create-split-payment':>22} | {splits:>7.1f} | {1 / (2 * PARTY_SIZE * STRIPE_DELAY):>16.1f}")
+    print()
+    print(f"{'party size':>10} | {'split payment ms':>16} | {'serialized ms':>13}")
+    for party_size, latency in latencies.items():
+        print(f"{party_size:>10} | {latency:>16.0f} | {2 * party_size * STRIPE_DELAY * 1000:>13.0f}")
+    print()
+    print(f"Stripe prices created for {links} payment links: {prices}")
+
+
+if __name__ == "__main__":
+    asyncio.run(run())
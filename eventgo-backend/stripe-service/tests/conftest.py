@@ -0,0 +1,31 @@
+import os
+import sys
+
+import pytest
+import stripe
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fake_stripe import FakeStripe
+
+
+@pytest.fixture
+def fake_stripe(monkeypatch):
+    """Point the stripe SDK at a local fake Stripe server."""
+    fake = FakeStripe()
+    monkeypatch.setattr(stripe, "api_base", fake.url)
+    monkeypatch.setattr(stripe, "api_key", "sk_test_fake")
+    yield fake
+    fake.close()
+
+
+@pytest.fixture(autouse=True)
+def price_cache(tmp_path, monkeypatch):
+    """A fresh price cache per test, so no test reuses another's Stripe prices."""
+    from app import main
+    from app.price_cache import PriceCache
+
+    cache = PriceCache(str(tmp_path / "prices.db"))
+    monkeypatch.setattr(main, "price_cache", cache)
+    yield cache
+    cache.close()
@@ -0,0 +1,110 @@
+"""
+Local stand-in for the Stripe API, enough for refunds, prices, payment links
+and payment intents. Point the SDK at it with ``stripe.api_base = fake.url``.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs
+from collections import deque
+import itertools
+import json
+import threading
+import time
+
+OBJECTS = {
+    "/v1/refunds": "refund",
+    "/v1/prices": "price",
+    "/v1/payment_links": "payment_link",
+    "/v1/payment_intents": "payment_intent",
+}
+
+
+class FakeStripe:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.failures: dict[str, int] = {}  # path -> number of 500s to answer before succeeding
+        self.rate_limits: dict[str, int] = {}  # path -> number of 429s to answer before succeeding
+        self.per_second: dict[str, int] = {}  # path -> requests allowed per second, 429 beyond that
+        self._recent: dict[str, deque] = {}
+        self.stalls: dict[str, float] = {}  # path -> extra seconds before answering
+        self.rejects = None  # (path, params) -> True to answer 400 invalid_request_error
+        self.requests: list[tuple[str, str, str | None]] = []  # (method, path, idempotency key)
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def _reply(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                params = {key: values[0] for key, values in parse_qs(self.rfile.read(length).decode()).items()}
+                path = self.path.split("?")[0]
+                status, body = fake.handle(self.command, path, params, self.headers.get("Idempotency-Key"))
+                payload = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _reply
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def handle(self, method: str, path: str, params: dict, idempotency_key: str | None) -> tuple[int, dict]:
+        with self._lock:
+            self.requests.append((method, path, idempotency_key))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            failing = self.failures.get(path, 0)
+            if failing:
+                self.failures[path] = failing - 1
+            limited = self.rate_limits.get(path, 0)
+            if limited:
+                self.rate_limits[path] = limited - 1
+            elif path in self.per_second:
+                now = time.monotonic()
+                recent = self._recent.setdefault(path, deque())
+                while recent and recent[0] <= now - 1:
+                    recent.popleft()
+                limited = len(recent) >= self.per_second[path]
+                if not limited:
+                    recent.append(now)
+            object_id = next(self._ids)
+        try:
+            time.sleep(self.delay + self.stalls.get(path, 0))
+            if failing:
+                return 500, {"error": {"type": "api_error", "message": "Fake Stripe is having a bad day"}}
+            if limited:
+                return 429, {"error": {"type": "invalid_request_error", "code": "rate_limit", "message": "Too many requests"}}
+            if self.rejects is not None and self.rejects(path, params):
+                return 400, {"error": {"type": "invalid_request_error", "message": "Fake Stripe rejected this request"}}
+            # A path with an id retrieves or updates that object
+            collection = path if path in OBJECTS else path.rsplit("/", 1)[0]
+            obj = OBJECTS[collection]
+            body = {"id": f"{obj}_{object_id}" if collection == path else path.rsplit("/", 1)[1], "object": obj, **params}
+            if obj == "refund":
+                body.update(status="succeeded", amount=int(params.get("amount", 1000)), currency="sgd")
+            elif obj == "payment_link":
+                body["url"] = f"https://buy.stripe.test/{object_id}"
+            elif obj == "payment_intent":
+                body.update(id=path.rsplit("/", 1)[1], status="succeeded", amount=1000, currency="sgd", metadata={})
+            return 200, body
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
@@ -0,0 +1,93 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+# Add the parent directory to the path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.price_cache import PriceCache
+
+LINK = {
+    "amount": 5000,
+    "currency": "sgd",
+    "description": "Gig - VIP",
+    "email": "ann@example.com",
+    "redirect_url": "http://localhost/paid",
+    "metadata": {"transfer_id": "1"},
+}
+
+
+async def post_all(path, bodies):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stripe-service") as client:
+        return await asyncio.gather(*(client.post(path, json=body) for body in bodies))
+
+
+def price_requests(fake_stripe):
+    return [request for request in fake_stripe.requests if request[1] == "/v1/prices"]
+
+
+def test_repeated_links_reuse_one_price(fake_stripe, price_cache):
+    responses = asyncio.run(post_all("/create-payment-link", [LINK] * 5 + [{**LINK, "amount": 8000}]))
+
+    assert [response.status_code for response in responses] == [200] * 6
+    # One price per amount, even though the five links were created at the same time
+    assert len(price_requests(fake_stripe)) == 2
+    assert len({response.json()["payment_link_id"] for response in responses}) == 6
+    assert price_cache.snapshot() == {"size": 2, "hits": 4, "misses": 2}
+
+
+def test_split_payment_shares_price_between_participants(fake_stripe):
+    participants = [
+        {"email": f"guest{i}@example.com", "user_id": i, "ticket_id": 100 + i,
+         "amount": 5000, "redirect_url": "http://localhost/paid"}
+        for i in range(4)
+    ]
+    body = {"reservation_id": 1, "event_id": 1, "currency": "sgd",
+            "description": "Gig - VIP", "participants": participants}
+
+    [response] = asyncio.run(post_all("/create-split-payment", [body]))
+
+    assert response.status_code == 200
+    assert len(response.json()["payment_links"]) == 4
+    assert len(price_requests(fake_stripe)) == 1
+
+
+def test_prices_survive_restart(tmp_path):
+    path = str(tmp_path / "prices.db")
+    cache = PriceCache(path)
+    cache.put(5000, "SGD", "Payment for Gig", "price_1")
+    cache.close()
+
+    reopened = PriceCache(path)
+
+    assert reopened.get(5000, "sgd", "Payment for Gig") == "price_1"
+    assert reopened.get(5000, "sgd", "Payment for Other") is None
+    reopened.close()
+
+
+def test_memory_keeps_the_most_recent_prices(tmp_path):
+    cache = PriceCache(str(tmp_path / "prices.db"), size=2)
+    for amount in (1000, 2000, 3000):
+        cache.put(amount, "sgd", "Payment for Gig", f"price_{amount}")
+
+    assert cache.snapshot()["size"] == 2
+    assert cache.cached((1000, "sgd", "Payment for Gig")) is None
+    # Still in SQLite, read back into memory in place of the least recently used
+    assert cache.get(1000, "sgd", "Payment for Gig") == "price_1000"
+    assert cache.cached((2000, "sgd", "Payment for Gig")) is None
+    cache.close()
+
+
+def test_archived_price_is_replaced(fake_stripe, price_cache):
+    price_cache.put(5000, "sgd", "Payment for Gig - VIP", "price_archived")
+    fake_stripe.rejects = lambda path, params: params.get("line_items[0][price]") == "price_archived"
+
+    [response] = asyncio.run(post_all("/create-payment-link", [LINK]))
+
+    assert response.status_code == 200
+    assert len(price_requests(fake_stripe)) == 1
+    assert price_cache.get(5000, "sgd", "Payment for Gig - VIP") not in (None, "price_archived")
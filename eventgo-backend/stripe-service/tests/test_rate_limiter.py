@@ -0,0 +1,120 @@
+import asyncio
+import math
+import os
+import sys
+import time
+
+import httpx
+import pytest
+
+# Add the parent directory to the path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.rate_limiter import TokenBucket
+from app.stripe_gateway import StripeGateway
+
+
+class FakeClock:
+    """Time that only moves when the bucket sleeps, in whole microseconds like a real clock."""
+
+    def __init__(self):
+        self.ticks = 0
+
+    def __call__(self) -> float:
+        return self.ticks / 1e6
+
+    async def sleep(self, seconds: float):
+        self.ticks += max(1, math.ceil(seconds * 1e6))
+        await asyncio.sleep(0)
+
+
+def test_burst_then_refill_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=50, burst=5, clock=clock, sleep=clock.sleep)
+
+    async def acquire_all():
+        await asyncio.gather(*(bucket.acquire("refunds") for _ in range(15)))
+
+    asyncio.run(acquire_all())
+
+    # 5 straight from the bucket, 10 more at 50 a second
+    assert clock() == pytest.approx(0.2, abs=1e-5)
+    queue = bucket.snapshot()["queues"]["refunds"]
+    assert queue["acquired"] == 15 and queue["queued"] == 0
+    assert queue["max_wait_ms"] == pytest.approx(200, abs=0.01)
+
+
+def test_queued_calls_are_served_by_priority():
+    bucket = TokenBucket(rate=20, burst=1)
+    served = []
+
+    async def call(priority):
+        await bucket.acquire(priority)
+        served.append(priority)
+
+    async def run():
+        await bucket.acquire("links")  # Empties the bucket
+        tasks = [asyncio.create_task(call(priority)) for priority in ("links", "refunds", "links", "checkout")]
+        await asyncio.sleep(0)
+        assert bucket.snapshot()["queues"]["links"]["queued"] == 2
+        await asyncio.gather(*tasks)
+
+    asyncio.run(run())
+
+    assert served == ["checkout", "refunds", "links", "links"]
+
+
+def test_cancelled_waiter_gives_up_its_place():
+    clock = FakeClock()
+    bucket = TokenBucket(rate=20, burst=1, clock=clock, sleep=clock.sleep)
+
+    async def run():
+        await bucket.acquire("links")
+        abandoned = asyncio.create_task(bucket.acquire("checkout"))
+        await asyncio.sleep(0)
+        abandoned.cancel()
+        await bucket.acquire("links")
+
+    asyncio.run(run())
+
+    # One refill, not two
+    assert clock() == pytest.approx(0.05, abs=1e-5)
+
+
+def test_429_pauses_every_caller(fake_stripe):
+    fake_stripe.rate_limits["/v1/refunds"] = 1
+    bucket = TokenBucket(rate=100, burst=10, pause=0.2)
+    gateway = StripeGateway(retries=1, retry_base_delay=0, limiter=bucket)
+
+    async def refunds():
+        started = time.perf_counter()
+        await gateway.call("Refund.create", payment_intent="pi_1")
+        return time.perf_counter() - started
+
+    assert asyncio.run(refunds()) >= 0.2
+    assert bucket.snapshot()["throttled"] == 1
+
+
+def test_limit_keeps_stripe_under_its_rate(fake_stripe):
+    fake_stripe.per_second["/v1/refunds"] = 25
+    gateway = StripeGateway(retries=0, limiter=TokenBucket(rate=20, burst=5))
+
+    async def refunds():
+        return await asyncio.gather(*(gateway.call("Refund.create", payment_intent=f"pi_{i}") for i in range(15)))
+
+    assert len(asyncio.run(refunds())) == 15
+    # Queued instead of answered with 429
+    assert len(fake_stripe.requests) == 15
+
+
+def test_metrics_report_queue_waits():
+    async def metrics():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://stripe-service") as client:
+            return await client.get("/metrics")
+
+    response = asyncio.run(metrics())
+
+    assert response.status_code == 200
+    assert set(response.json()["rate_limit"]["queues"]) == {"checkout", "refunds", "links"}
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import os
+import sys
+
+import httpx
+
+# Add the parent directory to the path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.rate_limiter import TokenBucket
+from app.refund_batch import RateLimitPause, run_refund_batch
+from app.schemas import RefundRequest
+from app.stripe_gateway import StripeGateway
+
+
+async def post_batch(body):
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://stripe-service") as client:
+        response = await client.post("/refunds/batch", json=body)
+        return response, [json.loads(line) for line in response.text.splitlines() if line]
+
+
+async def collect(refunds, **options):
+    return [result async for result in run_refund_batch(refunds, **options)]
+
+
+def test_batch_streams_one_result_per_refund(fake_stripe):
+    fake_stripe.rejects = lambda path, params: params.get("payment_intent") == "pi_bad"
+    refunds = [{"payment_intent_id": f"pi_{i}", "amount": 1000 + i, "idempotency_key": f"cancel-7-pi_{i}"} for i in range(5)]
+    refunds.append({"payment_intent_id": "pi_bad"})
+
+    response, results = asyncio.run(post_batch({"refunds": refunds}))
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    by_index = {result["index"]: result for result in results}
+    assert sorted(by_index) == list(range(6))
+    for i in range(5):
+        assert by_index[i]["refund"]["amount"] == 1000 + i and by_index[i]["error"] is None
+        assert by_index[i]["idempotency_key"] == f"cancel-7-pi_{i}"
+    assert by_index[5]["refund"] is None and "rejected" in by_index[5]["error"]
+    # Generated key, so the caller can safely resend it
+    assert by_index[5]["idempotency_key"]
+
+
+def test_results_arrive_as_refunds_finish(fake_stripe):
+    fake_stripe.delay = 0.05
+    refunds = [RefundRequest(payment_intent_id=f"pi_{i}") for i in range(8)]
+
+    results = asyncio.run(collect(refunds, concurrency=4))
+
+    assert len(results) == 8
+    assert fake_stripe.max_in_flight == 4
+
+
+def test_rate_limit_pauses_the_batch_and_keeps_the_key(fake_stripe):
+    fake_stripe.rate_limits["/v1/refunds"] = 3
+    pause = RateLimitPause(pause=0.01, max_pause=0.05)
+    refunds = [RefundRequest(payment_intent_id="pi_1", idempotency_key="cancel-7-pi_1")]
+
+    [result] = asyncio.run(collect(refunds, pause=pause, gateway=StripeGateway(retries=0, limiter=TokenBucket(pause=0))))
+
+    assert result.refund is not None and result.error is None
+    assert pause.paused == 3
+    assert [key for method, path, key in fake_stripe.requests] == ["cancel-7-pi_1"] * 4
+
+
+def test_rate_limited_refund_fails_after_its_retries(fake_stripe):
+    fake_stripe.rate_limits["/v1/refunds"] = 10
+    refunds = [RefundRequest(payment_intent_id="pi_1")]
+
+    [result] = asyncio.run(collect(
+        refunds, rate_limit_retries=1, pause=RateLimitPause(pause=0.01), gateway=StripeGateway(retries=0, limiter=TokenBucket(pause=0))
+    ))
+
+    assert result.refund is None and "Too many requests" in result.error
+    assert len(fake_stripe.requests) == 2
+
+
+def test_batch_size_is_capped(fake_stripe, monkeypatch):
+    monkeypatch.setattr("app.main.REFUND_BATCH_MAX_SIZE", 2)
+
+    response, _ = asyncio.run(post_batch({"refunds": [{"payment_intent_id": f"pi_{i}"} for i in range(3)]}))
+
+    assert response.status_code == 400
+    assert fake_stripe.requests == []
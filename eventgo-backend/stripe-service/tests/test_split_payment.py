@@ -0,0 +1,86 @@
+import asyncio
+import os
+import sys
+
+import httpx
+
+# Add the parent directory to the path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import main
+
+PARTY_SIZE = 12
+
+
+def split_payment_request() -> dict:
+    return {
+        "event_id": 1,
+        "currency": "sgd",
+        "reservation_id": 9,
+        "description": "Gig",
+        "participants": [
+            {"email": f"guest{i}@example.com", "user_id": i, "ticket_id": 100 + i, "amount": 2500,
+             "redirect_url": "https://eventgo.test/paid"}
+            for i in range(PARTY_SIZE)
+        ],
+    }
+
+
+def create_split_payment() -> httpx.Response:
+    async def post():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://stripe-service") as client:
+            return await client.post("/create-split-payment", json=split_payment_request())
+
+    return asyncio.run(post())
+
+
+def test_participants_are_processed_concurrently(fake_stripe, monkeypatch):
+    fake_stripe.delay = 0.05
+    monkeypatch.setattr(main, "SPLIT_PAYMENT_CONCURRENCY", 4)
+
+    response = create_split_payment()
+
+    body = response.json()
+    assert response.status_code == 200
+    assert [link["ticket_id"] for link in body["payment_links"]] == [100 + i for i in range(PARTY_SIZE)]
+    # Four participants' Stripe calls at a time, not one after another
+    assert fake_stripe.max_in_flight == 4
+
+
+def test_failed_participant_is_retried(fake_stripe):
+    rejected = []
+
+    def reject_once(path, params):
+        if params.get("metadata[participant_email]") == "guest3@example.com" and not rejected:
+            rejected.append(path)
+            return True
+        return False
+
+    fake_stripe.rejects = reject_once
+
+    response = create_split_payment()
+
+    assert response.status_code == 200
+    assert len(response.json()["payment_links"]) == PARTY_SIZE
+    assert rejected == ["/v1/payment_links"]
+
+
+def test_one_failed_link_fails_the_party_and_deactivates_the_rest(fake_stripe):
+    fake_stripe.rejects = lambda path, params: params.get("metadata[participant_email]") == "guest3@example.com"
+
+    response = create_split_payment()
+
+    assert response.status_code == 400
+    assert "[103]" in response.json()["detail"] and "rejected" in response.json()["detail"]
+    deactivated = [path for method, path, key in fake_stripe.requests if path.startswith("/v1/payment_links/")]
+    assert len(deactivated) == PARTY_SIZE - 1
+
+
+def test_request_fails_when_no_link_was_created(fake_stripe):
+    fake_stripe.rejects = lambda path, params: path == "/v1/prices"
+
+    response = create_split_payment()
+
+    assert response.status_code == 400
+    assert "rejected" in response.json()["detail"]
@@ -0,0 +1,84 @@
+import asyncio
+import os
+import sys
+
+import httpx
+import pytest
+import stripe
+
+# Add the parent directory to the path so we can import app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.main import app
+from app.stripe_gateway import StripeGateway, StripeTimeout, is_retryable
+
+
+def test_retry_reuses_idempotency_key(fake_stripe):
+    """A create that hit a 500 is retried with the same key, so Stripe can't refund twice."""
+    fake_stripe.failures["/v1/refunds"] = 1
+    gateway = StripeGateway(retry_base_delay=0)
+
+    refund = asyncio.run(gateway.call("Refund.create", payment_intent="pi_1", amount=2500))
+
+    assert refund.status == "succeeded" and refund.amount == 2500
+    keys = [key for method, path, key in fake_stripe.requests]
+    assert len(keys) == 2 and keys[0] is not None and keys[0] == keys[1]
+    assert gateway.snapshot()["retried"] == 1
+
+
+def test_caller_idempotency_key_is_kept(fake_stripe):
+    gateway = StripeGateway()
+
+    asyncio.run(gateway.call("Refund.create", payment_intent="pi_1", idempotency_key="split-refund-ticket-4"))
+
+    assert fake_stripe.requests == [("POST", "/v1/refunds", "split-refund-ticket-4")]
+
+
+def test_slow_operation_times_out(fake_stripe, monkeypatch):
+    fake_stripe.stalls["/v1/prices"] = 0.5
+    gateway = StripeGateway(timeouts={"Price.create": 0.1}, retries=1, retry_base_delay=0)
+    running, overlapped = [], []
+    run = StripeGateway._run
+
+    def tracked(function, timeout, params):
+        running.append(timeout)
+        overlapped.append(len(running) > 1)
+        try:
+            return run(function, timeout, params)
+        finally:
+            running.pop()
+
+    monkeypatch.setattr(StripeGateway, "_run", staticmethod(tracked))
+
+    with pytest.raises(StripeTimeout):
+        asyncio.run(gateway.call("Price.create", unit_amount=1000, currency="sgd", product_data={"name": "Gig"}))
+
+    assert len(fake_stripe.requests) == 2
+    # Each attempt's thread gave up before the retry went out
+    assert overlapped == [False, False]
+    assert gateway.snapshot()["timed_out"] == 2
+
+
+def test_only_transient_errors_are_retried():
+    assert is_retryable(stripe.error.APIConnectionError("reset"))
+    assert is_retryable(stripe.error.RateLimitError("slow down", http_status=429))
+    assert is_retryable(stripe.error.APIError("boom", http_status=502))
+    assert not is_retryable(stripe.error.InvalidRequestError("No such payment_intent", "id", http_status=400))
+    assert not is_retryable(stripe.error.CardError("declined", "card", "card_declined", http_status=402))
+
+
+def test_slow_stripe_does_not_block_other_requests(fake_stripe):
+    fake_stripe.delay = 0.1
+
+    async def refunds(count):
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://stripe-service") as client:
+            return await asyncio.gather(*(
+                client.post("/refund", json={"payment_intent_id": f"pi_{i}"}) for i in range(count)
+            ))
+
+    responses = asyncio.run(refunds(10))
+
+    assert [response.status_code for response in responses] == [200] * 10
+    # Refunds reached Stripe together instead of one after another
+    assert fake_stripe.max_in_flight > 1
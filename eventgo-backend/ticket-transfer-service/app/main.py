@@ -1,11 +1,14 @@
 from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
 import os
+import httpx
 import requests
 import json
 import uuid
 from . import schemas
 from dotenv import load_dotenv
+from eventgo_shared.event_cache import EventCache, events_api_loader
+from eventgo_shared.templates import NotificationTemplate, event_fields, format_timestamp
 import pika
 import json
 from datetime import datetime
@@ -41,6 +44,49 @@ TICKET_INVENTORY_URL = os.environ.get("TICKET_INVENTORY_URL")
 AUTH_URL   = os.getenv("AUTH_API_URL", "http://auth-service:8000")
 EVENTS_URL = os.getenv("EVENTS_API_URL", "https://personal-vyyhsf3d.outsystemscloud.com/EventsOutsystem/rest/EventsAPI")
 
+# Event details for notifications, shared by concurrent transfers of the same event
+events_client = httpx.AsyncClient(timeout=10)
+event_cache = EventCache(events_api_loader(EVENTS_URL, lambda: events_client))
+
+# Notification templates
+TRANSFER_PAYMENT_LINK = NotificationTemplate(
+    subject="Important Notice: Ticket Transfer Payment Link for '{title}'",
+    message=(
+        "Hello,\n\n"
+        "You have been invited to purchase ticket #{ticket_id} for '{title}', scheduled on "
+        "{date} at {venue}. To complete the transfer, please follow this secure payment link:\n\n"
+        "{url}\n\n"
+        "The ticket price is SGD {amount:.2f}. This link will expire on {expires_at}.\n\n"
+        "If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
+        "Thank you for choosing EventGo.\n\n"
+        "Sincerely,\nEventGo Customer Support"
+    ),
+)
+TRANSFER_COMPLETED_BUYER = NotificationTemplate(
+    subject="Important Notice: Your Ticket #{ticket_id} Has Been Transferred",
+    message=(
+        "Hello {full_name},\n\n"
+        "We’re pleased to inform you that your transfer for ticket #{ticket_id} to '{title}' "
+        "scheduled for {date} at {venue} has been completed successfully. "
+        "Your new ticket ({seat_number}) is now in your account—no further action is needed.\n\n"
+        "If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
+        "Thank you for choosing EventGo.\n\n"
+        "Sincerely,\nEventGo Customer Support"
+    ),
+)
+TRANSFER_COMPLETED_SELLER = NotificationTemplate(
+    subject="Important Notice: Your Ticket #{ticket_id} Has Been Transferred",
+    message=(
+        "Hello {full_name},\n\n"
+        "This is to confirm that your ticket #{ticket_id} for '{title}' scheduled for "
+        "{date} at {venue} has been transferred successfully. A refund of SGD {amount:.2f} "
+        "will be processed to your original payment method shortly.\n\n"
+        "If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
+        "Thank you for using EventGo.\n\n"
+        "Sincerely,\nEventGo Customer Support"
+    ),
+)
+
 # RabbitMQ Configuration
 RABBITMQ_HOST = os.environ.get("RABBITMQ_HOST")
 RABBITMQ_PORT = int(os.environ.get("RABBITMQ_PORT"))
@@ -198,25 +244,16 @@ async def generate_transfer_payment_link(request: schemas.TransferPaymentRequest
 
         # print(ticket["event_id"])
 
-        event_resp = requests.get(f"{EVENTS_URL}/events/{event_id}")
-        event_resp.raise_for_status()
-        event = event_resp.json().get("EventAPI", {})
+        event = await event_cache.get(event_id)
 
         print(event["date"])
 
-        formatted_date = datetime.fromisoformat(event.get("date").replace("Z", "+00:00")).strftime("%B %d, %Y at %I:%M %p")
-
-        subject = f"Important Notice: Ticket Transfer Payment Link for '{event['title']}'"
-        message = (
-            f"Hello,\n\n"
-            f"You have been invited to purchase ticket #{request.ticket_id} for '{event['title']}', scheduled on "
-            f"{formatted_date} at {event['venue']}. To complete the transfer, please follow this secure payment link:\n\n"
-            f"{response_data['url']}\n\n"
-            f"The ticket price is SGD {response_data['amount']/100:.2f}. This link will expire on "
-            f"{datetime.fromtimestamp(response_data['expires_at']).strftime('%B %d, %Y at %I:%M %p')}.\n\n"
-            f"If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
-            f"Thank you for choosing EventGo.\n\n"
-            f"Sincerely,\nEventGo Customer Support"
+        subject, message = TRANSFER_PAYMENT_LINK.render(
+            **event_fields(event),
+            ticket_id=request.ticket_id,
+            url=response_data["url"],
+            amount=response_data["amount"] / 100,
+            expires_at=format_timestamp(response_data["expires_at"]),
         )
 
         publish_notification(schemas.TransferNotification(
@@ -267,6 +304,11 @@ async def transfer(request: schemas.TicketTransferRequest):
         print(f"Ticket info retrieved: {ticket_info}")
         
         original_payment_intent_id = ticket_info.get("paymentIntentId")
+
+        if original_payment_intent_id and original_payment_intent_id == request.new_payment_intent:
+            # A retry of a transfer that already went through, the seller was refunded then
+            print(f"Ticket {request.ticket_id} already transferred")
+            return {"status": "success", "message": "Ticket transfer already completed"}
         
         if not original_payment_intent_id:
             print("No payment_intent_id found in ticket info")
@@ -278,8 +320,9 @@ async def transfer(request: schemas.TicketTransferRequest):
             f"{STRIPE_SERVICE_URL}/refund",
             json={
                 "payment_intent_id": original_payment_intent_id,
-                "amount": request.amount
+                "amount": request.amount,
                 # "reason": "ticket_transfer"
+                "idempotency_key": request.idempotency_key
             }
         )
         
@@ -304,9 +347,7 @@ async def transfer(request: schemas.TicketTransferRequest):
         
         # 3. Send notifications directly using RabbitMQ
         # Fetch event details
-        event_resp = requests.get(f"{EVENTS_URL}/events/{request.event_id}")
-        event_resp.raise_for_status()
-        event = event_resp.json().get("EventAPI", {})
+        event = await event_cache.get(request.event_id)
 
         # Fetch full user profiles
         user_ids = [int(request.buyer_id), int(request.seller_id)]
@@ -314,34 +355,20 @@ async def transfer(request: schemas.TicketTransferRequest):
         users_resp.raise_for_status()
         users = {u["id"]: u for u in users_resp.json()}
 
-        formatted_date = datetime.fromisoformat(event.get("date").replace("Z", "+00:00")).strftime("%B %d, %Y at %I:%M %p")
+        fields = event_fields(event)
         seat_number = ticket_info.get("seat_number", str(request.ticket_id))
 
         # Buyer notification
         buyer = users[int(request.buyer_id)]
-        subject = f"Important Notice: Your Ticket #{request.ticket_id} Has Been Transferred"
-        message = (
-            f"Hello {buyer.get('full_name', '')},\n\n"
-            f"We’re pleased to inform you that your transfer for ticket #{request.ticket_id} to '{event.get('title')}' "
-            f"scheduled for {formatted_date} at {event.get('venue')} has been completed successfully. "
-            f"Your new ticket ({seat_number}) is now in your account—no further action is needed.\n\n"
-            f"If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
-            f"Thank you for choosing EventGo.\n\n"
-            f"Sincerely,\nEventGo Customer Support"
+        subject, message = TRANSFER_COMPLETED_BUYER.render(
+            **fields, full_name=buyer.get("full_name", ""), ticket_id=request.ticket_id, seat_number=seat_number
         )
         publish_notification(schemas.TransferNotification(subject=subject, message=message, recipient_email_address=buyer["email"]))
 
         # Seller notification
         seller = users[int(request.seller_id)]
-        subject = f"Important Notice: Your Ticket #{request.ticket_id} Has Been Transferred"
-        message = (
-            f"Hello {seller.get('full_name', '')},\n\n"
-            f"This is to confirm that your ticket #{request.ticket_id} for '{event.get('title')}' scheduled for "
-            f"{formatted_date} at {event.get('venue')} has been transferred successfully. A refund of SGD {request.amount * 0.01:.2f} "
-            f"will be processed to your original payment method shortly.\n\n"
-            f"If you have any questions, visit our Help Center at https://help.eventgo.com or reply to this email.\n\n"
-            f"Thank you for using EventGo.\n\n"
-            f"Sincerely,\nEventGo Customer Support"
+        subject, message = TRANSFER_COMPLETED_SELLER.render(
+            **fields, full_name=seller.get("full_name", ""), ticket_id=request.ticket_id, amount=request.amount * 0.01
         )
         publish_notification(schemas.TransferNotification(subject=subject, message=message, recipient_email_address=seller["email"]))
 
@@ -371,6 +398,11 @@ async def transfer(request: schemas.TicketTransferRequest):
         return {"status": "error", "message": f"Error processing ticket transfer: {str(e)}"}
                     
 
+@app.on_event("shutdown")
+async def close_events_client():
+    await events_client.aclose()
+
+
 # Executing Transfer upon Successful Payment
 
 @app.get("/health", response_model=schemas.HealthResponse)
@@ -39,6 +39,7 @@ class TicketTransferRequest(BaseModel):
     buyer_id: str
     amount: Union[float, int]
     event_id: Union[str, int]
+    idempotency_key: Optional[str] = None  # Seller refund key, the same on every retry of one transfer
 
 class TicketTransferResponse(BaseModel):
     status: str
\ No newline at end of file